@@ -1,19 +1,753 @@
 #Cassidy Please make sure our sql code is fine before implementing Authentication
 #Dont change the name just the code if needed. 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import (Flask, render_template, request, jsonify, redirect, url_for, flash, session, g,
+                   has_app_context, has_request_context, Response, stream_with_context,
+                   before_render_template, template_rendered)
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup
 import sqlite3
 import os
-from datetime import datetime, date
+import threading
+import time
+import click
+import json
+import base64
+import csv
+import io
+import hashlib
+import hmac
+import gzip
+import zlib
+import math
+import queue
+import random
+from collections import OrderedDict
+from datetime import datetime, date, timezone
+from contextlib import contextmanager
 from functools import wraps
+from matching import run_matching
+from events import EventBroadcaster, fetch_events
+from seed_data import SCALES, seed_database
+from archive import DEFAULT_BATCH_SIZE, DEFAULT_GRACE_DAYS, ArchiveSweeper, sweep
+from writer import GroupCommitWriter, is_busy_error
+from repositories import UNSPECIFIED, SQLiteBackend
+from metrics import (ENVIRON_KEY, PROMETHEUS_CONTENT_TYPE, RequestMetrics, RequestMetricsMiddleware,
+                     counted, traced)
+
+#Optional speed-ups: orjson for JSON encoding, brotli as an extra response encoding
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'foodconnect-secret-key-bfb321-2025'
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(BASE_DIR, 'foodconnect.sql')
+MIGRATIONS_DIR = os.path.join(BASE_DIR, 'migrations')
+
+app.config['DATABASE'] = os.environ.get('FOODCONNECT_DB', os.path.join(BASE_DIR, 'foodconnect.db'))
+app.config['DB_POOL_SIZE'] = int(os.environ.get('FOODCONNECT_DB_POOL_SIZE', 8))
+app.config['AUTO_MIGRATE'] = os.environ.get('FOODCONNECT_AUTO_MIGRATE', '1') == '1'
+app.config['CACHE_TTL'] = float(os.environ.get('FOODCONNECT_CACHE_TTL', 30))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('FOODCONNECT_CACHE_MAX_ENTRIES', 1024))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('FOODCONNECT_COMPRESS_MIN_SIZE', 1024))
+app.config['EVENT_POLL_INTERVAL'] = float(os.environ.get('FOODCONNECT_EVENT_POLL_INTERVAL', 1))
+app.config['EVENT_HEARTBEAT'] = float(os.environ.get('FOODCONNECT_EVENT_HEARTBEAT', 15))
+app.config['EVENT_QUEUE_SIZE'] = int(os.environ.get('FOODCONNECT_EVENT_QUEUE_SIZE', 100))
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('FOODCONNECT_SLOW_REQUEST_MS', 500))
+#Bearer token for /metrics and the stats APIs; without it they only answer direct loopback requests
+app.config['OPS_TOKEN'] = os.environ.get('FOODCONNECT_OPS_TOKEN', '')
+#Seconds between in-process archive sweeps (0 leaves archiving to `flask archive-settled`)
+app.config['ARCHIVE_SWEEP_INTERVAL'] = float(os.environ.get('FOODCONNECT_ARCHIVE_SWEEP_INTERVAL', 0))
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('FOODCONNECT_ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+app.config['ARCHIVE_GRACE_DAYS'] = int(os.environ.get('FOODCONNECT_ARCHIVE_GRACE_DAYS', DEFAULT_GRACE_DAYS))
+#Group commit: route writes go through one writer thread per process (see writer.py)
+app.config['WRITE_QUEUE'] = os.environ.get('FOODCONNECT_WRITE_QUEUE', '0') == '1'
+app.config['WRITE_BATCH_SIZE'] = int(os.environ.get('FOODCONNECT_WRITE_BATCH_SIZE', 64))
+app.config['WRITE_BATCH_DELAY_MS'] = float(os.environ.get('FOODCONNECT_WRITE_BATCH_DELAY_MS', 2))
+
+#Applied once when a connection is opened, not on every request
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('mmap_size', 268435456),
+    ('cache_size', -16000),
+    ('foreign_keys', 'ON'),
+)
+
+class Cursor(sqlite3.Cursor):
+    """sqlite3 cursor that reports its statements and fetched rows to the active StatementRecorders"""
+    execute = traced(sqlite3.Cursor.execute)
+    executemany = traced(sqlite3.Cursor.executemany)
+    fetchone = counted(sqlite3.Cursor.fetchone)
+    fetchmany = counted(sqlite3.Cursor.fetchmany)
+    fetchall = counted(sqlite3.Cursor.fetchall)
+    __next__ = counted(sqlite3.Cursor.__next__)
+
+class Connection(sqlite3.Connection):
+    """sqlite3 connection that can run callbacks once the current transaction commits
+    and reports its statements to the active StatementRecorders (see metrics.py)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._after_commit = []
+
+    def cursor(self, factory=Cursor):
+        return super().cursor(factory)
+
+    #sqlite3's own shortcuts would create a plain cursor, bypassing the recording one
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def after_commit(self, callback):
+        """Run callback after the next commit (now, if no transaction is open); dropped on rollback"""
+        if self.in_transaction:
+            self._after_commit.append(callback)
+        else:
+            callback()
+
+    @contextmanager
+    def savepoint(self, name):
+        """Run a block inside SAVEPOINT name: on error it is undone, with the after-commit
+        callbacks it registered, and the rest of the transaction carries on"""
+        registered = len(self._after_commit)
+        self.execute(f'SAVEPOINT {name}')
+        try:
+            yield self
+        except BaseException:
+            self.execute(f'ROLLBACK TO {name}')
+            self.execute(f'RELEASE {name}')
+            del self._after_commit[registered:]
+            raise
+        self.execute(f'RELEASE {name}')
+
+    def commit(self):
+        super().commit()
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        super().rollback()
+        self._after_commit = []
+
+class ConnectionPool:
+    """Pool of configured SQLite connections shared by the threads of one worker process"""
+
+    def __init__(self, database, max_idle=8):
+        self.database = database
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'released': 0, 'discarded': 0, 'in_use': 0}
+
+    def connect(self):
+        """Open a new configured connection (not tracked by the pool, caller closes it)"""
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=Connection)
+        conn.row_factory = sqlite3.Row
+        for name, value in SQLITE_PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one if none are free"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+            self._stats['in_use'] += 1
+            if conn is not None:
+                self._stats['reused'] += 1
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+        return conn
+
+    def release(self, conn):
+        """Return a connection, rolling back anything a failed request left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._stats['in_use'] -= 1
+                self._stats['discarded'] += 1
+            return
+        with self._lock:
+            self._stats['in_use'] -= 1
+            self._stats['released'] += 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['discarded'] += 1
+        conn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), max_idle=self.max_idle, pid=self.pid)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get this process's connection pool, rebuilding it after a fork or a DATABASE change"""
+    global _pool
+    pool = _pool
+    if pool is None or pool.pid != os.getpid() or pool.database != app.config['DATABASE']:
+        with _pool_lock:
+            pool = _pool
+            if pool is None or pool.pid != os.getpid() or pool.database != app.config['DATABASE']:
+                if pool is not None and pool.pid == os.getpid():
+                    pool.close_all()
+                pool = ConnectionPool(app.config['DATABASE'], app.config['DB_POOL_SIZE'])
+                conn = pool.acquire()
+                try:
+                    if app.config['AUTO_MIGRATE']:
+                        migrate_db(conn)
+                    location_registry.warm(conn)
+                finally:
+                    pool.release(conn)
+                _pool = pool
+    return pool
+
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect('foodconnect.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get database connection (pooled and shared for the rest of the request)"""
+    if not has_app_context():
+        return get_pool().connect()
+    if 'db' not in g:
+        g.db_pool = get_pool()
+        g.db = g.db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Hand the request's connection back to the pool, even when the route raised"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        g.pop('db_pool').release(conn)
+
+#Write transactions: BEGIN IMMEDIATE takes the write lock up front, so a transaction that
+#reads before it writes cannot be overtaken between its checks and its writes. If the lock
+#stays busy for longer than busy_timeout the whole transaction is retried, up to
+#WRITE_RETRY_ATTEMPTS times with exponential backoff and jitter.
+WRITE_RETRY_ATTEMPTS = 5
+WRITE_RETRY_BASE_DELAY = 0.02
+
+def run_write_transaction(conn, work, attempts=WRITE_RETRY_ATTEMPTS, base_delay=WRITE_RETRY_BASE_DELAY):
+    """Run work(conn) inside BEGIN IMMEDIATE and commit, retrying the lot while the database is busy.
+    work must only touch the database, as it may run more than once. Returns what work returned."""
+    for attempt in range(attempts):
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(conn)
+                conn.commit()
+                return result
+            except BaseException:
+                conn.rollback()
+                raise
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt == attempts - 1:
+                raise
+            time.sleep(base_delay * 2 ** attempt * (0.5 + random.random()))
+
+_writer = None
+_writer_pool = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Get the group-commit writer of this process's pool, replacing it when the pool is rebuilt
+    or the writer was closed"""
+    global _writer, _writer_pool
+    pool = get_pool()
+    with _writer_lock:
+        if _writer is None or _writer.closed or _writer_pool is not pool:
+            if _writer is not None:
+                _writer.close()
+            _writer = GroupCommitWriter(pool.connect, app.config['WRITE_BATCH_SIZE'],
+                                        app.config['WRITE_BATCH_DELAY_MS'] / 1000)
+            _writer_pool = pool
+        return _writer
+
+def perform_write(work):
+    """Run work(conn) as one write: queued to the group-commit writer when WRITE_QUEUE is on,
+    otherwise run_write_transaction() on the request's connection. Either way the result is
+    committed when this returns, and exceptions raised by work come back here.
+    work may run on another thread, so it takes everything it needs from its closure."""
+    if app.config['WRITE_QUEUE']:
+        return get_writer().run(work)
+    return run_write_transaction(get_db_connection(), work)
+
+#Repositories (repositories.py) behind the account, food item create and request update
+#routes, on the app's connections and write path
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Get the repositories' storage backend"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = SQLiteBackend(get_db_connection, perform_write, location_registry)
+    return _storage
+
+#Database migrations: migrations/NNN_name.sql files applied on top of foodconnect.sql,
+#tracked with PRAGMA user_version. A hook in MIGRATION_PRE_HOOKS / MIGRATION_HOOKS runs
+#before / after its script, inside the same transaction (used for data fix-ups and
+#backfills that also exist as CLI commands).
+MIGRATION_PRE_HOOKS = {}
+MIGRATION_HOOKS = {}
+
+def split_sql_script(script):
+    """Split a SQL script into statements (trigger bodies stay whole)"""
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statements.append(buffer.strip())
+            buffer = ''
+    return statements
+
+def list_migrations():
+    """Get (version, filename) for every migration script, in order"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        prefix = filename.split('_', 1)[0]
+        if filename.endswith('.sql') and prefix.isdigit():
+            migrations.append((int(prefix), filename))
+    return sorted(migrations)
+
+def migrate_db(conn):
+    """Apply pending migrations, each in its own write transaction"""
+    migrations = list_migrations()
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    if not migrations or current >= migrations[-1][0]:
+        return []
+
+    applied = []
+    for version, filename in migrations:
+        if version <= current:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+            script = f.read()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            #Another worker may have applied it while we waited for the write lock
+            current = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version <= current:
+                conn.rollback()
+                continue
+            if version in MIGRATION_PRE_HOOKS:
+                MIGRATION_PRE_HOOKS[version](conn)
+            for statement in split_sql_script(script):
+                conn.execute(statement)
+            if version in MIGRATION_HOOKS:
+                MIGRATION_HOOKS[version](conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+        applied.append(filename)
+    return applied
+
+def create_database(database):
+    """Create a database file from foodconnect.sql and apply all migrations, replacing any existing one"""
+    for path in (database, database + '-wal', database + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = sqlite3.connect(database)
+    try:
+        with open(SCHEMA_FILE) as f:
+            conn.executescript(f.read())
+        return migrate_db(conn)
+    finally:
+        conn.close()
+
+@app.cli.command('init-db')
+@click.option('--force', is_flag=True, help='Replace an existing database file.')
+def init_db_command(force):
+    """Create a fresh database from foodconnect.sql and apply all migrations"""
+    database = app.config['DATABASE']
+    if os.path.exists(database) and not force:
+        raise click.ClickException(f'{database} already exists (use --force to replace it)')
+    applied = create_database(database)
+    click.echo(f'Initialised {database} ({len(applied)} migrations applied)')
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Apply pending migrations to an existing database"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        applied = migrate_db(conn)
+    finally:
+        conn.close()
+    for filename in applied:
+        click.echo(f'Applied {filename}')
+    if not applied:
+        click.echo('Database is up to date')
+
+@app.cli.command('seed-db')
+@click.option('--scale', type=click.Choice(list(SCALES)), default='small', help='Preset row counts.')
+@click.option('--seed', type=int, default=0, help='Random seed; the same seed gives the same rows.')
+@click.option('--today', default=None, help='Generate dates relative to this ISO date.')
+@click.option('--users', type=int, default=None, help='Override the preset number of users.')
+@click.option('--locations', type=int, default=None, help='Override the preset number of locations.')
+@click.option('--food-items', type=int, default=None, help='Override the preset number of food items.')
+@click.option('--requests', type=int, default=None, help='Override the preset number of requests.')
+@click.option('--transactions', type=int, default=None, help='Override the preset number of transactions.')
+def seed_db_command(scale, seed, today, **overrides):
+    """Add synthetic users, locations, food items, requests and transactions (see seed_data.py)"""
+    counts = dict(SCALES[scale], **{name: value for name, value in overrides.items() if value is not None})
+    try:
+        today = date.fromisoformat(today) if today else None
+    except ValueError:
+        raise click.BadParameter('must be an ISO date (YYYY-MM-DD)', param_hint='--today')
+    conn = get_pool().connect()
+    try:
+        result = seed_database(conn, seed=seed, today=today, **counts)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    finally:
+        conn.close()
+    cache.clear()
+    click.echo(', '.join(f'{result[name]} {name}' for name in counts) + f' added in {result["elapsed_s"]}s')
+
+class TableCache:
+    """In-process TTL + LRU cache for read results, invalidated by per-table generation counters.
+
+    Every entry remembers the generation of the tables it was computed from. Write paths call
+    invalidate() after committing, which bumps those generations so stale entries miss on their
+    next read. Other worker processes are not notified; the TTL bounds how stale they can get.
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidated': 0, 'evicted': 0}
+
+    def get_or_compute(self, key, tables, compute):
+        """Return the cached value for key, calling compute() on a miss"""
+        with self._lock:
+            generations = tuple(self._generations.get(table, 0) for table in tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_generations, value = entry
+                if entry_generations != generations:
+                    self._stats['invalidated'] += 1
+                elif expires_at <= time.monotonic():
+                    self._stats['expired'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+            self._stats['misses'] += 1
+
+        #Stored under the generations seen before computing, so a concurrent write invalidates it
+        value = compute()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generations, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Mark everything computed from these tables as stale"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries, ttl=self.ttl,
+                        hit_rate=round(self._stats['hits'] / lookups, 4) if lookups else 0.0,
+                        generations=dict(self._generations))
+
+cache = TableCache(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_TTL'])
+
+#Response layer: JSON is encoded with orjson when it is installed (sqlite3.Row values are
+#written as objects), and compressible responses are gzip or brotli encoded when the client
+#accepts it and the body is at least COMPRESS_MIN_SIZE bytes (streamed bodies always are)
+class FoodConnectJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that understands sqlite3.Row and uses orjson when available"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self, sort_keys, indent=False):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        #orjson output is always compact, so only compact separators can go through it
+        if orjson is None or set(kwargs) - {'separators'} or kwargs.get('separators', (',', ':')) != (',', ':'):
+            kwargs.setdefault('default', self.default)
+            return super().dumps(obj, sort_keys=sort_keys, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options(sort_keys)).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self._orjson_options(self.sort_keys, indent)),
+            mimetype=self.mimetype)
+
+app.json = FoodConnectJSONProvider(app)
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/plain',
+                          'text/csv', 'text/css', 'text/javascript', 'application/javascript'}
+RESPONSE_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def compress_body(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    #mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    """Compress a streamed body chunk by chunk, flushing after each so clients see rows as they come"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress, flush, finish = (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+                                   compressor.flush)
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+@app.after_request
+def compress_response(response):
+    """Encode compressible 200 responses with the best encoding the client accepts"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(RESPONSE_ENCODINGS)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+
+    #Each encoding is its own representation, so it gets its own strong ETag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+#Request metrics: every request's latency, status, response size, SQL statements (with their
+#time and rows fetched) and template render time are recorded for GET /metrics, and requests
+#slower than SLOW_REQUEST_MS are logged with their SQL (see metrics.py)
+request_metrics = RequestMetrics()
+app.wsgi_app = RequestMetricsMiddleware(app.wsgi_app, request_metrics, app.config)
+
+def current_sample():
+    return request.environ.get(ENVIRON_KEY) if has_request_context() else None
+
+@app.before_request
+def label_request_sample():
+    sample = current_sample()
+    if sample is not None and request.endpoint:
+        sample.endpoint = request.endpoint
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    sample = current_sample()
+    if sample is not None:
+        sample.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def stop_render_timer(sender, template, context, **extra):
+    sample = current_sample()
+    if sample is not None and sample.render_started is not None:
+        sample.render_time += time.perf_counter() - sample.render_started
+        sample.render_started = None
+
+#Tables each cached read depends on
+KPI_SOURCE_TABLES = ('food_items', 'requests', 'transactions')
+INVENTORY_SOURCE_TABLES = ('food_items', 'locations')
+
+#Location registry: one locations row per normalised (city, street_address), see
+#migrations/005_location_registry.sql. Keys use the same normalisation as the unique
+#index, lower(trim(x)), which only trims spaces and only lowercases ASCII letters.
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def normalize_location_key(value):
+    """Python equivalent of SQLite's lower(trim(value))"""
+    return str(value).strip(' ').translate(ASCII_LOWER)
+
+class LocationRegistry:
+    """Process-local city -> location_id map, warmed at startup.
+
+    Ids are only added once the transaction that read or created them has committed,
+    so a rolled-back insert can never leave a dangling id in the map.
+    """
+
+    def __init__(self):
+        self._by_city = {}
+        self._lock = threading.Lock()
+
+    def warm(self, conn):
+        """Load the lowest location_id for every city"""
+        rows = conn.execute('''
+            SELECT lower(trim(city)) AS city_key, MIN(location_id) AS location_id
+            FROM locations GROUP BY city_key
+        ''').fetchall()
+        with self._lock:
+            self._by_city = {row['city_key']: row['location_id'] for row in rows}
+
+    def clear(self):
+        with self._lock:
+            self._by_city = {}
+
+    def _remember(self, conn, city_key, location_id):
+        def store():
+            with self._lock:
+                self._by_city.setdefault(city_key, location_id)
+        if hasattr(conn, 'after_commit'):
+            conn.after_commit(store)
+        elif not conn.in_transaction:
+            store()
+
+    def resolve(self, conn, city):
+        """Get the location_id for a city, registering the city if it is new"""
+        return self.resolve_many(conn, [city])[normalize_location_key(city)]
+
+    def resolve_many(self, conn, cities):
+        """Get {normalised city: location_id} for many cities, with one query for the unknown ones"""
+        keys = {normalize_location_key(city): city for city in cities}
+        with self._lock:
+            resolved = {key: self._by_city[key] for key in keys if key in self._by_city}
+        missing = sorted(key for key in keys if key not in resolved)
+        if not missing:
+            return resolved
+
+        #Upsert is a no-op for cities another worker (or an earlier request) already registered
+        conn.executemany('''
+            INSERT INTO locations (province, city, zip_code, street_address)
+            VALUES (?, ?, '0000', ?)
+            ON CONFLICT (lower(trim(city)), lower(trim(street_address))) DO NOTHING
+        ''', [(UNSPECIFIED, keys[key].strip(' '), UNSPECIFIED) for key in missing])
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = conn.execute(f'''
+                SELECT lower(trim(city)) AS city_key, MIN(location_id) AS location_id FROM locations
+                WHERE lower(trim(city)) IN ({','.join('?' * len(chunk))}) GROUP BY city_key
+            ''', chunk).fetchall()
+            for row in rows:
+                resolved[row['city_key']] = row['location_id']
+                self._remember(conn, row['city_key'], row['location_id'])
+        return resolved
+
+location_registry = LocationRegistry()
+
+def compact_locations(conn):
+    """Merge duplicate locations into the lowest location_id and repoint users and food_items.
+
+    Returns the number of rows removed. Run inside a write transaction.
+    """
+    conn.execute('DROP TABLE IF EXISTS temp.location_merge')
+    conn.execute('''
+        CREATE TEMP TABLE location_merge AS
+        SELECT l.location_id AS old_id, keep.location_id AS new_id
+        FROM locations l
+        JOIN (
+            SELECT lower(trim(city)) AS city_key, lower(trim(street_address)) AS address_key,
+                   MIN(location_id) AS location_id
+            FROM locations GROUP BY city_key, address_key HAVING COUNT(*) > 1
+        ) keep ON lower(trim(l.city)) = keep.city_key AND lower(trim(l.street_address)) = keep.address_key
+        WHERE l.location_id != keep.location_id
+    ''')
+    for table in ('users', 'food_items'):
+        conn.execute(f'''
+            UPDATE {table}
+            SET location_id = (SELECT new_id FROM location_merge WHERE old_id = {table}.location_id)
+            WHERE location_id IN (SELECT old_id FROM location_merge)
+        ''')
+    removed = conn.execute(
+        'DELETE FROM locations WHERE location_id IN (SELECT old_id FROM location_merge)').rowcount
+    conn.execute('DROP TABLE temp.location_merge')
+    location_registry.clear()
+    return removed
+
+MIGRATION_PRE_HOOKS[5] = compact_locations
+
+@app.cli.command('compact-locations')
+def compact_locations_command():
+    """Merge duplicate location rows and rewrite the foreign keys that point at them"""
+    conn = get_pool().connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        removed = compact_locations(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    click.echo(f'Merged {removed} duplicate locations')
 
 def login_required(f):
     """Decorator to require login for routes"""
@@ -40,6 +774,84 @@ def role_required(role):
         return decorated_function
     return decorator
 
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def ops_endpoint(f):
+    """Decorator for the metrics and stats endpoints: allowed with 'Authorization: Bearer
+    <OPS_TOKEN>', or without it from loopback when no proxy forwarded the request"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = app.config['OPS_TOKEN']
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            return f(*args, **kwargs)
+        if request.remote_addr in LOOPBACK_ADDRESSES and 'X-Forwarded-For' not in request.headers:
+            return f(*args, **kwargs)
+        return jsonify({'error': 'Forbidden'}), 403
+    return decorated_function
+
+#Conditional GET: read APIs and dashboards send an ETag and Last-Modified derived from the
+#table_versions counters (migrations/008_table_versions.sql) of the tables they read, and
+#answer If-None-Match / If-Modified-Since with 304 before running any of their own queries
+FOOD_ITEM_TABLES = ('food_items', 'users', 'locations')
+REQUEST_TABLES = ('requests', 'food_items', 'users', 'locations')
+
+def read_table_versions(conn, tables):
+    """Get {table: (version, modified_at)} for the given tables"""
+    placeholders = ', '.join('?' * len(tables))
+    return {row['table_name']: (row['version'], row['modified_at']) for row in conn.execute(
+        f'SELECT table_name, version, modified_at FROM table_versions WHERE table_name IN ({placeholders})',
+        tables)}
+
+def conditional(*tables):
+    """Decorator to add ETag / Last-Modified headers to a GET route that only reads the given tables.
+
+    The ETag covers the URL with its query string, the logged-in user, today's UTC date (for
+    the date('now') filters) and the tables' versions, so any write to those tables changes it.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            #A page showing flash messages can't be rebuilt from the data alone
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            versions = g.table_versions = read_table_versions(get_db_connection(), tables)
+            state = json.dumps([request.full_path, session.get('user_id'), utc_today().isoformat(),
+                                sorted(versions.items())])
+            etag = hashlib.blake2b(state.encode(), digest_size=16).hexdigest()
+            last_modified = datetime.strptime(max(modified for _, modified in versions.values()),
+                                              '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+            #Another write in the same second keeps the same Last-Modified, so it is only
+            #trusted (and sent) once that second is over; the ETag covers the rest
+            settled = last_modified < datetime.now(timezone.utc).replace(microsecond=0)
+
+            #The client may hold one of the -gzip / -br variants set by compress_response()
+            held_tag = None
+            if request.if_none_match:
+                held_tag = next((tag for tag in request.if_none_match.as_set(include_weak=True)
+                                 if tag == etag or tag.startswith(etag + '-')),
+                                etag if request.if_none_match.star_tag else None)
+            elif settled and request.if_modified_since is not None and last_modified <= request.if_modified_since:
+                held_tag = etag
+            if held_tag:
+                response = app.response_class(status=304)
+                response.set_etag(held_tag)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+
+            if settled:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
+
 #Our Hompage Route 
 @app.route('/')
 def index():
@@ -70,30 +882,23 @@ def signup():
                 flash('Passwords do not match!', 'error')
                 return render_template('signup.html')
 
-            conn = get_db_connection()
+            storage = get_storage()
 
-            #Check if email already exsists
-            existing_user = conn.execute('SELECT email FROM users WHERE email = ?', (email,)).fetchone()
-            if existing_user:
-                flash('Email already registered. Please login.', 'error')
-                conn.close()
-                return render_template('signup.html')
+            def create_user(conn):
+                #Check if email already exsists
+                if storage.users.email_exists(conn, email):
+                    return False
 
-            #Create default location for new user
-            conn.execute('''
-                INSERT INTO locations (province, city, zip_code, street_address)
-                VALUES (?, ?, ?, ?)
-            ''', ('Not specified', 'Not specified', '0000', 'Not specified'))
-            location_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+                #New users share the registry's 'Not specified' location until they set a city
+                location_id = storage.locations.resolve(conn, UNSPECIFIED)
 
-            #Insert new user
-            conn.execute('''
-                INSERT INTO users (user_fullname, occupation, location_id, contact_number, email, password)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_fullname, '', location_id, contact_number, email, password))
+                #Insert new user
+                storage.users.create(conn, user_fullname, contact_number, email, password, location_id)
+                return True
 
-            conn.commit()
-            conn.close()
+            if not storage.write(create_user):
+                flash('Email already registered. Please login.', 'error')
+                return render_template('signup.html')
 
             flash('Account created successfully! Please log in.', 'success')
             return redirect(url_for('index'))
@@ -112,20 +917,18 @@ def supplier_login():
             email = request.form['email']
             password = request.form['password']
 
-            conn = get_db_connection()
+            storage = get_storage()
 
-            #Validate user credentials
-            user = conn.execute('SELECT * FROM users WHERE email = ? AND password = ?', (email, password)).fetchone()
+            #Validate user credentials (the user's roles come with it)
+            user = storage.read(lambda conn: storage.users.find_with_roles(conn, email, password))
 
             if user:
                 #Check if user has Supplier role
-                roles = conn.execute('SELECT role FROM user_roles WHERE user_id = ?', (user['user_id'],)).fetchall()
-                user_roles = [role['role'] for role in roles]
+                user_roles = user['roles'].split(',') if user['roles'] else []
 
                 #So if user doesn't have Supplier role, add it
                 if 'Supplier' not in user_roles:
-                    conn.execute('INSERT INTO user_roles (user_id, role) VALUES (?, ?)', (user['user_id'], 'Supplier'))
-                    conn.commit()
+                    storage.write(lambda conn: storage.users.add_role(conn, user['user_id'], 'Supplier'))
                     user_roles.append('Supplier')
 
                 #Set sesion
@@ -133,12 +936,10 @@ def supplier_login():
                 session['user_fullname'] = user['user_fullname']
                 session['roles'] = user_roles
 
-                conn.close()
                 flash('Login successful!', 'success')
                 return redirect(url_for('supplier_dashboard'))
             else:
                 flash('Invalid email or password.', 'error')
-                conn.close()
                 return render_template('supplierlogin.html')
 
         except Exception as e:
@@ -155,20 +956,18 @@ def recipient_login():
             email = request.form['email']
             password = request.form['password']
 
-            conn = get_db_connection()
+            storage = get_storage()
 
-            #Validate user credentials
-            user = conn.execute('SELECT * FROM users WHERE email = ? AND password = ?', (email, password)).fetchone()
+            #Validate user credentials (the user's roles come with it)
+            user = storage.read(lambda conn: storage.users.find_with_roles(conn, email, password))
 
             if user:
                 #Check if user has Recipient role
-                roles = conn.execute('SELECT role FROM user_roles WHERE user_id = ?', (user['user_id'],)).fetchall()
-                user_roles = [role['role'] for role in roles]
+                user_roles = user['roles'].split(',') if user['roles'] else []
 
                 #So if user doesn't have Recipient role, add it
                 if 'Recipient' not in user_roles:
-                    conn.execute('INSERT INTO user_roles (user_id, role) VALUES (?, ?)', (user['user_id'], 'Recipient'))
-                    conn.commit()
+                    storage.write(lambda conn: storage.users.add_role(conn, user['user_id'], 'Recipient'))
                     user_roles.append('Recipient')
 
                 #Set sesssion
@@ -176,12 +975,10 @@ def recipient_login():
                 session['user_fullname'] = user['user_fullname']
                 session['roles'] = user_roles
 
-                conn.close()
                 flash('Login successful!', 'success')
                 return redirect(url_for('recipient_dashboard'))
             else:
                 flash('Invalid email or password.', 'error')
-                conn.close()
                 return render_template('recipientlogin.html')
 
         except Exception as e:
@@ -197,62 +994,236 @@ def logout():
     flash('You have been logged out successfully.', 'success')
     return redirect(url_for('index'))
 
+#KPI counters (see migrations/001_kpi_counters.sql), maintained by triggers
+KPI_TABLES = ('kpi_counters', 'kpi_supplier_counters', 'kpi_recipient_counters',
+              'kpi_transaction_pairs', 'kpi_daily_counters', 'kpi_expiry_buckets')
+
+def kpi_source_tables(conn):
+    """The tables the KPI counters count: the *_history views (hot plus archived rows, see
+    migrations/010_archive_tables.sql) once they exist, the hot tables before that"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'food_items_history'").fetchone():
+        return 'food_items_history', 'requests_history', 'transactions_history'
+    return 'food_items', 'requests', 'transactions'
+
+def rebuild_kpi_counters(conn):
+    """Recompute every KPI counter table from the base tables, archived rows included"""
+    food_items, requests, transactions = kpi_source_tables(conn)
+    #Lots split off by partial claims are not items of their own (migrations/013_food_item_lots.sql)
+    if conn.execute("SELECT 1 FROM pragma_table_info('food_items') WHERE name = 'parent_item_id'").fetchone():
+        food_items = f'(SELECT * FROM {food_items} WHERE parent_item_id IS NULL)'
+    for table in KPI_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+
+    conn.execute(f'''
+        INSERT INTO kpi_counters (name, value)
+        SELECT 'total_items', COUNT(*) FROM {food_items}
+        UNION ALL SELECT 'requests', COUNT(*) FROM {requests}
+        UNION ALL SELECT 'active_requests', COUNT(*) FROM {requests} WHERE status = 'Pending'
+        UNION ALL SELECT 'transactions', COUNT(*) FROM {transactions}
+        UNION ALL SELECT 'kg_donated', COALESCE(SUM(quantity), 0) FROM {transactions}
+        UNION ALL SELECT 'recipients_helped', COUNT(DISTINCT recipient_id) FROM {transactions}
+        UNION ALL SELECT 'suppliers_count', COUNT(DISTINCT supplier_id) FROM {transactions}
+    ''')
+    conn.execute(f'''
+        INSERT INTO kpi_supplier_counters (user_id, total_items, donated, kg_donated)
+        SELECT user_id, SUM(total_items), SUM(donated), SUM(kg_donated) FROM (
+            SELECT user_id, COUNT(*) AS total_items, 0 AS donated, 0 AS kg_donated
+            FROM {food_items} GROUP BY user_id
+            UNION ALL
+            SELECT supplier_id, 0, COUNT(*), SUM(quantity)
+            FROM {transactions} GROUP BY supplier_id
+        ) GROUP BY user_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO kpi_recipient_counters (user_id, requests, received, kg_received, suppliers)
+        SELECT user_id, SUM(requests), SUM(received), SUM(kg_received), SUM(suppliers) FROM (
+            SELECT recipient_id AS user_id, COUNT(*) AS requests, 0 AS received, 0 AS kg_received, 0 AS suppliers
+            FROM {requests} GROUP BY recipient_id
+            UNION ALL
+            SELECT recipient_id, 0, COUNT(*), SUM(quantity), COUNT(DISTINCT supplier_id)
+            FROM {transactions} GROUP BY recipient_id
+        ) GROUP BY user_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO kpi_transaction_pairs (supplier_id, recipient_id, transactions)
+        SELECT supplier_id, recipient_id, COUNT(*) FROM {transactions} GROUP BY supplier_id, recipient_id
+    ''')
+    conn.execute(f'''
+        INSERT INTO kpi_daily_counters (day, name, value)
+        SELECT date(created_at), 'donated', COUNT(*) FROM {transactions} GROUP BY date(created_at)
+    ''')
+    conn.execute(f'''
+        INSERT INTO kpi_expiry_buckets (user_id, expiry_day, items, open_items)
+        SELECT user_id, expiry_day, COUNT(*), SUM(status != 'Completed') FROM (
+            SELECT user_id, COALESCE(date(expiry_date), expiry_date) AS expiry_day, status FROM {food_items}
+        ) GROUP BY user_id, expiry_day
+        UNION ALL
+        SELECT 0, expiry_day, COUNT(*), SUM(status != 'Completed') FROM (
+            SELECT COALESCE(date(expiry_date), expiry_date) AS expiry_day, status FROM {food_items}
+        ) GROUP BY expiry_day
+    ''')
+
+MIGRATION_HOOKS[1] = rebuild_kpi_counters
+
+def kpi_snapshot(conn):
+    """Get every non-zero KPI counter row as {(table, key...): values} for drift checks"""
+    snapshot = {}
+    for table in KPI_TABLES:
+        key_count = 2 if table in ('kpi_transaction_pairs', 'kpi_daily_counters', 'kpi_expiry_buckets') else 1
+        for row in conn.execute(f'SELECT * FROM {table}'):
+            values = tuple(round(value, 6) for value in tuple(row)[key_count:])
+            if any(values):
+                snapshot[(table,) + tuple(row)[:key_count]] = values
+    return snapshot
+
+@app.cli.command('rebuild-kpis')
+@click.option('--check', is_flag=True, help='Only report drift, keep the current counters.')
+def rebuild_kpis_command(check):
+    """Recompute the KPI counters from scratch and report any drift"""
+    conn = get_pool().connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        before = kpi_snapshot(conn)
+        rebuild_kpi_counters(conn)
+        after = kpi_snapshot(conn)
+        drift = sorted(key for key in before.keys() | after.keys() if before.get(key) != after.get(key))
+        for key in drift:
+            click.echo(f'{key}: counted {before.get(key)}, actual {after.get(key)}')
+        if check:
+            conn.rollback()
+        else:
+            conn.commit()
+    finally:
+        conn.close()
+
+    click.echo(f'{len(drift)} counter rows drifted' + ('' if check else ', counters rebuilt'))
+    if check and drift:
+        raise SystemExit(1)
+
+def get_global_kpis(conn):
+    """Get the global dashboard KPIs from the counter tables"""
+    kpis = {row['name']: row['value'] for row in conn.execute('SELECT name, value FROM kpi_counters')}
+    kpis['expiring_soon'] = conn.execute('''
+        SELECT COALESCE(SUM(open_items), 0) FROM kpi_expiry_buckets
+        WHERE user_id = 0 AND expiry_day BETWEEN date('now') AND date('now', '+7 days')
+    ''').fetchone()[0]
+    kpis['donated_today'] = conn.execute('''
+        SELECT COALESCE(SUM(value), 0) FROM kpi_daily_counters
+        WHERE day = date('now') AND name = 'donated'
+    ''').fetchone()[0]
+    return kpis
+
+def get_user_kpis(conn, user_type, user_id):
+    """Get one supplier's or recipient's KPIs from the counter tables"""
+    if user_type == 'supplier':
+        counters = conn.execute('''
+            SELECT total_items, donated, kg_donated FROM kpi_supplier_counters WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+        return {
+            'total_items': counters['total_items'] if counters else 0,
+            'expiring_soon': conn.execute('''
+                SELECT COALESCE(SUM(items), 0) FROM kpi_expiry_buckets
+                WHERE user_id = ? AND expiry_day BETWEEN date('now') AND date('now', '+7 days')
+            ''', (user_id,)).fetchone()[0],
+            'donated': counters['donated'] if counters else 0,
+            'kg_donated': counters['kg_donated'] if counters else 0
+        }
+
+    counters = conn.execute('''
+        SELECT requests, kg_received, suppliers FROM kpi_recipient_counters WHERE user_id = ?
+    ''', (user_id,)).fetchone()
+    return {
+        'requests': counters['requests'] if counters else 0,
+        'kg_received': counters['kg_received'] if counters else 0,
+        'suppliers': counters['suppliers'] if counters else 0
+    }
+
+def utc_today():
+    """Today's date as SQLite's date('now') sees it (UTC), for cache keys and checks that must agree with it"""
+    return datetime.now(timezone.utc).date()
+
+def parse_expiry_date(value):
+    """Validate an expiry date (the whole value, surrounding spaces aside, must be an ISO date)
+    and return it as the ISO 'YYYY-MM-DD' string stored in food_items"""
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        raise ValueError('expiry_date must be a date in YYYY-MM-DD format')
+
+#Supplier dashboard inventory: ?page=, ?per_page= and ?sort= (a key of INVENTORY_SORTS)
+#with ?order=asc|desc. The KPI and inventory fragments are rendered once per data version
+#(the table_versions counters, migrations/008_table_versions.sql) and cached as HTML, so a
+#view with nothing changed runs neither their queries nor their templates.
+INVENTORY_SORTS = {
+    'expiry_date': 'f.expiry_date',
+    'created_at': 'f.created_at',
+    'food_name': 'f.food_name',
+    'food_type': 'f.food_type',
+    'quantity': 'f.quantity_available',
+    'status': 'f.status',
+    'city': 'l.city'
+}
+DEFAULT_INVENTORY_PAGE_SIZE = 25
+MAX_INVENTORY_PAGE_SIZE = 100
+
+def data_version(tables):
+    """The table_versions counters of tables, reusing the ones conditional() read for this request"""
+    versions = g.get('table_versions')
+    if versions is None or not versions.keys() >= set(tables):
+        versions = read_table_versions(get_db_connection(), tables)
+    return tuple(versions[table][0] for table in tables)
+
+def parse_inventory_args():
+    """Get (page, per_page, sort, order) from the query string; invalid values fall back to the defaults"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DEFAULT_INVENTORY_PAGE_SIZE, type=int)
+    sort = request.args.get('sort', 'expiry_date')
+    order = request.args.get('order', 'asc')
+    return (max(page, 1),
+            min(max(per_page, 1), MAX_INVENTORY_PAGE_SIZE),
+            sort if sort in INVENTORY_SORTS else 'expiry_date',
+            order if order in ('asc', 'desc') else 'asc')
+
+def render_inventory_fragment(page, per_page, sort, order):
+    """Render one page of the global inventory table (the last page if page is past the end).
+    Lots split off by partial claims are counted in their parent item, not listed."""
+    conn = get_db_connection()
+    total = conn.execute('SELECT COUNT(*) FROM food_items WHERE parent_item_id IS NULL').fetchone()[0]
+    pages = max(math.ceil(total / per_page), 1)
+    page = min(page, pages)
+    #item_id breaks ties, so rows never move between pages
+    inventory = conn.execute(f'''
+        SELECT f.item_id, f.food_name, f.food_type, f.quantity_available, f.expiry_date, f.status, l.city
+        FROM food_items f
+        LEFT JOIN locations l ON f.location_id = l.location_id
+        WHERE f.parent_item_id IS NULL
+        ORDER BY {INVENTORY_SORTS[sort]} {order}, f.item_id {order}
+        LIMIT ? OFFSET ?
+    ''', (per_page, (page - 1) * per_page)).fetchall()
+    return Markup(render_template('supplier-dashboard-inventory.html', inventory=inventory, page=page,
+                                  pages=pages, total=total, per_page=per_page, sort=sort, order=order))
+
 #Suplier Dashboard Route
 @app.route('/supplier-dashboard')
 @role_required('Supplier')
+@conditional(*KPI_SOURCE_TABLES, *INVENTORY_SOURCE_TABLES)
 def supplier_dashboard():
     try:
-        conn = get_db_connection()
-
-        #GLOBAL KPIs (same for any supplier who logs in)
-        total_items = conn.execute(
-            'SELECT COUNT(*) FROM food_items'
-        ).fetchone()[0]
-
-        expiring_soon = conn.execute('''
-            SELECT COUNT(*) FROM food_items
-            WHERE date(expiry_date) BETWEEN date('now') AND date('now', '+7 days')
-              AND status != 'Completed'
-        ''').fetchone()[0]
-
-        donated_today = conn.execute('''
-            SELECT COUNT(*) FROM transactions
-            WHERE date(created_at) = date('now')
-        ''').fetchone()[0]
-
-        active_requests = conn.execute('''
-            SELECT COUNT(*) FROM requests
-            WHERE status = 'Pending'
-        ''').fetchone()[0]
-
-        recipients_helped = conn.execute('''
-            SELECT COUNT(DISTINCT recipient_id) FROM transactions
-        ''').fetchone()[0]
-
-        kg_donated = conn.execute('''
-            SELECT COALESCE(SUM(quantity), 0) FROM transactions
-        ''').fetchone()[0]
-
-        # GLOBAL inventory – all food_items from all suppliers
-        inventory = conn.execute('''
-            SELECT f.*, l.city, l.street_address, u.user_fullname
-            FROM food_items f
-            LEFT JOIN locations l ON f.location_id = l.location_id
-            LEFT JOIN users u ON f.user_id = u.user_id
-            ORDER BY f.expiry_date ASC
-        ''').fetchall()
+        #GLOBAL KPIs (same for any supplier who logs in); expiring soon and donated today depend on the date
+        kpi_fragment = cache.get_or_compute(
+            ('supplier_dashboard', 'kpis', utc_today(), data_version(KPI_SOURCE_TABLES)), KPI_SOURCE_TABLES,
+            lambda: Markup(render_template('supplier-dashboard-kpis.html', **get_global_kpis(get_db_connection()))))
 
-        conn.close()
+        # GLOBAL inventory – one page of food_items from all suppliers
+        inventory_args = parse_inventory_args()
+        inventory_fragment = cache.get_or_compute(
+            ('supplier_dashboard', 'inventory', inventory_args, data_version(INVENTORY_SOURCE_TABLES)),
+            INVENTORY_SOURCE_TABLES, lambda: render_inventory_fragment(*inventory_args))
 
         return render_template(
             'supplier-dashboard.html',
-            total_items=total_items,
-            expiring_soon=expiring_soon,
-            donated_today=donated_today,
-            active_requests=active_requests,
-            recipients_helped=recipients_helped,
-            kg_donated=kg_donated,
-            inventory=inventory
+            kpi_fragment=kpi_fragment,
+            inventory_fragment=inventory_fragment
         )
 
     except Exception as e:
@@ -269,42 +1240,35 @@ def upload_food_surplus():
 
             #Get data form the forms
             food_type = request.form['food_type']
-            food_name = request.form['food_name']
+            food_name = request.form['food_name'].strip()
             quantity_available = float(request.form['quantity_available'])
-            expiry_date = request.form['expiry_date']
+            expiry_date = parse_expiry_date(request.form['expiry_date'])
             delivery_option = request.form['delivery_option']
-            city = request.form['city']
+            city = request.form['city'].strip()
+            if not food_name or not city:
+                raise ValueError('Food name and city are required')
             description = request.form.get('description', '')
             occupation = request.form['occupation']
             contact_number = request.form['contact_number']
 
-            conn = get_db_connection()
+            def insert_food_item(conn):
+                #Update user occupation if provided
+                if occupation:
+                    conn.execute('UPDATE users SET occupation = ? WHERE user_id = ?', (occupation, user_id))
 
-            #Update user occupation if provided
-            if occupation:
-                conn.execute('UPDATE users SET occupation = ? WHERE user_id = ?', (occupation, user_id))
+                #Create or get location
+                location_id = location_registry.resolve(conn, city)
 
-            #Create or get location
-            location = conn.execute('SELECT location_id FROM locations WHERE city = ?', (city,)).fetchone()
-            if location:
-                location_id = location['location_id']
-            else:
+                #Insert food item
                 conn.execute('''
-                    INSERT INTO locations (province, city, zip_code, street_address)
-                    VALUES (?, ?, ?, ?)
-                ''', ('Not specified', city, '0000', 'Not specified'))
-                location_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-
-            #Insert food item
-            conn.execute('''
-                INSERT INTO food_items (user_id, food_type, food_name, quantity_available,
-                                       expiry_date, delivery_option, location_id, description, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, food_type, food_name, quantity_available, expiry_date,
-                  delivery_option, location_id, description, 'Unselected'))
+                    INSERT INTO food_items (user_id, food_type, food_name, quantity_available,
+                                           expiry_date, delivery_option, location_id, description, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, food_type, food_name, quantity_available, expiry_date,
+                      delivery_option, location_id, description, 'Unselected'))
 
-            conn.commit()
-            conn.close()
+            perform_write(insert_food_item)
+            cache.invalidate('food_items', 'locations', 'users')
 
             flash('Food surplus uploaded successfully!', 'success')
             return redirect(url_for('supplier_dashboard'))
@@ -318,6 +1282,7 @@ def upload_food_surplus():
 #View Recipient needs Route
 @app.route('/view-recipient-needs')
 @role_required('Supplier')
+@conditional(*REQUEST_TABLES)
 def view_recipient_needs():
     try:
         conn = get_db_connection()
@@ -340,8 +1305,6 @@ def view_recipient_needs():
             ORDER BY r.created_at DESC
         ''').fetchall()
 
-        conn.close()
-
         return render_template('view-recipient-needs.html', requests=requests)
 
     except Exception as e:
@@ -351,30 +1314,18 @@ def view_recipient_needs():
 # Recipient Dashboard Route
 @app.route('/recipient-dashboard')
 @role_required('Recipient')
+@conditional(*KPI_SOURCE_TABLES)
 def recipient_dashboard():
     try:
-        conn = get_db_connection()
-
         # GLOBAL KPIs – same "Food Impact Overview" for any recipient
-        requests_uploaded = conn.execute(
-            'SELECT COUNT(*) FROM requests'
-        ).fetchone()[0]
-
-        kg_received = conn.execute('''
-            SELECT COALESCE(SUM(quantity), 0) FROM transactions
-        ''').fetchone()[0]
-
-        suppliers_count = conn.execute('''
-            SELECT COUNT(DISTINCT supplier_id) FROM transactions
-        ''').fetchone()[0]
-
-        conn.close()
+        kpis = cache.get_or_compute(('recipient_dashboard', 'kpis', utc_today()), KPI_SOURCE_TABLES,
+                                    lambda: get_global_kpis(get_db_connection()))
 
         return render_template(
             'recipient-dashboard.html',
-            requests_uploaded=requests_uploaded,
-            recipients_supported=suppliers_count,
-            food_received=kg_received
+            requests_uploaded=kpis['requests'],
+            recipients_supported=kpis['suppliers_count'],
+            food_received=kpis['kg_donated']
         )
 
     except Exception as e:
@@ -394,29 +1345,23 @@ def upload_request():
             quantity_needed = float(request.form['quantity_needed'])
             urgency_level = request.form.get('urgency_level', 'Medium')
 
-            conn = get_db_connection()
-
-            #Check if quantity needed is available
-            food_item = conn.execute('SELECT quantity_available FROM food_items WHERE item_id = ?', (item_id,)).fetchone()
-
-            if not food_item:
-                flash('Food item not found.', 'error')
-                conn.close()
-                return redirect(url_for('view_available_surplus'))
+            #Check and insert under the write lock, so the quantity can't change in between
+            def submit_request(conn):
+                food_item = conn.execute('SELECT quantity_available FROM food_items WHERE item_id = ?', (item_id,)).fetchone()
+                if not food_item:
+                    return 'Food item not found.'
+                if quantity_needed > food_item['quantity_available']:
+                    return 'Requested quantity exceeds available quantity.'
+                conn.execute('''
+                    INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, status)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (item_id, user_id, quantity_needed, urgency_level, 'Pending'))
 
-            if quantity_needed > food_item['quantity_available']:
-                flash('Requested quantity exceeds available quantity.', 'error')
-                conn.close()
+            error = perform_write(submit_request)
+            if error:
+                flash(error, 'error')
                 return redirect(url_for('view_available_surplus'))
-
-            #Insert request
-            conn.execute('''
-                INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, status)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (item_id, user_id, quantity_needed, urgency_level, 'Pending'))
-
-            conn.commit()
-            conn.close()
+            cache.invalidate('requests')
 
             flash('Request submitted successfully!', 'success')
             return redirect(url_for('recipient_dashboard'))
@@ -427,13 +1372,114 @@ def upload_request():
 
     return render_template('uploadrequest.html')
 
+#Proximity search: locations carry latitude/longitude and a 0.1 degree grid cell
+#(migrations/006_location_coordinates.sql). A search reads only the grid cells around the
+#point through idx_locations_grid, then keeps the locations that are really within radius_km.
+GRID_CELLS_PER_DEGREE = 10
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 500
+MAX_NEARBY_RESULTS = 500
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance between two points in km"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+def grid_bounds(lat, lon, radius_km):
+    """Grid rows and columns covering the search circle (column bounds are None near the poles or antimeridian)"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    row_min = int((max(lat - lat_delta, -90) + 90) * GRID_CELLS_PER_DEGREE)
+    row_max = int((min(lat + lat_delta, 90) + 90) * GRID_CELLS_PER_DEGREE)
+    edge_lat = abs(lat) + lat_delta
+    if edge_lat >= 90:
+        return row_min, row_max, None, None
+    lon_delta = lat_delta / math.cos(math.radians(edge_lat))
+    if lon - lon_delta < -180 or lon + lon_delta > 180:
+        return row_min, row_max, None, None
+    return (row_min, row_max,
+            int((lon - lon_delta + 180) * GRID_CELLS_PER_DEGREE),
+            int((lon + lon_delta + 180) * GRID_CELLS_PER_DEGREE))
+
+def find_nearby_locations(conn, lat, lon, radius_km):
+    """Get [(location_id, distance_km)] for locations within radius_km of the point, closest first"""
+    row_min, row_max, col_min, col_max = grid_bounds(lat, lon, radius_km)
+    query = 'SELECT location_id, latitude, longitude FROM locations WHERE grid_row BETWEEN ? AND ?'
+    params = [row_min, row_max]
+    if col_min is not None:
+        query += ' AND grid_col BETWEEN ? AND ?'
+        params += [col_min, col_max]
+
+    nearby = []
+    for row in conn.execute(query, params):
+        distance = distance_km(lat, lon, row['latitude'], row['longitude'])
+        if distance <= radius_km:
+            nearby.append((row['location_id'], round(distance, 2)))
+    return sorted(nearby, key=lambda location: location[1])
+
+def find_nearby_items(conn, lat, lon, radius_km, limit=MAX_NEARBY_RESULTS, food_type=None, fields=None):
+    """Get available, unexpired food items within radius_km of the point, closest first.
+
+    fields limits the selected columns to those NEARBY_COLUMNS names (default all of them).
+    """
+    nearby = find_nearby_locations(conn, lat, lon, radius_km)
+    if not nearby:
+        return []
+
+    conditions = ["f.status = 'Unselected'", "f.expiry_date >= date('now')"]
+    params = [json.dumps(nearby)]
+    if food_type:
+        conditions.append('f.food_type = ?')
+        params.append(food_type)
+
+    #CROSS JOIN keeps the nearby locations as the outer loop, so food_items is only
+    #read through idx_food_items_location_status_expiry for those locations
+    return conn.execute(f'''
+        SELECT {select_list(NEARBY_COLUMNS, fields or list(NEARBY_COLUMNS))}
+        FROM (SELECT json_extract(value, '$[0]') AS location_id, json_extract(value, '$[1]') AS distance_km
+              FROM json_each(?)) n
+        CROSS JOIN food_items f ON f.location_id = n.location_id
+        JOIN users u ON f.user_id = u.user_id
+        JOIN locations l ON l.location_id = n.location_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY n.distance_km, f.expiry_date, f.item_id
+        LIMIT ?
+    ''', params + [limit]).fetchall()
+
+def parse_radius(value):
+    """Validate a radius_km argument (raises ValueError with the reason)"""
+    try:
+        radius_km = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('radius_km must be a number')
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    return radius_km
+
 #View Available Surplus Route
 @app.route('/view-available-surplus')
 @role_required('Recipient')
+@conditional(*FOOD_ITEM_TABLES)
 def view_available_surplus():
     try:
         conn = get_db_connection()
 
+        #Nearby mode: only items within radius_km of the recipient's own location
+        radius_km = parse_radius(request.args['radius_km']) if request.args.get('radius_km') else None
+        if radius_km:
+            home = conn.execute('''
+                SELECT l.latitude, l.longitude
+                FROM users u JOIN locations l ON u.location_id = l.location_id
+                WHERE u.user_id = ?
+            ''', (session['user_id'],)).fetchone()
+            if home is not None and home['latitude'] is not None:
+                surplus = find_nearby_items(conn, home['latitude'], home['longitude'], radius_km)
+                return render_template('view-available-surplus.html', surplus=surplus, radius_km=radius_km)
+            flash('Your location has no known coordinates yet, showing surplus from everywhere.', 'error')
+            radius_km = None
+
         #Get all available food items
         surplus = conn.execute('''
             SELECT
@@ -446,86 +1492,405 @@ def view_available_surplus():
             FROM food_items f
             JOIN users u ON f.user_id = u.user_id
             LEFT JOIN locations l ON f.location_id = l.location_id
-            WHERE f.status = 'Unselected' AND date(f.expiry_date) >= date('now')
+            WHERE f.status = 'Unselected' AND f.expiry_date >= date('now')
             ORDER BY f.expiry_date ASC
         ''').fetchall()
 
-
-        conn.close()
-
-        return render_template('view-available-surplus.html', surplus=surplus)
+        return render_template('view-available-surplus.html', surplus=surplus, radius_km=radius_km)
 
     except Exception as e:
         flash(f'Error loading surplus: {str(e)}', 'error')
         return redirect(url_for('recipient_dashboard'))
 
+#Sparse fieldsets: ?fields=item_id,food_name,... picks the fields a JSON API returns, and
+#only those columns are selected. Each API maps the field names it accepts to SQL.
+FOOD_ITEM_COLUMNS = {
+    'item_id': 'f.item_id',
+    'user_id': 'f.user_id',
+    'food_type': 'f.food_type',
+    'food_name': 'f.food_name',
+    'quantity_available': 'f.quantity_available',
+    'expiry_date': 'f.expiry_date',
+    'delivery_option': 'f.delivery_option',
+    'location_id': 'f.location_id',
+    'description': 'f.description',
+    'created_at': 'f.created_at',
+    'status': 'f.status',
+    'user_fullname': 'u.user_fullname',
+    'city': 'l.city'
+}
+REQUEST_COLUMNS = {
+    'request_id': 'r.request_id',
+    'item_id': 'r.item_id',
+    'recipient_id': 'r.recipient_id',
+    'quantity_needed': 'r.quantity_needed',
+    'urgency_level': 'r.urgency_level',
+    'status': 'r.status',
+    'created_at': 'r.created_at',
+    'food_name': 'f.food_name',
+    'user_fullname': 'u.user_fullname'
+}
+SEARCH_COLUMNS = dict(FOOD_ITEM_COLUMNS, score='food_items_fts.rank',
+                      snippet="snippet(food_items_fts, -1, '<b>', '</b>', '...', 12)")
+NEARBY_COLUMNS = dict({name: f'f.{name}' for name in FOOD_ITEM_COLUMNS if name not in ('user_fullname', 'city')},
+                      distance_km='n.distance_km', supplier_name='u.user_fullname', occupation='u.occupation',
+                      contact_number='u.contact_number', city='l.city', street_address='l.street_address')
+
+def select_list(columns, names):
+    """SQL select list for the given field names"""
+    return ', '.join(f'{columns[name]} AS {name}' for name in names)
+
+def parse_fields(columns, keys=()):
+    """Get (output names, selected names) for ?fields= (every field when it is absent).
+
+    Key columns the next-page cursor needs are selected after the requested fields even when
+    they were not asked for; dict(zip(names, row)) then leaves them out of the output.
+    """
+    requested = request.args.get('fields')
+    if not requested:
+        names = list(columns)
+    else:
+        names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+        unknown = [name for name in names if name not in columns]
+        if not names or unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown) or '(none)'}. Allowed: {', '.join(columns)}")
+    return names, names + [key for key in keys if key not in names]
+
+def query_rows(conn, query, params):
+    """Run a read query returning plain tuples, skipping the sqlite3.Row wrapper"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor.execute(query, params).fetchall()
+
+#Keyset pagination for the list APIs: pages are ordered by a unique key and the
+#cursor holds the last key sent, so every page is an index range scan (no OFFSET)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(values):
+    """Encode the last row's sort key as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, types):
+    """Decode a cursor made by encode_cursor whose values must have types, one type (or tuple
+    of types) per key column (raises ValueError if it is malformed)"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if (not isinstance(values, list) or len(values) != len(types)
+            or any(isinstance(value, bool) or not isinstance(value, kind) for value, kind in zip(values, types))):
+        raise ValueError('Invalid cursor')
+    return values
+
+def parse_page_args(key_types=(str, int)):
+    """Get (limit, decoded cursor or None) from the query string; key_types are the types of
+    the sort key columns the cursor holds"""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor, key_types) if cursor else None
+
+def page_response(rows, limit, names, selected, key_columns):
+    """JSON list of up to limit rows (rows holds one extra row if there is a next page).
+
+    rows are tuples of the selected columns from parse_fields(). The next page's cursor is sent
+    in the X-Next-Cursor header and as a Link rel="next" URL, so the body keeps the plain list
+    shape existing clients expect.
+    """
+    page = rows[:limit]
+    response = jsonify([dict(zip(names, row)) for row in page])
+    if len(rows) > limit:
+        cursor = encode_cursor([page[-1][selected.index(column)] for column in key_columns])
+        args = request.args.to_dict()
+        args['cursor'] = cursor
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, _external=True, **args)}>; rel="next"'
+    return response
+
 #API Endpoint: Get Food Items (JSON)
+#?limit=&cursor= plus optional food_type, city, delivery_option and status (default Unselected) filters
 @app.route('/api/food-items')
+@conditional(*FOOD_ITEM_TABLES)
 def api_food_items():
     try:
-        conn = get_db_connection()
-        food_items = conn.execute('''
-            SELECT f.*, u.user_fullname, l.city
+        limit, after = parse_page_args()
+        names, selected = parse_fields(FOOD_ITEM_COLUMNS, ('expiry_date', 'item_id'))
+
+        conditions = ['f.status = ?']
+        params = [request.args.get('status', 'Unselected')]
+        for column in ('food_type', 'delivery_option'):
+            if request.args.get(column):
+                conditions.append(f'f.{column} = ?')
+                params.append(request.args[column])
+        if request.args.get('city'):
+            conditions.append('f.location_id IN (SELECT location_id FROM locations WHERE lower(trim(city)) = lower(trim(?)))')
+            params.append(request.args['city'])
+        if after:
+            conditions.append('(f.expiry_date, f.item_id) > (?, ?)')
+            params.extend(after)
+
+        food_items = query_rows(get_db_connection(), f'''
+            SELECT {select_list(FOOD_ITEM_COLUMNS, selected)}
             FROM food_items f
             JOIN users u ON f.user_id = u.user_id
             LEFT JOIN locations l ON f.location_id = l.location_id
-            WHERE f.status = 'Unselected'
-        ''').fetchall()
-        conn.close()
+            WHERE {' AND '.join(conditions)}
+            ORDER BY f.expiry_date, f.item_id
+            LIMIT ?
+        ''', params + [limit + 1])
 
-        items_list = [dict(item) for item in food_items]
-        return jsonify(items_list)
+        return page_response(food_items, limit, names, selected, ('expiry_date', 'item_id'))
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+#API Endpoint: Get Food Items Near a Point (JSON)
+#?lat=&lon=&radius_km= (default 25) plus optional food_type and limit; closest first, each row has distance_km
+@app.route('/api/food-items/nearby')
+@conditional(*FOOD_ITEM_TABLES)
+def api_food_items_nearby():
+    try:
+        try:
+            lat = float(request.args['lat'])
+            lon = float(request.args['lon'])
+        except (KeyError, ValueError):
+            raise ValueError('lat and lon are required numbers')
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError('lat must be between -90 and 90 and lon between -180 and 180')
+        radius_km = parse_radius(request.args.get('radius_km', DEFAULT_RADIUS_KM))
+        limit = request.args.get('limit', type=int) or DEFAULT_PAGE_SIZE
+        if not 1 <= limit <= MAX_NEARBY_RESULTS:
+            raise ValueError(f'limit must be between 1 and {MAX_NEARBY_RESULTS}')
+
+        names, _ = parse_fields(NEARBY_COLUMNS)
+
+        food_items = find_nearby_items(get_db_connection(), lat, lon, radius_km, limit,
+                                       request.args.get('food_type'), names)
+        return jsonify([dict(zip(names, row)) for row in food_items])
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+#Full-text search over food_name and description (food_items_fts, migrations/007_food_items_search.sql)
+MAX_SEARCH_TERMS = 20
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix (raises ValueError)"""
+    words = [word for word in text.replace('"', ' ').split()][:MAX_SEARCH_TERMS]
+    if not words:
+        raise ValueError('q must contain at least one word')
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+#API Endpoint: Search Food Items (JSON)
+#?q= plus optional status (default Unselected), expires_after (default today), expires_before and limit/cursor;
+#best matches first, each row has its bm25 score (lower is better) and a highlighted snippet
+@app.route('/api/food-items/search')
+@conditional(*FOOD_ITEM_TABLES)
+def api_search_food_items():
+    try:
+        match = build_match_query(request.args.get('q', ''))
+        limit, after = parse_page_args(((int, float), int))
+        names, selected = parse_fields(SEARCH_COLUMNS, ('score', 'item_id'))
+
+        conditions = ['food_items_fts MATCH ?', 'f.status = ?', 'f.expiry_date >= ?']
+        params = [match, request.args.get('status', 'Unselected'),
+                  parse_expiry_date(request.args.get('expires_after') or utc_today())]
+        if request.args.get('expires_before'):
+            conditions.append('f.expiry_date <= ?')
+            params.append(parse_expiry_date(request.args['expires_before']))
+        if after:
+            conditions.append('(food_items_fts.rank, food_items_fts.rowid) > (?, ?)')
+            params.extend(after)
+
+        food_items = query_rows(get_db_connection(), f'''
+            SELECT {select_list(SEARCH_COLUMNS, selected)}
+            FROM food_items_fts
+            JOIN food_items f ON f.item_id = food_items_fts.rowid
+            JOIN users u ON f.user_id = u.user_id
+            LEFT JOIN locations l ON f.location_id = l.location_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY food_items_fts.rank, food_items_fts.rowid
+            LIMIT ?
+        ''', params + [limit + 1])
+
+        return page_response(food_items, limit, names, selected, ('score', 'item_id'))
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 #API Endpoint: Get Requests (JSON)
+#?limit=&cursor= plus optional status filter and food_type, city, delivery_option filters on the requested item
 @app.route('/api/requests')
+@conditional(*REQUEST_TABLES)
 def api_requests():
     try:
-        conn = get_db_connection()
-        requests = conn.execute('''
-            SELECT r.*, f.food_name, u.user_fullname
-            FROM requests r
-            JOIN food_items f ON r.item_id = f.item_id
+        #created_at may be NULL on old rows
+        limit, after = parse_page_args(((str, type(None)), int))
+        names, selected = parse_fields(REQUEST_COLUMNS, ('created_at', 'request_id'))
+
+        conditions = []
+        params = []
+        if request.args.get('status'):
+            conditions.append('r.status = ?')
+            params.append(request.args['status'])
+        for column in ('food_type', 'delivery_option'):
+            if request.args.get(column):
+                conditions.append(f'f.{column} = ?')
+                params.append(request.args[column])
+        if request.args.get('city'):
+            conditions.append('f.location_id IN (SELECT location_id FROM locations WHERE lower(trim(city)) = lower(trim(?)))')
+            params.append(request.args['city'])
+        if after:
+            conditions.append('(r.created_at, r.request_id) > (?, ?)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        requests = query_rows(get_db_connection(), f'''
+            SELECT {select_list(REQUEST_COLUMNS, selected)}
+            FROM {history_source('requests')} r
+            JOIN {history_source('food_items')} f ON r.item_id = f.item_id
             JOIN users u ON r.recipient_id = u.user_id
-        ''').fetchall()
-        conn.close()
+            {where}
+            ORDER BY r.created_at, r.request_id
+            LIMIT ?
+        ''', params + [limit + 1])
+
+        return page_response(requests, limit, names, selected, ('created_at', 'request_id'))
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+#Streaming NDJSON exports for bulk consumers: rows are read from the cursor in chunks
+#and written as they are fetched, so memory stays flat whatever the table size
+EXPORT_CHUNK_SIZE = 500
+
+def parse_since_arg():
+    """Get ?since= as a 'YYYY-MM-DD HH:MM:SS' UTC timestamp comparable with created_at, or None.
+    A timestamp with an offset is converted to UTC; one without is taken to be UTC already."""
+    since = request.args.get('since')
+    if not since:
+        return None
+    try:
+        since = datetime.fromisoformat(since)
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc)
+        return since.strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError('since must be an ISO date or timestamp, e.g. 2025-10-27 12:00:00')
+
+def history_source(table):
+    """The table an export reads: its *_history view (archived rows included) with ?archived=1"""
+    return f'{table}_history' if request.args.get('archived') == '1' else table
+
+def ndjson_response(query, params, names):
+    """Stream the query's rows as newline-delimited JSON objects keyed by names"""
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    dumps = app.json.dumps
+
+    def generate():
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield ''.join(dumps(dict(zip(names, row)), sort_keys=False, separators=(',', ':')) + '\n'
+                          for row in rows)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+#API Endpoint: Export Food Items (NDJSON)
+#Optional ?since= (created after) and ?status= filters; rows come in created_at order.
+#?archived=1 exports the archived items too (food_items_history, migrations/010_archive_tables.sql)
+@app.route('/api/export/food-items.ndjson')
+@conditional(*FOOD_ITEM_TABLES)
+def api_export_food_items():
+    try:
+        since = parse_since_arg()
+        names, _ = parse_fields(FOOD_ITEM_COLUMNS)
+        conditions = []
+        params = []
+        if since:
+            conditions.append('f.created_at > ?')
+            params.append(since)
+        if request.args.get('status'):
+            conditions.append('f.status = ?')
+            params.append(request.args['status'])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        return ndjson_response(f'''
+            SELECT {select_list(FOOD_ITEM_COLUMNS, names)}
+            FROM {history_source('food_items')} f
+            JOIN users u ON f.user_id = u.user_id
+            LEFT JOIN locations l ON f.location_id = l.location_id
+            {where}
+            ORDER BY f.created_at, f.item_id
+        ''', params, names)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        requests_list = [dict(req) for req in requests]
-        return jsonify(requests_list)
+#API Endpoint: Export Requests (NDJSON)
+#Optional ?since= (created after) and ?status= filters; rows come in created_at order.
+#?archived=1 exports the archived requests too (requests_history)
+@app.route('/api/export/requests.ndjson')
+@conditional(*REQUEST_TABLES)
+def api_export_requests():
+    try:
+        since = parse_since_arg()
+        names, _ = parse_fields(REQUEST_COLUMNS)
+        conditions = []
+        params = []
+        if since:
+            conditions.append('r.created_at > ?')
+            params.append(since)
+        if request.args.get('status'):
+            conditions.append('r.status = ?')
+            params.append(request.args['status'])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        return ndjson_response(f'''
+            SELECT {select_list(REQUEST_COLUMNS, names)}
+            FROM {history_source('requests')} r
+            JOIN {history_source('food_items')} f ON r.item_id = f.item_id
+            JOIN users u ON r.recipient_id = u.user_id
+            {where}
+            ORDER BY r.created_at, r.request_id
+        ''', params, names)
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 #API Endpoint: Get KPI Data (JSON)
 @app.route('/api/kpi/<user_type>')
 @login_required
+@conditional(*KPI_SOURCE_TABLES)
 def api_kpi(user_type):
     try:
         user_id = session['user_id']
-        conn = get_db_connection()
-
-        if user_type == 'supplier':
-            kpi_data = {
-                'total_items': conn.execute('SELECT COUNT(*) FROM food_items WHERE user_id = ?', (user_id,)).fetchone()[0],
-                'expiring_soon': conn.execute('''
-                    SELECT COUNT(*) FROM food_items
-                    WHERE user_id = ? AND date(expiry_date) BETWEEN date('now') AND date('now', '+7 days')
-                ''', (user_id,)).fetchone()[0],
-                'donated': conn.execute('SELECT COUNT(*) FROM transactions WHERE supplier_id = ?', (user_id,)).fetchone()[0],
-                'kg_donated': conn.execute('SELECT COALESCE(SUM(quantity), 0) FROM transactions WHERE supplier_id = ?', (user_id,)).fetchone()[0]
-            }
-        elif user_type == 'recipient':
-            kpi_data = {
-                'requests': conn.execute('SELECT COUNT(*) FROM requests WHERE recipient_id = ?', (user_id,)).fetchone()[0],
-                'kg_received': conn.execute('SELECT COALESCE(SUM(quantity), 0) FROM transactions WHERE recipient_id = ?', (user_id,)).fetchone()[0],
-                'suppliers': conn.execute('SELECT COUNT(DISTINCT supplier_id) FROM transactions WHERE recipient_id = ?', (user_id,)).fetchone()[0]
-            }
-        else:
+        if user_type not in ('supplier', 'recipient'):
             return jsonify({'error': 'Invalid user type'}), 400
 
-        conn.close()
+        #Keyed by the UTC date too: expiring soon counts from date('now')
+        kpi_data = cache.get_or_compute(('api_kpi', user_type, user_id, utc_today()), KPI_SOURCE_TABLES,
+                                        lambda: get_user_kpis(get_db_connection(), user_type, user_id))
         return jsonify(kpi_data)
 
     except Exception as e:
@@ -540,39 +1905,23 @@ def api_create_food_item():
             return jsonify({'error': 'Unauthorized. Supplier role required.'}), 403
 
         user_id = session['user_id']
-        data = request.get_json()
 
-        # Validate required fields
-        required_fields = ['food_type', 'food_name', 'quantity_available', 'expiry_date', 'delivery_option', 'city']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        # Validate required fields (same checks as the bulk upload)
+        item = validate_food_item(request.get_json(silent=True))
 
-        conn = get_db_connection()
+        storage = get_storage()
 
-        # Create or get location
-        location = conn.execute('SELECT location_id FROM locations WHERE city = ?', (data['city'],)).fetchone()
-        if location:
-            location_id = location['location_id']
-        else:
-            conn.execute('''
-                INSERT INTO locations (province, city, zip_code, street_address)
-                VALUES (?, ?, ?, ?)
-            ''', ('Not specified', data['city'], '0000', 'Not specified'))
-            location_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
-
-        # Insert food item
-        cursor = conn.execute('''
-            INSERT INTO food_items (user_id, food_type, food_name, quantity_available,
-                                   expiry_date, delivery_option, location_id, description, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, data['food_type'], data['food_name'], float(data['quantity_available']),
-              data['expiry_date'], data['delivery_option'], location_id,
-              data.get('description', ''), 'Unselected'))
-
-        item_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        def insert_food_item(conn):
+            # Create or get location
+            location_id = storage.locations.resolve(conn, item['city'])
+
+            # Insert food item
+            return storage.food_items.create(conn, user_id, item['food_type'], item['food_name'],
+                                             item['quantity_available'], item['expiry_date'], item['delivery_option'],
+                                             location_id, item['description'])
+
+        item_id = storage.write(insert_food_item)
+        cache.invalidate('food_items', 'locations')
 
         return jsonify({
             'success': True,
@@ -580,6 +1929,124 @@ def api_create_food_item():
             'item_id': item_id
         }), 201
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+#Allowed values from the food_items CHECK constraints in foodconnect.sql
+FOOD_TYPES = ('Vegetables', 'Fruits', 'Dairy', 'Bakery', 'Meat', 'Grains', 'Beverages', 'Other')
+DELIVERY_OPTIONS = ('Pickup', 'Delivery')
+FOOD_ITEM_REQUIRED_FIELDS = ('food_type', 'food_name', 'quantity_available', 'expiry_date', 'delivery_option', 'city')
+MAX_BULK_ROWS = 5000
+
+def validate_food_item(data):
+    """Check one uploaded food item and return it cleaned (raises ValueError with the reason)"""
+    if not isinstance(data, dict):
+        raise ValueError('Each item must be an object')
+    for field in FOOD_ITEM_REQUIRED_FIELDS:
+        #Whitespace-only names and cities count as missing, as they are stored stripped
+        if data.get(field) is None or not str(data[field]).strip():
+            raise ValueError(f'Missing required field: {field}')
+    if data['food_type'] not in FOOD_TYPES:
+        raise ValueError(f'Invalid food_type. Must be one of: {", ".join(FOOD_TYPES)}')
+    if data['delivery_option'] not in DELIVERY_OPTIONS:
+        raise ValueError(f'Invalid delivery_option. Must be one of: {", ".join(DELIVERY_OPTIONS)}')
+    try:
+        quantity_available = float(data['quantity_available'])
+    except (TypeError, ValueError):
+        raise ValueError('quantity_available must be a number')
+    if quantity_available <= 0:
+        raise ValueError('quantity_available must be greater than 0')
+
+    return {
+        'food_type': data['food_type'],
+        'food_name': str(data['food_name']).strip(),
+        'quantity_available': quantity_available,
+        'expiry_date': parse_expiry_date(data['expiry_date']),
+        'delivery_option': data['delivery_option'],
+        'city': str(data['city']).strip(),
+        'description': data.get('description') or ''
+    }
+
+def read_bulk_rows():
+    """Get the uploaded rows from a JSON array, a CSV file field ('file') or a text/csv body"""
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of food items or a CSV upload')
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+# API Endpoint: Bulk Create Food Items (JSON array or CSV) - POST
+@app.route('/api/food-items/bulk', methods=['POST'])
+@login_required
+def api_bulk_create_food_items():
+    """API endpoint to create many food surplus items in one transaction.
+
+    Every row is validated before anything is written; valid rows are inserted together
+    and the response lists each row's item_id or error (201 all created, 207 some failed,
+    400 none valid).
+    """
+    try:
+        if 'Supplier' not in session.get('roles', []):
+            return jsonify({'error': 'Unauthorized. Supplier role required.'}), 403
+
+        user_id = session['user_id']
+        rows = read_bulk_rows()
+        if not rows:
+            return jsonify({'error': 'No food items provided'}), 400
+        if len(rows) > MAX_BULK_ROWS:
+            return jsonify({'error': f'Too many items. At most {MAX_BULK_ROWS} per upload.'}), 400
+
+        results = []
+        valid = []
+        for index, row in enumerate(rows, start=1):
+            try:
+                valid.append((index, validate_food_item(row)))
+                results.append({'row': index})
+            except ValueError as e:
+                results.append({'row': index, 'error': str(e)})
+
+        def insert_food_items(conn):
+            location_ids = location_registry.resolve_many(conn, [item['city'] for _, item in valid])
+
+            #Holding the write lock, every id above the current max is one of ours, in insert order
+            last_item_id = conn.execute('SELECT COALESCE(MAX(item_id), 0) FROM food_items').fetchone()[0]
+            conn.executemany('''
+                INSERT INTO food_items (user_id, food_type, food_name, quantity_available,
+                                       expiry_date, delivery_option, location_id, description, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Unselected')
+            ''', [(user_id, item['food_type'], item['food_name'], item['quantity_available'],
+                   item['expiry_date'], item['delivery_option'], location_ids[normalize_location_key(item['city'])],
+                   item['description']) for _, item in valid])
+            return [row[0] for row in conn.execute(
+                'SELECT item_id FROM food_items WHERE item_id > ? ORDER BY item_id', (last_item_id,))]
+
+        if valid:
+            item_ids = perform_write(insert_food_items)
+            cache.invalidate('food_items', 'locations')
+
+            for (index, _), item_id in zip(valid, item_ids):
+                results[index - 1]['item_id'] = item_id
+
+        created = len(valid)
+        failed = len(rows) - created
+        status_code = 201 if not failed else (207 if created else 400)
+        return jsonify({
+            'success': failed == 0,
+            'created': created,
+            'failed': failed,
+            'results': results
+        }), status_code
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -600,46 +2067,619 @@ def api_update_request(request_id):
         if data['status'] not in valid_statuses:
             return jsonify({'error': f'Invalid status. Must be one of: {", ".join(valid_statuses)}'}), 400
 
-        conn = get_db_connection()
+        user_id = session['user_id']
+        storage = get_storage()
+
+        def update_status(conn):
+            # Check if request exists, with the item's supplier and the names sent back
+            existing_request = storage.requests.get_with_parties(conn, request_id)
+
+            # Verify user has permission (either supplier of the item or recipient of the request)
+            if not existing_request or user_id not in (existing_request['supplier_id'], existing_request['recipient_id']):
+                return existing_request, None
 
-        # Check if request exists
-        existing_request = conn.execute('SELECT * FROM requests WHERE request_id = ?', (request_id,)).fetchone()
+            # Update request status, getting the updated row back
+            return existing_request, storage.requests.update_status(conn, request_id, data['status'])
+
+        existing_request, updated_request = storage.write(update_status)
         if not existing_request:
-            conn.close()
             return jsonify({'error': 'Request not found'}), 404
+        if not updated_request:
+            return jsonify({'error': 'Unauthorized. You can only update your own requests or requests for your items.'}), 403
+        #sync_food_item_status may have changed the item's status too
+        cache.invalidate('requests', 'food_items')
+
+        return jsonify({
+            'success': True,
+            'message': 'Request updated successfully',
+            'request': dict(updated_request, food_name=existing_request['food_name'],
+                            user_fullname=existing_request['user_fullname'])
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+REQUEST_STATUSES = ('Pending', 'Selected', 'Completed', 'Cancelled')
+
+def validate_status_update(data):
+    """Validate one {request_id, status} entry of a bulk update, raising ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError('Expected an object with request_id and status')
+    missing = [field for field in ('request_id', 'status') if data.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f'Missing required fields: {", ".join(missing)}')
+    try:
+        request_id = int(data['request_id'])
+    except (TypeError, ValueError):
+        raise ValueError('request_id must be an integer')
+    if data['status'] not in REQUEST_STATUSES:
+        raise ValueError(f'Invalid status. Must be one of: {", ".join(REQUEST_STATUSES)}')
+    return request_id, data['status']
+
+# API Endpoint: Bulk Update Request Statuses (JSON array) - PUT/POST
+@app.route('/api/requests/bulk-update', methods=['PUT', 'POST'])
+@login_required
+def api_bulk_update_requests():
+    """API endpoint to update many request statuses in one transaction.
+
+    Takes a JSON array of {request_id, status}. Ownership of the whole set is checked in
+    one query and the permitted updates are applied by one UPDATE, so sync_food_item_status
+    fires once per row; the response lists each entry's updated request or error
+    (200 all updated, 207 some failed, 400 none updated).
+    """
+    try:
+        updates = request.get_json(silent=True)
+        if not isinstance(updates, list):
+            return jsonify({'error': 'Expected a JSON array of {request_id, status} updates'}), 400
+        if not updates:
+            return jsonify({'error': 'No updates provided'}), 400
+        if len(updates) > MAX_BULK_ROWS:
+            return jsonify({'error': f'Too many updates. At most {MAX_BULK_ROWS} per call.'}), 400
 
-        # Verify user has permission (either supplier of the item or recipient of the request)
         user_id = session['user_id']
-        food_item = conn.execute('SELECT user_id FROM food_items WHERE item_id = ?', (existing_request['item_id'],)).fetchone()
+        results = []
+        valid = {}
+        for index, data in enumerate(updates, start=1):
+            try:
+                request_id, status = validate_status_update(data)
+                if request_id in valid:
+                    raise ValueError(f'Duplicate request_id {request_id}')
+                valid[request_id] = (index, status)
+                results.append({'row': index, 'request_id': request_id})
+            except ValueError as e:
+                results.append({'row': index, 'error': str(e)})
+
+        def update_statuses(conn):
+            # Check every request exists and belongs to the user (supplier of the item or recipient)
+            owners = {row['request_id']: row for row in conn.execute('''
+                SELECT r.request_id, r.recipient_id, f.user_id AS supplier_id, f.food_name, u.user_fullname
+                FROM requests r
+                JOIN food_items f ON r.item_id = f.item_id
+                JOIN users u ON r.recipient_id = u.user_id
+                WHERE r.request_id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(list(valid)),))}
+            permitted = [[request_id, status] for request_id, (_, status) in valid.items()
+                         if request_id in owners and user_id in (owners[request_id]['supplier_id'],
+                                                                 owners[request_id]['recipient_id'])]
+            if not permitted:
+                return owners, []
+            return owners, conn.execute('''
+                UPDATE requests
+                SET status = (SELECT value ->> 1 FROM json_each(?1) WHERE value ->> 0 = requests.request_id)
+                WHERE request_id IN (SELECT value ->> 0 FROM json_each(?1))
+                RETURNING *
+            ''', (json.dumps(permitted),)).fetchall()
+
+        updated = []
+        if valid:
+            owners, updated = perform_write(update_statuses)
+            if updated:
+                #sync_food_item_status may have changed the items' statuses too
+                cache.invalidate('requests', 'food_items')
+
+            updated_rows = {row['request_id']: row for row in updated}
+            for request_id, (index, _) in valid.items():
+                if request_id in updated_rows:
+                    owner = owners[request_id]
+                    results[index - 1]['request'] = dict(updated_rows[request_id], food_name=owner['food_name'],
+                                                         user_fullname=owner['user_fullname'])
+                elif request_id not in owners:
+                    results[index - 1]['error'] = 'Request not found'
+                else:
+                    results[index - 1]['error'] = ('Unauthorized. You can only update your own requests '
+                                                   'or requests for your items.')
+
+        failed = len(updates) - len(updated)
+        status_code = 200 if not failed else (207 if updated else 400)
+        return jsonify({
+            'success': failed == 0,
+            'updated': len(updated),
+            'failed': failed,
+            'results': results
+        }), status_code
 
-        if user_id != food_item['user_id'] and user_id != existing_request['recipient_id']:
-            conn.close()
-            return jsonify({'error': 'Unauthorized. You can only update your own requests or requests for your items.'}), 403
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Update request status
-        conn.execute('UPDATE requests SET status = ? WHERE request_id = ?', (data['status'], request_id))
-        conn.commit()
+#Fulfilment: a recipient claims a quantity of an available item in one write transaction.
+#transactions allows one row per item, so a claim for less than the whole item splits the
+#claimed quantity off into its own food_items row (a lot, marked with parent_item_id, see
+#migrations/013_food_item_lots.sql) and the original keeps the rest, still available to
+#others. Other Pending requests on the item for more than is left are Cancelled, so their
+#recipients hear of it through the change feed and event stream. The claim request is
+#Selected on the lot (sync_food_item_status marks it Pending) and an In-Progress
+#transaction is recorded, checked by the validate_transaction and
+#validate_transaction_quantity triggers.
+URGENCY_LEVELS = ('Low', 'Medium', 'High')
+
+class ClaimError(Exception):
+    """A claim that cannot be made, with the HTTP status to answer it with"""
+
+    def __init__(self, message, status_code=409):
+        super().__init__(message)
+        self.status_code = status_code
+
+def claim_food_item(conn, item_id, recipient_id, quantity=None, urgency_level='Medium', request_id=None, today=None):
+    """Claim quantity kg of an item for a recipient (default: the request's quantity, else all of it).
+    Runs inside the caller's write transaction; returns the transaction, the claimed lot and the
+    ids of the requests cancelled because the item no longer has enough left for them."""
+    item = conn.execute('''
+        SELECT f.*, EXISTS (SELECT 1 FROM transactions t WHERE t.item_id = f.item_id) AS has_transaction
+        FROM food_items f WHERE f.item_id = ?
+    ''', (item_id,)).fetchone()
+    if not item:
+        raise ClaimError('Food item not found', 404)
+    if item['user_id'] == recipient_id:
+        raise ClaimError('You cannot claim your own food item', 400)
+    if item['status'] != 'Unselected' or item['has_transaction']:
+        raise ClaimError('Food item is no longer available')
+    if item['expiry_date'] < (today or utc_today().isoformat()):
+        raise ClaimError('Food item has expired')
+
+    if request_id is not None:
+        existing = conn.execute('''
+            SELECT quantity_needed FROM requests
+            WHERE request_id = ? AND item_id = ? AND recipient_id = ? AND status = 'Pending'
+        ''', (request_id, item_id, recipient_id)).fetchone()
+        if not existing:
+            raise ClaimError('No pending request of yours for this item', 404)
+        quantity = existing['quantity_needed'] if quantity is None else quantity
+    quantity = item['quantity_available'] if quantity is None else quantity
+    if quantity > item['quantity_available']:
+        raise ClaimError(f"Only {item['quantity_available']} kg left")
+
+    claimed_item_id = item_id
+    if quantity < item['quantity_available']:
+        conn.execute('UPDATE food_items SET quantity_available = quantity_available - ? WHERE item_id = ?',
+                     (quantity, item_id))
+        claimed_item_id = conn.execute('''
+            INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                    delivery_option, location_id, description, created_at, parent_item_id)
+            SELECT user_id, food_type, food_name, ?, expiry_date, delivery_option, location_id, description,
+                   created_at, item_id
+            FROM food_items WHERE item_id = ?
+            RETURNING item_id
+        ''', (quantity, item_id)).fetchone()[0]
+
+    #Before the claim is Selected, so sync_food_item_status leaves the item's status alone
+    cancelled = [row[0] for row in conn.execute('''
+        UPDATE requests SET status = 'Cancelled'
+        WHERE item_id = ? AND status = 'Pending' AND quantity_needed > ? AND request_id IS NOT ?
+        RETURNING request_id
+    ''', (item_id, item['quantity_available'] - quantity, request_id))]
+
+    if request_id is None:
+        request_id = conn.execute('''
+            INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, status)
+            VALUES (?, ?, ?, ?, 'Pending') RETURNING request_id
+        ''', (claimed_item_id, recipient_id, quantity, urgency_level)).fetchone()[0]
+    conn.execute('''
+        UPDATE requests SET item_id = ?, quantity_needed = ?, status = 'Selected' WHERE request_id = ?
+    ''', (claimed_item_id, quantity, request_id))
+
+    transaction = conn.execute('''
+        INSERT INTO transactions (item_id, supplier_id, recipient_id, quantity, status)
+        VALUES (?, ?, ?, ?, 'In-Progress') RETURNING *
+    ''', (claimed_item_id, item['user_id'], recipient_id, quantity)).fetchone()
+    return {'transaction': dict(transaction), 'request_id': request_id, 'item_id': claimed_item_id,
+            'remaining': item['quantity_available'] - quantity, 'cancelled_requests': sorted(cancelled)}
+
+# API Endpoint: Claim a Food Item (JSON) - POST
+# Body: optional quantity (kg, default the whole item or the request's quantity), urgency_level and request_id
+@app.route('/api/food-items/<int:item_id>/claim', methods=['POST'])
+@login_required
+def api_claim_food_item(item_id):
+    """API endpoint for a recipient to claim (part of) a food item atomically"""
+    try:
+        if 'Recipient' not in session.get('roles', []):
+            return jsonify({'error': 'Unauthorized. Recipient role required.'}), 403
+
+        data = request.get_json(silent=True) or {}
+        quantity = data.get('quantity')
+        if quantity is not None and (isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0):
+            return jsonify({'error': 'quantity must be a positive integer'}), 400
+        urgency_level = data.get('urgency_level', 'Medium')
+        if urgency_level not in URGENCY_LEVELS:
+            return jsonify({'error': f'Invalid urgency_level. Must be one of: {", ".join(URGENCY_LEVELS)}'}), 400
+        request_id = data.get('request_id')
+        if request_id is not None and (isinstance(request_id, bool) or not isinstance(request_id, int)):
+            return jsonify({'error': 'request_id must be an integer'}), 400
+
+        recipient_id = session['user_id']
+        result = perform_write(lambda conn: claim_food_item(
+            conn, item_id, recipient_id, quantity, urgency_level, request_id))
+        cache.invalidate('food_items', 'requests', 'transactions')
+
+        return jsonify({'success': True, 'message': 'Food item claimed successfully', **result}), 201
+
+    except ClaimError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    except sqlite3.IntegrityError as e:
+        #Raised by the validate_transaction* triggers
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Get updated request
-        updated_request = conn.execute('''
-            SELECT r.*, f.food_name, u.user_fullname
-            FROM requests r
-            JOIN food_items f ON r.item_id = f.item_id
-            JOIN users u ON r.recipient_id = u.user_id
-            WHERE r.request_id = ?
-        ''', (request_id,)).fetchone()
+#Matching Engine: allocate pending requests to surplus items (see matching.py)
+@app.cli.command('match-requests')
+@click.option('--limit', type=int, default=None, help='Stop after this many allocations.')
+@click.option('--dry-run', is_flag=True, help='Report the allocations without saving them.')
+@click.option('--deterministic', is_flag=True, help='Break priority ties by request id instead of at random.')
+@click.option('--today', default=None, help='Treat this ISO date as today when skipping expired items.')
+@click.option('--every', type=float, default=None, help='Keep running, matching again every N seconds.')
+def match_requests_command(limit, dry_run, deterministic, today, every):
+    """Match pending requests to available surplus in one write transaction"""
+    while True:
+        conn = get_pool().connect()
+        try:
+            match = lambda conn: run_matching(conn, limit=limit, deterministic=deterministic,
+                                              today=today, dry_run=dry_run)
+            result = match(conn) if dry_run else run_write_transaction(conn, match)
+        finally:
+            conn.close()
+        if not dry_run:
+            cache.invalidate('requests', 'food_items', 'transactions')
+        for allocation in result['allocations']:
+            click.echo(f"request {allocation['request_id']} ({allocation['urgency_level']}) "
+                       f"-> item {allocation['item_id']}, {allocation['quantity']} kg")
+        click.echo(f"Matched {result['matched']} of {result['candidates']} candidate requests "
+                   f"in {result['elapsed_ms']} ms" + (' (dry run)' if dry_run else ''))
+        if every is None:
+            break
+        time.sleep(every)
+
+# API Endpoint: Run Matching for the Supplier's Items (JSON) - POST
+@app.route('/api/matching/run', methods=['POST'])
+@login_required
+def api_run_matching():
+    """API endpoint to allocate pending requests to the logged-in supplier's items"""
+    try:
+        if 'Supplier' not in session.get('roles', []):
+            return jsonify({'error': 'Unauthorized. Supplier role required.'}), 403
+
+        data = request.get_json(silent=True) or {}
+        limit = data.get('limit')
+        if limit is not None and (not isinstance(limit, int) or limit < 1):
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        today = parse_expiry_date(data['today']) if data.get('today') else None
+
+        supplier_id, dry_run = session['user_id'], bool(data.get('dry_run'))
+        match = lambda conn: run_matching(conn, limit=limit, supplier_id=supplier_id,
+                                          deterministic=bool(data.get('deterministic')), seed=data.get('seed'),
+                                          today=today, dry_run=dry_run)
+        #A dry run only reads; a real one is a write like any other (retried, or queued to the writer)
+        result = match(get_db_connection()) if dry_run else perform_write(match)
+        if not result['dry_run']:
+            cache.invalidate('requests', 'food_items', 'transactions')
+
+        return jsonify({'success': True, **result}), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
+#Archiving: settled food items move with their requests and transaction to the archive
+#tables (migrations/010_archive_tables.sql) in bounded batches, see archive.py. The
+#*_history views cover hot plus archived rows for reporting.
+@app.cli.command('archive-settled')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Items moved per write transaction.')
+@click.option('--max-batches', type=int, default=None, help='Stop after this many batches.')
+@click.option('--grace-days', type=int, default=DEFAULT_GRACE_DAYS,
+              help='Keep items this many days after they expired or were donated.')
+@click.option('--today', default=None, help='Treat this ISO date as today.')
+@click.option('--dry-run', is_flag=True, help='Only count the settled items.')
+@click.option('--every', type=float, default=None, help='Keep running, sweeping again every N seconds.')
+def archive_settled_command(batch_size, max_batches, grace_days, today, dry_run, every):
+    """Move settled food items, their requests and transactions to the archive tables"""
+    while True:
+        conn = get_pool().connect()
+        try:
+            result = sweep(conn, batch_size=batch_size, max_batches=max_batches, grace_days=grace_days,
+                           today=today, dry_run=dry_run)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            conn.close()
+        if dry_run:
+            click.echo(f"{result['food_items']} settled items before {result['cutoff']} (dry run)")
+        else:
+            if result['food_items']:
+                cache.invalidate('requests', 'food_items', 'transactions')
+            click.echo(f"Archived {result['food_items']} items, {result['requests']} requests and "
+                       f"{result['transactions']} transactions in {result['batches']} batches "
+                       f"({result['elapsed_ms']} ms)")
+        if every is None:
+            break
+        time.sleep(every)
+
+archive_sweeper = ArchiveSweeper(lambda: get_pool().connect(), app.config['ARCHIVE_SWEEP_INTERVAL'],
+                                 on_archived=lambda result: cache.invalidate('requests', 'food_items', 'transactions'),
+                                 batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+                                 grace_days=app.config['ARCHIVE_GRACE_DAYS'])
+
+@app.before_request
+def start_archive_sweeper():
+    #Started by the first request of each worker, so CLI commands never run one
+    if archive_sweeper.interval > 0:
+        archive_sweeper.start()
+
+#Change feed: change_log (migrations/009_change_log.sql) records every insert, update and
+#delete on food_items, requests and transactions under an increasing seq, so mirrors sync
+#incrementally with /api/changes?since=<last seq they applied>
+CHANGE_LOG_TABLES = {'food_items': 'item_id', 'requests': 'request_id', 'transactions': 'transaction_id'}
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+CHANGE_LOG_KEEP_DAYS = 30
+
+def compact_change_log(conn, keep_days=CHANGE_LOG_KEEP_DAYS):
+    """Prune change_log entries older than keep_days: those a newer entry for the same row
+    supersedes, then deletes and archivals (recorded in pruned_deletes_through). Returns the
+    rows removed."""
+    cutoff = conn.execute('''
+        SELECT COALESCE(MAX(seq), 0) FROM change_log WHERE changed_at < datetime('now', ?)
+    ''', (f'-{int(keep_days)} days',)).fetchone()[0]
+    superseded = conn.execute('''
+        DELETE FROM change_log
+        WHERE seq <= ? AND EXISTS (
+            SELECT 1 FROM change_log newer
+            WHERE newer.table_name = change_log.table_name
+              AND newer.row_id = change_log.row_id
+              AND newer.seq > change_log.seq
+        )
+    ''', (cutoff,)).rowcount
+    deletes = conn.execute("DELETE FROM change_log WHERE seq <= ? AND operation IN ('delete', 'archive')",
+                           (cutoff,)).rowcount
+    if deletes:
+        conn.execute('''
+            UPDATE change_log_state SET value = MAX(value, ?) WHERE name = 'pruned_deletes_through'
+        ''', (cutoff,))
+    return superseded + deletes
+
+@app.cli.command('compact-change-log')
+@click.option('--keep-days', type=int, default=CHANGE_LOG_KEEP_DAYS, help='Keep every entry newer than this.')
+def compact_change_log_command(keep_days):
+    """Prune superseded and old delete entries from the change log"""
+    conn = get_pool().connect()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        removed = compact_change_log(conn, keep_days)
+        conn.commit()
+    finally:
         conn.close()
+    click.echo(f'Removed {removed} change log entries')
+
+#API Endpoint: Get Changes Since a Sequence Number (JSON)
+#?since=<seq>&limit=&tables=food_items,requests,transactions; each changed row appears once, with its
+#newest seq and current values (row is null once the row no longer exists). operation is insert,
+#update, delete, or archive for rows the archive sweeper moved to the *_archive tables
+@app.route('/api/changes')
+@conditional(*CHANGE_LOG_TABLES)
+def api_changes():
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+            limit = int(request.args.get('limit', DEFAULT_CHANGES_LIMIT))
+        except ValueError:
+            raise ValueError('since and limit must be integers')
+        if since < 0 or not 1 <= limit <= MAX_CHANGES_LIMIT:
+            raise ValueError(f'since must be >= 0 and limit between 1 and {MAX_CHANGES_LIMIT}')
+        tables = request.args['tables'].split(',') if request.args.get('tables') else list(CHANGE_LOG_TABLES)
+        if not set(tables) <= set(CHANGE_LOG_TABLES):
+            raise ValueError(f"tables must be among: {', '.join(CHANGE_LOG_TABLES)}")
 
-        return jsonify({
-            'success': True,
-            'message': 'Request updated successfully',
-            'request': dict(updated_request)
-        }), 200
+        conn = get_db_connection()
+        pruned = conn.execute("SELECT value FROM change_log_state WHERE name = 'pruned_deletes_through'").fetchone()[0]
+        if 0 < since < pruned:
+            return jsonify({'error': 'Changes since this seq have been compacted; sync again from since=0'}), 410
+
+        entries = query_rows(conn, f'''
+            SELECT seq, table_name, row_id, operation, changed_at
+            FROM change_log
+            WHERE seq > ? AND table_name IN ({', '.join('?' * len(tables))})
+            ORDER BY seq
+            LIMIT ?
+        ''', [since] + tables + [limit + 1])
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        #Only the newest entry per row is returned, in seq order
+        latest = {}
+        for seq, table, row_id, operation, changed_at in entries:
+            latest.pop((table, row_id), None)
+            latest[(table, row_id)] = (seq, operation, changed_at)
+
+        current = {}
+        for table, key in CHANGE_LOG_TABLES.items():
+            ids = [row_id for entry_table, row_id in latest if entry_table == table]
+            if ids:
+                for row in conn.execute(f'SELECT * FROM {table} WHERE {key} IN (SELECT value FROM json_each(?))',
+                                        (json.dumps(ids),)):
+                    current[(table, row[key])] = row
 
+        return jsonify({
+            'changes': [{'seq': seq, 'table': table, 'id': row_id, 'operation': operation,
+                         'changed_at': changed_at, 'row': current.get((table, row_id))}
+                        for (table, row_id), (seq, operation, changed_at) in latest.items()],
+            'last_seq': entries[-1][0] if entries else since,
+            'has_more': has_more
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+#Live events: Server-Sent Events feed of new food items and requests and their status
+#changes, fanned out by one broadcaster per process (see events.py)
+EVENT_RETRY_MS = 5000
+EVENT_REPLAY_LIMIT = 1000
+
+event_broadcaster = EventBroadcaster(lambda: get_pool().connect(), app.config['EVENT_POLL_INTERVAL'])
+
+def format_sse(event):
+    return f"id: {event['event_id']}\nevent: {event['event_type']}\ndata: {app.json.dumps(event)}\n\n"
+
+#API Endpoint: Live Event Stream (text/event-stream)
+#Optional ?city= and ?food_type= filters; reconnecting clients send Last-Event-ID to receive what they missed
+@app.route('/api/stream/events')
+def api_stream_events():
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an integer'}), 400
+
+    if shutting_down.is_set():
+        return jsonify({'error': 'Server is shutting down'}), 503
+
+    conn = get_db_connection()
+    #Subscribe before reading the backlog so nothing committed in between is missed
+    subscriber = event_broadcaster.subscribe(conn, app.config['EVENT_QUEUE_SIZE'],
+                                             city=request.args.get('city'),
+                                             food_type=request.args.get('food_type'))
+    backlog = fetch_events(conn, last_event_id, EVENT_REPLAY_LIMIT + 1) if last_event_id is not None else []
+    heartbeat = app.config['EVENT_HEARTBEAT']
+
+    def generate():
+        sent = last_event_id or 0
+        try:
+            yield f'retry: {EVENT_RETRY_MS}\n\n'
+            if len(backlog) > EVENT_REPLAY_LIMIT:
+                #Too far behind to replay: the client should reload its lists
+                yield 'event: resync\ndata: {}\n\n'
+                sent = backlog[-1]['event_id']
+            else:
+                for event in backlog:
+                    if subscriber.wants(event):
+                        yield format_sse(event)
+                    sent = event['event_id']
+            while not subscriber.closed:
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                try:
+                    event = subscriber.events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event is None:
+                    break
+                if event['event_id'] > sent:
+                    yield format_sse(event)
+                    sent = event['event_id']
+        finally:
+            event_broadcaster.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+#Prometheus Metrics Endpoint (text format): request metrics plus pool, cache and event stream gauges
+@app.route('/metrics')
+@ops_endpoint
+def prometheus_metrics():
+    pool_stats = get_pool().stats()
+    cache_stats = cache.stats()
+    stream_stats = event_broadcaster.stats()
+    extra = (
+        ('foodconnect_db_pool_connections', 'gauge', 'Pooled SQLite connections by state.',
+         [({'state': 'in_use'}, pool_stats['in_use']), ({'state': 'idle'}, pool_stats['idle'])]),
+        ('foodconnect_cache_lookups_total', 'counter', 'Read cache lookups by result.',
+         [({'result': 'hit'}, cache_stats['hits']), ({'result': 'miss'}, cache_stats['misses'])]),
+        ('foodconnect_cache_entries', 'gauge', 'Entries in the read cache.', [({}, cache_stats['entries'])]),
+        ('foodconnect_event_subscribers', 'gauge', 'Connected live event stream clients.',
+         [({}, stream_stats['subscribers'])]),
+    )
+    return Response(request_metrics.render(extra), content_type=PROMETHEUS_CONTENT_TYPE)
+
+#API Endpoint: Read Cache Stats (JSON)
+@app.route('/api/cache-stats')
+@ops_endpoint
+def api_cache_stats():
+    return jsonify(cache.stats())
+
+#API Endpoint: Connection Pool Stats (JSON)
+@app.route('/api/db/pool-stats')
+@ops_endpoint
+def api_pool_stats():
+    return jsonify(get_pool().stats())
+
+#API Endpoint: Event Broadcaster Stats (JSON)
+@app.route('/api/stream/stats')
+@ops_endpoint
+def api_stream_stats():
+    return jsonify(event_broadcaster.stats())
+
+#Health probes for the load balancer or orchestrator: /healthz answers while this worker can
+#reach the database, /readyz only while it should get traffic (schema migrated and not
+#shutting down). Each runs one cheap query on a pooled connection.
+shutting_down = threading.Event()
+
+@app.route('/healthz')
+def healthz():
+    try:
+        get_db_connection().execute('SELECT 1').fetchone()
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    if shutting_down.is_set():
+        return jsonify({'status': 'shutting down'}), 503
+    try:
+        schema_version = get_db_connection().execute('PRAGMA user_version').fetchone()[0]
+    except sqlite3.Error as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    migrations = list_migrations()
+    expected_version = migrations[-1][0] if migrations else 0
+    if schema_version < expected_version:
+        return jsonify({'status': 'migrating', 'schema_version': schema_version,
+                        'expected_version': expected_version}), 503
+    return jsonify({'status': 'ready', 'schema_version': schema_version})
+
+#Graceful shutdown, driven by the hooks in gunicorn.conf.py: when a worker is told to stop,
+#begin_shutdown() fails /readyz and ends its live event streams so in-flight requests can
+#drain; once they have, shutdown() commits what the write queue holds and closes the pool.
+def begin_shutdown():
+    """Stop taking new work: /readyz answers 503 and open event streams end"""
+    shutting_down.set()
+    event_broadcaster.close()
+
+def shutdown():
+    """Release this worker's database resources once its requests have finished"""
+    global _writer, _writer_pool
+    begin_shutdown()
+    with _writer_lock:
+        writer, _writer, _writer_pool = _writer, None, None
+    if writer is not None:
+        writer.close(wait=True)
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        pool.close_all()
+
 if __name__ == '__main__':
     # Windows workaround: avoid Unicode errors in hostname resolution
     import socket
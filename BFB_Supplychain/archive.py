@@ -0,0 +1,154 @@
+"""
+Archiving of settled food items for FoodConnect.
+
+A food item is settled once it is 'Completed' and its transaction is older than the grace
+period, or once it expired more than the grace period ago; either way only when none of
+its requests is 'Selected' and it has no 'In-Progress' transaction, so nothing in flight
+is moved. The sweeper moves settled items, with all their requests and their transaction,
+from the hot tables into food_items_archive, requests_archive and transactions_archive
+(migrations/010_archive_tables.sql). Requests still 'Pending' on a settled item are
+cancelled first, so recipients see the status change and the active request count drops.
+
+Every batch is its own short write transaction, so the app keeps writing between batches.
+The KPI delete triggers skip archived rows (archive_state 'sweeping' is set inside the
+batch), so the dashboard totals keep counting everything ever listed and donated.
+
+Used by `flask archive-settled` and the in-process ArchiveSweeper started by app.py when
+ARCHIVE_SWEEP_INTERVAL is set.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_GRACE_DAYS = 7
+
+#Column lists shared by each hot table and its archive table
+ARCHIVED_COLUMNS = {
+    'food_items': ('item_id', 'user_id', 'food_type', 'food_name', 'quantity_available', 'expiry_date',
+                   'delivery_option', 'location_id', 'description', 'created_at', 'status', 'parent_item_id'),
+    'requests': ('request_id', 'item_id', 'recipient_id', 'quantity_needed', 'urgency_level', 'status',
+                 'created_at'),
+    'transactions': ('transaction_id', 'item_id', 'supplier_id', 'recipient_id', 'quantity', 'status',
+                     'created_at'),
+}
+
+def find_settled_items(conn, cutoff, limit):
+    """Get up to limit settled item ids, oldest first. cutoff is the ISO date before which
+    an item must have expired, or its transaction been recorded, to count as settled."""
+    return [row[0] for row in conn.execute('''
+        SELECT f.item_id FROM food_items f
+        WHERE (f.expiry_date < ? OR (f.status = 'Completed' AND EXISTS (
+                  SELECT 1 FROM transactions t
+                  WHERE t.item_id = f.item_id AND t.status = 'Completed' AND t.created_at < ?)))
+          AND NOT EXISTS (SELECT 1 FROM requests r WHERE r.item_id = f.item_id AND r.status = 'Selected')
+          AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.item_id = f.item_id AND t.status = 'In-Progress')
+        ORDER BY f.item_id
+        LIMIT ?
+    ''', (cutoff, cutoff, limit))]
+
+def archive_items(conn, item_ids):
+    """Move the items, their requests and their transaction to the archive tables.
+    Runs inside the caller's write transaction; returns rows moved per table."""
+    ids = ','.join('?' * len(item_ids))
+    conn.execute(f"UPDATE requests SET status = 'Cancelled' WHERE item_id IN ({ids}) AND status = 'Pending'",
+                 item_ids)
+    conn.execute("UPDATE archive_state SET value = 1 WHERE name = 'sweeping'")
+    moved = {}
+    #Children first, so the ON DELETE CASCADE of food_items finds nothing left to delete
+    for table in ('transactions', 'requests', 'food_items'):
+        columns = ', '.join(ARCHIVED_COLUMNS[table])
+        conn.execute(f'''
+            INSERT INTO {table}_archive ({columns})
+            SELECT {columns} FROM {table} WHERE item_id IN ({ids})
+        ''', item_ids)
+        moved[table] = conn.execute(f'DELETE FROM {table} WHERE item_id IN ({ids})', item_ids).rowcount
+    conn.execute("UPDATE archive_state SET value = 0 WHERE name = 'sweeping'")
+    return moved
+
+def sweep(conn, batch_size=DEFAULT_BATCH_SIZE, max_batches=None, grace_days=DEFAULT_GRACE_DAYS, today=None,
+          dry_run=False):
+    """Archive settled items in batches of batch_size, one write transaction per batch,
+    until none are left or max_batches ran. Returns the totals moved and the time taken."""
+    if batch_size < 1:
+        raise ValueError('batch_size must be a positive integer')
+    #UTC, like the date('now') the KPI triggers and views use for expiry
+    today = date.fromisoformat(today) if isinstance(today, str) else today or datetime.now(timezone.utc).date()
+    cutoff = (today - timedelta(days=grace_days)).isoformat()
+
+    started = time.perf_counter()
+    totals = {'food_items': 0, 'requests': 0, 'transactions': 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        if dry_run:
+            totals['food_items'] = len(find_settled_items(conn, cutoff, -1))
+            break
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            item_ids = find_settled_items(conn, cutoff, batch_size)
+            moved = archive_items(conn, item_ids) if item_ids else {}
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if not item_ids:
+            break
+        batches += 1
+        for table, count in moved.items():
+            totals[table] += count
+        if len(item_ids) < batch_size:
+            break
+
+    return dict(totals, batches=batches, cutoff=cutoff, dry_run=dry_run,
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
+
+class ArchiveSweeper:
+    """Runs sweep() every interval seconds on a background thread of this process"""
+
+    def __init__(self, connect, interval, on_archived=None, **sweep_args):
+        self.connect = connect
+        self.interval = interval
+        self.on_archived = on_archived
+        self.sweep_args = sweep_args
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self._stats = {'sweeps': 0, 'archived_items': 0, 'errors': 0, 'last_sweep': None}
+
+    def start(self):
+        """Start the thread unless it already runs in this process"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            #Threads do not survive a fork, so a forked worker starts its own
+            if self._pid != os.getpid():
+                self._pid, self._thread = os.getpid(), None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='archive-sweeper', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            conn = self.connect()
+            try:
+                result = sweep(conn, **self.sweep_args)
+            except Exception:
+                logger.exception('Archive sweep failed')
+                self._stats['errors'] += 1
+                continue
+            finally:
+                conn.close()
+            self._stats['sweeps'] += 1
+            self._stats['archived_items'] += result['food_items']
+            self._stats['last_sweep'] = time.time()
+            if result['food_items'] and self.on_archived:
+                self.on_archived(result)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, interval=self.interval, running=self._thread is not None)
@@ -0,0 +1,322 @@
+"""
+Route benchmarks for FoodConnect at synthetic data scales.
+
+For each scale, builds a database with seed_data.py (kept in --data-dir and reused by later
+runs), then calls every route and API endpoint through the Flask test client against a
+scratch copy of it and reports p50/p95/p99 latency and the SQL statements, SQL time and rows
+fetched of each request. The read cache is cleared before every call so the numbers are for the
+uncached path (--warm keeps it).
+
+    python benchmark.py --scale small --save baseline.json
+    python benchmark.py --scale small --scale medium --compare baseline.json
+
+With --compare, routes whose median grew by more than --max-ratio (or that now run more
+statements) are listed as regressions and the exit status is 1.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, cache, get_pool, create_database
+from metrics import StatementRecorder
+from seed_data import SCALES, seed_database
+
+DEFAULT_RUNS = 20
+DEFAULT_MAX_RATIO = 1.25
+#p50 changes smaller than this are timer noise, whatever the ratio
+MIN_REGRESSION_MS = 2.0
+BULK_ROWS = 50
+
+#(name, method, path, role, request kwargs); {placeholders} are filled from find_context().
+#The SSE stream never ends, so /api/stream/events is left out. Write routes add a few rows
+#per run; matching runs as a dry run so allocations do not use up the data.
+ROUTES = (
+    ('GET /', 'GET', '/', None, {}),
+    ('GET /about', 'GET', '/about', None, {}),
+    ('GET /contact', 'GET', '/contact', None, {}),
+    ('GET /signup', 'GET', '/signup', None, {}),
+    ('GET /supplierlogin', 'GET', '/supplierlogin', None, {}),
+    ('POST /supplierlogin', 'POST', '/supplierlogin', None,
+     {'data': {'email': '{supplier_email}', 'password': '{supplier_password}'}}),
+    ('GET /recipientlogin', 'GET', '/recipientlogin', None, {}),
+    ('POST /recipientlogin', 'POST', '/recipientlogin', None,
+     {'data': {'email': '{recipient_email}', 'password': '{recipient_password}'}}),
+    ('GET /logout', 'GET', '/logout', None, {}),
+    ('GET /supplier-dashboard', 'GET', '/supplier-dashboard', 'Supplier', {}),
+    ('GET /supplier-dashboard (page)', 'GET', '/supplier-dashboard?sort=food_name&page=40',
+     'Supplier', {}),
+    ('GET /uploadfoodsurplus', 'GET', '/uploadfoodsurplus', 'Supplier', {}),
+    ('POST /uploadfoodsurplus', 'POST', '/uploadfoodsurplus', 'Supplier', {'data': {
+        'user_fullname': 'Benchmark Supplier', 'occupation': 'Restaurant', 'city': '{city}',
+        'contact_number': '0821234567', 'food_type': 'Bakery', 'food_name': 'Benchmark Bread',
+        'quantity_available': '20', 'delivery_option': 'Pickup', 'expiry_date': '{expiry_date}',
+        'description': 'Benchmark surplus'}}),
+    ('GET /view-recipient-needs', 'GET', '/view-recipient-needs', 'Supplier', {}),
+    ('GET /recipient-dashboard', 'GET', '/recipient-dashboard', 'Recipient', {}),
+    ('GET /view-available-surplus', 'GET', '/view-available-surplus', 'Recipient', {}),
+    ('GET /view-available-surplus?radius_km=25', 'GET', '/view-available-surplus?radius_km=25', 'Recipient', {}),
+    ('GET /uploadrequest', 'GET', '/uploadrequest', 'Recipient', {}),
+    ('POST /uploadrequest', 'POST', '/uploadrequest', 'Recipient',
+     {'data': {'item_id': '{item_id}', 'quantity_needed': '1', 'urgency_level': 'Medium'}}),
+    ('GET /api/food-items', 'GET', '/api/food-items', None, {}),
+    ('GET /api/food-items?city=&food_type=', 'GET', '/api/food-items?city={city}&food_type=Bakery', None, {}),
+    ('GET /api/food-items/nearby', 'GET', '/api/food-items/nearby?lat={lat}&lon={lon}&radius_km=25', None, {}),
+    ('GET /api/food-items/search', 'GET', '/api/food-items/search?q=bread', None, {}),
+    ('GET /api/requests', 'GET', '/api/requests', None, {}),
+    ('GET /api/requests?status=Pending', 'GET', '/api/requests?status=Pending', None, {}),
+    ('GET /api/export/food-items.ndjson', 'GET', '/api/export/food-items.ndjson', None, {}),
+    ('GET /api/export/requests.ndjson', 'GET', '/api/export/requests.ndjson', None, {}),
+    ('GET /api/kpi/supplier', 'GET', '/api/kpi/supplier', 'Supplier', {}),
+    ('GET /api/kpi/recipient', 'GET', '/api/kpi/recipient', 'Recipient', {}),
+    ('GET /api/changes', 'GET', '/api/changes?since={changes_since}', None, {}),
+    ('POST /api/food-items/create', 'POST', '/api/food-items/create', 'Supplier', {'json': {
+        'food_type': 'Fruits', 'food_name': 'Benchmark Apples', 'quantity_available': 15,
+        'expiry_date': '{expiry_date}', 'delivery_option': 'Delivery', 'city': '{city}'}}),
+    ('POST /api/food-items/bulk', 'POST', '/api/food-items/bulk', 'Supplier', {'json': [{
+        'food_type': 'Vegetables', 'food_name': 'Benchmark Carrots', 'quantity_available': 5,
+        'expiry_date': '{expiry_date}', 'delivery_option': 'Pickup', 'city': '{city}'}] * BULK_ROWS}),
+    ('PUT /api/requests/update/<id>', 'PUT', '/api/requests/update/{request_id}', 'Recipient',
+     {'json': {'status': 'Pending'}}),
+    ('POST /api/matching/run (dry run)', 'POST', '/api/matching/run', 'Supplier',
+     {'json': {'dry_run': True, 'deterministic': True}}),
+    ('GET /api/cache-stats', 'GET', '/api/cache-stats', None, {}),
+    ('GET /api/db/pool-stats', 'GET', '/api/db/pool-stats', None, {}),
+    ('GET /api/stream/stats', 'GET', '/api/stream/stats', None, {}),
+)
+
+def find_context(conn, today):
+    """Pick the busiest supplier and recipient and the ids and values the routes need"""
+    supplier = conn.execute('''
+        SELECT u.user_id, u.user_fullname, u.email, u.password
+        FROM food_items f JOIN users u ON u.user_id = f.user_id
+        GROUP BY f.user_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''').fetchone()
+    recipient = conn.execute('''
+        SELECT u.user_id, u.user_fullname, u.email, u.password
+        FROM requests r JOIN users u ON u.user_id = r.recipient_id
+        WHERE r.recipient_id != ?
+        GROUP BY r.recipient_id ORDER BY COUNT(*) DESC LIMIT 1
+    ''', (supplier['user_id'],)).fetchone()
+    item_id = conn.execute('''
+        SELECT item_id FROM food_items
+        WHERE status = 'Unselected' AND expiry_date >= ? AND user_id != ?
+        ORDER BY item_id DESC LIMIT 1
+    ''', (today.isoformat(), recipient['user_id'])).fetchone()[0]
+    request_id = conn.execute('''
+        SELECT request_id FROM requests WHERE recipient_id = ? AND status = 'Pending'
+        ORDER BY request_id DESC LIMIT 1
+    ''', (recipient['user_id'],)).fetchone()[0]
+    latitude, longitude = conn.execute(
+        "SELECT latitude, longitude FROM city_coordinates WHERE city_key = 'johannesburg'").fetchone()
+    last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+    return {
+        'supplier': supplier, 'recipient': recipient,
+        'supplier_email': supplier['email'], 'supplier_password': supplier['password'],
+        'recipient_email': recipient['email'], 'recipient_password': recipient['password'],
+        'item_id': item_id, 'request_id': request_id, 'city': 'Johannesburg',
+        'lat': latitude, 'lon': longitude, 'changes_since': max(last_seq - 1000, 0),
+        'expiry_date': date(today.year + 1, today.month, min(today.day, 28)).isoformat(),
+    }
+
+def fill(value, context):
+    """Format {placeholders} in a path or request body"""
+    if isinstance(value, str):
+        return value.format(**context)
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, context) for item in value]
+    return value
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+def make_client(role, context):
+    client = app.test_client()
+    if role is not None:
+        user = context['supplier' if role == 'Supplier' else 'recipient']
+        with client.session_transaction() as sess:
+            sess['user_id'] = user['user_id']
+            sess['user_fullname'] = user['user_fullname']
+            sess['roles'] = [role]
+    return client
+
+def time_route(client, method, path, kwargs, runs, warm):
+    """Call a route runs times (after one untimed call) and summarise latency and statements"""
+    timings, statements, sql_times = [], [], []
+    rows = 0
+    status = size = None
+    for run in range(runs + 1):
+        if not warm:
+            cache.clear()
+        with StatementRecorder() as recorder:
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            body = response.get_data()
+            elapsed = time.perf_counter() - started
+        response.close()
+        status, size = response.status_code, len(body)
+        if run:
+            timings.append(elapsed * 1000)
+            statements.append(len(recorder.statements))
+            sql_times.append(recorder.sql_time * 1000)
+            rows = recorder.rows
+    timings.sort()
+    statements.sort()
+    sql_times.sort()
+    return {
+        'status': status, 'bytes': size,
+        'p50_ms': round(percentile(timings, 50), 3), 'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3), 'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': percentile(statements, 50), 'max_queries': statements[-1],
+        'sql_p50_ms': round(percentile(sql_times, 50), 3), 'rows': rows,
+    }
+
+def prepare_database(path, counts, seed, today, rebuild):
+    """Create and seed the database for a scale unless a previous run already did"""
+    if os.path.exists(path) and not rebuild:
+        return
+    print(f'Building {path} ...', flush=True)
+    create_database(path)
+    app.config['DATABASE'] = path
+    conn = get_pool().connect()
+    try:
+        result = seed_database(conn, seed=seed, today=today, **counts)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    print(f'  seeded in {result["elapsed_s"]}s', flush=True)
+
+def run_scale(database, runs, warm, today, only=None):
+    """Benchmark the routes against a scratch copy of database, so every run sees the same data"""
+    #A new path each time also makes get_pool() start a fresh pool (and location registry) for it
+    handle, scratch = tempfile.mkstemp(prefix='foodconnect-benchmark-', suffix='.db')
+    os.close(handle)
+    shutil.copyfile(database, scratch)
+    try:
+        return benchmark_routes(scratch, runs, warm, today, only)
+    finally:
+        get_pool().close_all()
+        for path in (scratch, scratch + '-wal', scratch + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+def benchmark_routes(database, runs, warm, today, only):
+    app.config['DATABASE'] = database
+    #Every large route would be logged as slow; the table below has the numbers anyway
+    app.config['SLOW_REQUEST_MS'] = 0
+    cache.clear()
+    conn = get_pool().connect()
+    try:
+        context = find_context(conn, today)
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('users', 'locations', 'food_items', 'requests', 'transactions')}
+    finally:
+        conn.close()
+
+    results = {}
+    for name, method, path, role, kwargs in ROUTES:
+        if only and not any(part in name for part in only):
+            continue
+        #A fresh client per route, so one route's session (logins, flash messages) can't affect the next
+        client = make_client(role, context)
+        results[name] = time_route(client, method, fill(path, context), fill(kwargs, context), runs, warm)
+    return {'counts': counts, 'routes': results}
+
+def print_results(scale, result):
+    counts = ', '.join(f'{count} {table}' for table, count in result['counts'].items())
+    print(f'\n== {scale} ({counts}) ==')
+    print(f'{"route":<44} {"status":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8} {"sql ms":>8} {"rows":>8} {"bytes":>10}')
+    for name, stats in result['routes'].items():
+        flag = '' if stats['status'] < 400 else '  <- error'
+        print(f'{name:<44} {stats["status"]:>6} {stats["p50_ms"]:>9.2f} {stats["p95_ms"]:>9.2f} '
+              f'{stats["p99_ms"]:>9.2f} {stats["queries"]:>8} {stats["sql_p50_ms"]:>8.2f} {stats["rows"]:>8} {stats["bytes"]:>10}{flag}')
+
+def compare(results, baseline, max_ratio):
+    """Print each route's change from the baseline and return the regressions"""
+    regressions = []
+    for scale, result in results.items():
+        old_routes = baseline.get('scales', {}).get(scale, {}).get('routes')
+        if old_routes is None:
+            print(f'\n{scale}: not in the baseline')
+            continue
+        print(f'\n== {scale} vs baseline ==')
+        print(f'{"route":<44} {"p50 ms":>19} {"change":>8} {"p95 ms":>19} {"queries":>10}')
+        for name, stats in result['routes'].items():
+            old = old_routes.get(name)
+            if old is None:
+                print(f'{name:<44} {"new route":>19}')
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 1.0
+            slower = ratio > max_ratio and stats['p50_ms'] - old['p50_ms'] > MIN_REGRESSION_MS
+            more_queries = stats['queries'] > old['queries']
+            flag = '  REGRESSION' if slower or more_queries else ''
+            if flag:
+                regressions.append((scale, name))
+            print(f'{name:<44} {old["p50_ms"]:>8.2f} -> {stats["p50_ms"]:>7.2f} {(ratio - 1) * 100:>+7.0f}% '
+                  f'{old["p95_ms"]:>8.2f} -> {stats["p95_ms"]:>7.2f} {old["queries"]:>4} -> {stats["queries"]:<3}{flag}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every FoodConnect route at synthetic data scales.')
+    parser.add_argument('--scale', action='append', choices=list(SCALES),
+                        help='Scale to benchmark (repeatable, default small).')
+    parser.add_argument('--db', help='Benchmark this existing database instead of generating one.')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'foodconnect-benchmark'),
+                        help='Where generated databases are kept between runs.')
+    parser.add_argument('--rebuild', action='store_true', help='Regenerate databases even if they exist.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data.')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help='Timed calls per route.')
+    parser.add_argument('--route', action='append', help='Only routes whose name contains this (repeatable).')
+    parser.add_argument('--warm', action='store_true', help='Keep the read cache between calls.')
+    parser.add_argument('--save', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', help='Compare against results saved with --save.')
+    parser.add_argument('--max-ratio', type=float, default=DEFAULT_MAX_RATIO,
+                        help='Median (p50) growth that counts as a regression.')
+    args = parser.parse_args(argv)
+    if args.runs < 1:
+        parser.error('--runs must be at least 1')
+
+    today = date.today()
+    if args.db:
+        databases = {os.path.splitext(os.path.basename(args.db))[0]: args.db}
+    else:
+        os.makedirs(args.data_dir, exist_ok=True)
+        databases = {}
+        for scale in args.scale or ['small']:
+            path = os.path.join(args.data_dir, f'{scale}-seed{args.seed}.db')
+            prepare_database(path, SCALES[scale], args.seed, today, args.rebuild)
+            databases[scale] = path
+
+    results = {}
+    for scale, database in databases.items():
+        results[scale] = run_scale(database, args.runs, args.warm, today, args.route)
+        print_results(scale, results[scale])
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(timespec='seconds'), 'runs': args.runs,
+                       'warm': args.warm, 'scales': results}, f, indent=2)
+        print(f'\nSaved results to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_ratio)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s)')
+            return 1
+        print('\nNo regressions')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
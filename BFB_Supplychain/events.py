@@ -0,0 +1,154 @@
+"""
+In-process fan-out of FoodConnect change events to Server-Sent Events subscribers.
+
+Triggers record every insert, update and delete of food items, requests and transactions
+in the change_log table (migrations/009_change_log.sql). One EventBroadcaster per worker
+process polls that log from a background thread, which only runs while someone is
+subscribed, and turns new food item / request inserts and status changes into events
+(food item lots split off by partial claims are left out; their requests are not).
+Each event goes into the queue of every subscriber whose filters match. Queues are
+bounded: a client that falls behind drops events and is told to resync instead of
+holding memory.
+
+Used by GET /api/stream/events in app.py.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = ('event_id', 'event_type', 'item_id', 'request_id', 'status', 'previous_status',
+                 'city', 'food_type', 'created_at')
+
+def fetch_events(conn, after_id, limit):
+    """Get up to limit events newer than change_log seq after_id as dicts, oldest first"""
+    rows = conn.execute('''
+        SELECT
+            c.seq,
+            CASE c.table_name WHEN 'food_items' THEN 'food_item' ELSE 'request' END
+                || CASE c.operation WHEN 'insert' THEN '.created' ELSE '.status' END,
+            c.item_id,
+            CASE c.table_name WHEN 'requests' THEN c.row_id END,
+            c.status,
+            c.previous_status,
+            l.city,
+            f.food_type,
+            c.changed_at
+        FROM change_log c
+        LEFT JOIN food_items f ON f.item_id = c.item_id
+        LEFT JOIN locations l ON l.location_id = f.location_id
+        WHERE c.seq > ?
+          AND c.table_name IN ('food_items', 'requests')
+          AND (c.table_name = 'requests' OR f.parent_item_id IS NULL)
+          AND (c.operation = 'insert' OR (c.operation = 'update' AND c.status IS NOT c.previous_status))
+        ORDER BY c.seq
+        LIMIT ?
+    ''', (after_id, limit)).fetchall()
+    return [dict(zip(EVENT_COLUMNS, row)) for row in rows]
+
+class Subscriber:
+    """One connected client: its filters and a bounded queue of events waiting to be sent"""
+
+    def __init__(self, city=None, food_type=None, max_queued=100):
+        self.city = city.strip().lower() if city else None
+        self.food_type = food_type or None
+        self.events = queue.Queue(max_queued)
+        self.overflowed = False
+        self.closed = False
+
+    def wants(self, event):
+        return ((self.city is None or (event['city'] or '').strip().lower() == self.city)
+                and (self.food_type is None or event['food_type'] == self.food_type))
+
+    def push(self, event):
+        """Queue an event; if the queue is full it is dropped and the client must resync"""
+        try:
+            self.events.put_nowait(event)
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def close(self):
+        """End the client's stream; None wakes a stream waiting on an empty queue"""
+        self.closed = True
+        try:
+            self.events.put_nowait(None)
+        except queue.Full:
+            pass
+
+class EventBroadcaster:
+    """Polls change_log and fans new events out to the subscribers of this process"""
+
+    def __init__(self, connect, poll_interval=1.0, batch_size=500):
+        self.connect = connect
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self._last_id = 0
+        self._stats = {'events': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, conn, max_queued=100, **filters):
+        """Register a subscriber; events committed after this call will reach it"""
+        subscriber = Subscriber(max_queued=max_queued, **filters)
+        with self._lock:
+            #Threads do not survive a fork, so a forked worker starts its own
+            if self._pid != os.getpid():
+                self._pid, self._thread, self._subscribers = os.getpid(), None, set()
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._last_id = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+                self._thread = threading.Thread(target=self._run, name='event-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self):
+        """End every subscriber's stream (the worker is stopping); clients reconnect to another"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def _run(self):
+        conn = self.connect()
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                try:
+                    events = fetch_events(conn, self._last_id, self.batch_size)
+                except Exception:
+                    logger.exception('Polling change_log failed')
+                    time.sleep(self.poll_interval)
+                    continue
+
+                if events:
+                    self._last_id = events[-1]['event_id']
+                    with self._lock:
+                        subscribers = list(self._subscribers)
+                    for event in events:
+                        self._stats['events'] += 1
+                        for subscriber in subscribers:
+                            if subscriber.wants(event):
+                                self._stats['delivered' if subscriber.push(event) else 'dropped'] += 1
+                if len(events) < self.batch_size:
+                    time.sleep(self.poll_interval)
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, subscribers=len(self._subscribers),
+                        running=self._thread is not None, last_event_id=self._last_id)
@@ -1,5 +1,8 @@
 PRAGMA foreign_keys = ON;
 
+-- Base schema and mock data. Later schema changes live in migrations/ and are
+-- applied on top of this file (flask --app app init-db runs both).
+
 -- Drop existing tables
 DROP TABLE IF EXISTS transactions;
 DROP TABLE IF EXISTS requests;
@@ -0,0 +1,47 @@
+"""
+gunicorn settings for FoodConnect (see wsgi.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Worker processes scale across cores and each runs a pool of threads; one thread is held for
+as long as a client keeps /api/stream/events open. The FOODCONNECT_* variables below
+override the defaults.
+"""
+import multiprocessing
+import os
+import signal
+
+bind = os.environ.get('FOODCONNECT_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('FOODCONNECT_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+#One pooled connection per thread (FOODCONNECT_DB_POOL_SIZE keeps that many idle)
+threads = int(os.environ.get('FOODCONNECT_THREADS', 8))
+preload_app = True
+timeout = int(os.environ.get('FOODCONNECT_TIMEOUT', 30))
+#How long a stopping worker waits for its in-flight requests
+graceful_timeout = int(os.environ.get('FOODCONNECT_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+accesslog = os.environ.get('FOODCONNECT_ACCESS_LOG', '-')
+errorlog = '-'
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool"""
+    from wsgi import init_worker
+    init_worker()
+
+def post_worker_init(worker):
+    """On SIGTERM, fail /readyz and end event streams before gunicorn stops accepting, so the
+    load balancer moves traffic away while in-flight requests finish"""
+    from wsgi import begin_shutdown
+    handle_exit = worker.handle_exit
+
+    def drain(sig, frame):
+        begin_shutdown()
+        handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+
+def worker_exit(server, worker):
+    """Commit queued writes and close the worker's connections once its requests are done"""
+    from wsgi import shutdown
+    shutdown()
@@ -0,0 +1,105 @@
+"""
+Batch matching of surplus food items to pending recipient requests for FoodConnect.
+
+Every pending request for an available item goes into one priority queue, ordered by
+urgency (High first), the item's expiry date (soonest first) and then the request's age
+(oldest first). Requests are popped in that order and the first one for each item wins it:
+the request becomes 'Selected' (the sync_food_item_status trigger marks the item 'Pending')
+and an 'In-Progress' transaction row is recorded. All of it happens in the caller's write
+transaction, so a run either allocates everything it reports or nothing.
+
+Used by `flask match-requests` and POST /api/matching/run in app.py.
+"""
+import heapq
+import random
+import time
+from datetime import datetime, timezone
+
+URGENCY_RANK = {'High': 0, 'Medium': 1, 'Low': 2}
+
+def load_candidates(conn, today, supplier_id=None):
+    """Get every pending request that could be allocated right now.
+
+    The filters mirror the checks in the validate_transaction and
+    validate_transaction_quantity triggers, so a chosen request never aborts the batch.
+    """
+    supplier_filter = 'AND f.user_id = ?' if supplier_id is not None else ''
+    params = [today] + ([supplier_id] if supplier_id is not None else [])
+    return conn.execute(f'''
+        SELECT r.request_id, r.item_id, r.recipient_id, r.quantity_needed, r.urgency_level, r.created_at,
+               f.user_id AS supplier_id, f.expiry_date
+        FROM requests r
+        JOIN food_items f ON r.item_id = f.item_id
+        WHERE r.status = 'Pending'
+          AND f.status = 'Unselected'
+          AND f.expiry_date >= ?
+          AND r.quantity_needed <= f.quantity_available
+          AND r.recipient_id != f.user_id
+          AND NOT EXISTS (SELECT 1 FROM transactions t WHERE t.item_id = f.item_id)
+          AND NOT EXISTS (SELECT 1 FROM requests s WHERE s.item_id = f.item_id AND s.status = 'Selected')
+          AND EXISTS (SELECT 1 FROM user_roles ur WHERE ur.user_id = f.user_id AND ur.role = 'Supplier')
+          AND EXISTS (SELECT 1 FROM user_roles ur WHERE ur.user_id = r.recipient_id AND ur.role = 'Recipient')
+          {supplier_filter}
+    ''', params).fetchall()
+
+def allocate(candidates, limit=None, deterministic=False, seed=None):
+    """Pick at most one request per item, in priority order.
+
+    Requests that tie on urgency, expiry and age are ordered by request_id when
+    deterministic, otherwise shuffled so no recipient is always first in line.
+    """
+    rng = random.Random(seed)
+    queue = []
+    for row in candidates:
+        tiebreak = row['request_id'] if deterministic else rng.random()
+        key = (URGENCY_RANK.get(row['urgency_level'], URGENCY_RANK['Medium']),
+               row['expiry_date'], row['created_at'] or '', tiebreak, row['request_id'])
+        queue.append((key, row))
+    heapq.heapify(queue)
+
+    allocations = []
+    allocated_items = set()
+    while queue and (limit is None or len(allocations) < limit):
+        _, row = heapq.heappop(queue)
+        if row['item_id'] in allocated_items:
+            continue
+        allocated_items.add(row['item_id'])
+        allocations.append({
+            'request_id': row['request_id'],
+            'item_id': row['item_id'],
+            'supplier_id': row['supplier_id'],
+            'recipient_id': row['recipient_id'],
+            'quantity': row['quantity_needed'],
+            'urgency_level': row['urgency_level']
+        })
+    return allocations
+
+def run_matching(conn, limit=None, supplier_id=None, deterministic=False, seed=None, today=None, dry_run=False):
+    """Allocate pending requests and return a summary. Run it inside a write transaction
+    (app.perform_write or run_write_transaction); a dry run only reads.
+
+    today (an ISO date, default the current UTC date, as date('now') sees it) decides which
+    items count as expired; pass it together with deterministic=True for repeatable runs in tests.
+    """
+    started = time.perf_counter()
+    today = today or datetime.now(timezone.utc).date().isoformat()
+
+    candidates = load_candidates(conn, today, supplier_id)
+    allocations = allocate(candidates, limit, deterministic, seed)
+
+    if not dry_run:
+        conn.executemany(
+            "UPDATE requests SET status = 'Selected' WHERE request_id = ? AND status = 'Pending'",
+            [(a['request_id'],) for a in allocations])
+        conn.executemany('''
+            INSERT INTO transactions (item_id, supplier_id, recipient_id, quantity, status)
+            VALUES (?, ?, ?, ?, 'In-Progress')
+        ''', [(a['item_id'], a['supplier_id'], a['recipient_id'], a['quantity']) for a in allocations])
+
+    return {
+        'candidates': len(candidates),
+        'matched': len(allocations),
+        'dry_run': dry_run,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        'allocations': allocations
+    }
@@ -0,0 +1,293 @@
+"""
+Per-request performance metrics for FoodConnect, exposed in Prometheus text format.
+
+RequestMetricsMiddleware wraps the WSGI app and measures every request from the call until
+its body has been sent (so streamed exports are measured in full): latency, status,
+response size, template render time and, through a StatementRecorder, the SQL statements
+run, their time and the rows fetched. Requests slower than the configured threshold are
+logged together with the SQL they issued. The numbers are per worker process.
+
+The recorders are fed by the Cursor and Connection classes in app.py, whose execute and
+fetch methods are wrapped with traced() and counted(). Used by GET /metrics in app.py,
+benchmark.py and the query budget checks in test_routes.py.
+"""
+import logging
+import re
+import threading
+import time
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+ENVIRON_KEY = 'foodconnect.metrics'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+#Statements listed in a slow-request log entry, and characters kept of each
+SLOW_LOG_STATEMENTS = 50
+SLOW_LOG_SQL_CHARS = 1000
+WHITESPACE = re.compile(r'\s+')
+
+_local = threading.local()
+
+def active_recorders():
+    """The StatementRecorders active on the current thread"""
+    return getattr(_local, 'recorders', ())
+
+class StatementRecorder:
+    """Collects the SQL statements the current thread runs while it is active.
+
+    Recorders nest: a statement is reported to every active recorder, so a test or the
+    benchmark can record a request that the middleware is recording too.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.durations = []
+        self.sql_time = 0.0
+        self.rows = 0
+
+    def start(self):
+        _local.recorders = active_recorders() + (self,)
+        return self
+
+    def stop(self):
+        _local.recorders = tuple(recorder for recorder in active_recorders() if recorder is not self)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def repeated(self):
+        """{sql: times run} for statements run more than once, the usual sign of an N+1 loop"""
+        counts = {}
+        for sql in self.statements:
+            counts[sql] = counts.get(sql, 0) + 1
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+def traced(method):
+    """Wrap an execute/executemany method so active recorders see the statement and its time"""
+    @wraps(method)
+    def wrapper(self, sql, *args, **kwargs):
+        recorders = active_recorders()
+        if not recorders:
+            return method(self, sql, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(self, sql, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            for recorder in recorders:
+                recorder.statements.append(sql)
+                recorder.durations.append(elapsed)
+                recorder.sql_time += elapsed
+    return wrapper
+
+def counted(method):
+    """Wrap a fetch method (or __next__) so active recorders count its rows and time"""
+    single = method.__name__ in ('fetchone', '__next__')
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        recorders = active_recorders()
+        if not recorders:
+            return method(self, *args, **kwargs)
+        started = time.perf_counter()
+        result = method(self, *args, **kwargs)
+        elapsed = time.perf_counter() - started
+        rows = (result is not None) if single else len(result)
+        for recorder in recorders:
+            recorder.rows += rows
+            recorder.sql_time += elapsed
+        return result
+    return wrapper
+
+class RequestSample:
+    """What one request did; kept in the WSGI environ while the request runs"""
+
+    def __init__(self, environ):
+        self.method = environ.get('REQUEST_METHOD', '')
+        self.path = environ.get('PATH_INFO', '')
+        self.endpoint = 'unmatched'
+        self.status = 500
+        self.response_bytes = 0
+        self.render_time = 0.0
+        self.render_started = None
+        self.finished = False
+        self.started = time.perf_counter()
+        self.recorder = StatementRecorder()
+
+class Histogram:
+    """Cumulative-bucket histogram per label set"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class RequestMetrics:
+    """Request, SQL, rendering and response size metrics of this process"""
+
+    #name: (type, help, buckets, label names)
+    FAMILIES = {
+        'foodconnect_http_requests_total': (
+            'counter', 'Requests handled, by endpoint, method and status.', None, ('endpoint', 'method', 'status')),
+        'foodconnect_http_request_duration_seconds': (
+            'histogram', 'Time from receiving a request until its response body was sent.', LATENCY_BUCKETS,
+            ('endpoint', 'method')),
+        'foodconnect_http_response_size_bytes': (
+            'histogram', 'Response body size as sent (after compression).', SIZE_BUCKETS, ('endpoint',)),
+        'foodconnect_sql_statements_per_request': (
+            'histogram', 'SQL statements executed per request.', STATEMENT_BUCKETS, ('endpoint',)),
+        'foodconnect_sql_duration_seconds': (
+            'histogram', 'Time per request spent executing SQL and fetching rows.', LATENCY_BUCKETS, ('endpoint',)),
+        'foodconnect_sql_rows_fetched': (
+            'histogram', 'Rows fetched from SQLite per request.', ROW_BUCKETS, ('endpoint',)),
+        'foodconnect_template_render_seconds': (
+            'histogram', 'Time per request spent rendering templates.', LATENCY_BUCKETS, ('endpoint',)),
+        'foodconnect_slow_requests_total': (
+            'counter', 'Requests slower than the slow-request threshold.', None, ('endpoint',)),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: Histogram(buckets) if buckets else {}
+                        for name, (_, _, buckets, _) in self.FAMILIES.items()}
+
+    def _label(self, name, *values):
+        return tuple(zip(self.FAMILIES[name][3], values))
+
+    def observe(self, sample, duration, slow):
+        endpoint, recorder = sample.endpoint, sample.recorder
+        observations = (
+            ('foodconnect_http_request_duration_seconds', (endpoint, sample.method), duration),
+            ('foodconnect_http_response_size_bytes', (endpoint,), sample.response_bytes),
+            ('foodconnect_sql_statements_per_request', (endpoint,), len(recorder.statements)),
+            ('foodconnect_sql_duration_seconds', (endpoint,), recorder.sql_time),
+            ('foodconnect_sql_rows_fetched', (endpoint,), recorder.rows),
+            ('foodconnect_template_render_seconds', (endpoint,), sample.render_time),
+        )
+        counters = [('foodconnect_http_requests_total', (endpoint, sample.method, sample.status))]
+        if slow:
+            counters.append(('foodconnect_slow_requests_total', (endpoint,)))
+        with self._lock:
+            for name, labels, value in observations:
+                self._values[name].observe(self._label(name, *labels), value)
+            for name, labels in counters:
+                key = self._label(name, *labels)
+                self._values[name][key] = self._values[name].get(key, 0) + 1
+
+    def render(self, extra=()):
+        """Prometheus text exposition of every family, plus extra (name, type, help, [(labels, value)])"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets, _) in self.FAMILIES.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                values = self._values[name]
+                if kind == 'counter':
+                    lines += [f'{name}{format_labels(labels)} {value}' for labels, value in sorted(values.items())]
+                    continue
+                for labels, (counts, total, count) in sorted(values.series.items()):
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+                    lines.append(f'{name}_count{format_labels(labels)} {count}')
+        for name, kind, help_text, samples in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{format_labels(tuple(labels.items()))} {format_value(value)}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+class MeasuredBody:
+    """Response body wrapper that counts the bytes sent and finishes the sample once it is done"""
+
+    def __init__(self, body, sample, finish):
+        self.body = body
+        self.sample = sample
+        self.finish = finish
+
+    def __iter__(self):
+        try:
+            for chunk in self.body:
+                self.sample.response_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.finish(self.sample)
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.finish(self.sample)
+
+class RequestMetricsMiddleware:
+    """WSGI middleware recording a RequestSample per request into RequestMetrics"""
+
+    def __init__(self, wsgi_app, metrics, config):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+        self.config = config
+
+    def __call__(self, environ, start_response):
+        sample = environ[ENVIRON_KEY] = RequestSample(environ)
+
+        def measured_start_response(status, headers, exc_info=None):
+            sample.status = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        sample.recorder.start()
+        try:
+            body = self.wsgi_app(environ, measured_start_response)
+        except BaseException:
+            self.finish(sample)
+            raise
+        return MeasuredBody(body, sample, self.finish)
+
+    def finish(self, sample):
+        #Called when the body is exhausted and again when it is closed; only the first counts
+        if sample.finished:
+            return
+        sample.finished = True
+        sample.recorder.stop()
+        duration = time.perf_counter() - sample.started
+        threshold = self.config.get('SLOW_REQUEST_MS', 0)
+        slow = threshold > 0 and duration * 1000 >= threshold
+        self.metrics.observe(sample, duration, slow)
+        if slow:
+            log_slow_request(sample, duration)
+
+def log_slow_request(sample, duration):
+    recorder = sample.recorder
+    lines = [f'{elapsed * 1000:8.2f} ms  {WHITESPACE.sub(" ", sql).strip()[:SLOW_LOG_SQL_CHARS]}'
+             for sql, elapsed in zip(recorder.statements[:SLOW_LOG_STATEMENTS], recorder.durations)]
+    if len(recorder.statements) > SLOW_LOG_STATEMENTS:
+        lines.append(f'... {len(recorder.statements) - SLOW_LOG_STATEMENTS} more statements')
+    logger.warning('Slow request: %s %s (%s) -> %s in %.1f ms; %d statements, %.1f ms SQL, %d rows, '
+                   '%.1f ms rendering, %d bytes\n%s', sample.method, sample.path, sample.endpoint,
+                   sample.status, duration * 1000, len(recorder.statements), recorder.sql_time * 1000,
+                   recorder.rows, sample.render_time * 1000, sample.response_bytes, '\n'.join(lines))
@@ -0,0 +1,213 @@
+-- KPI COUNTERS
+-- Dashboard totals kept current by triggers so dashboards read a few rows instead of scanning tables.
+-- Rebuild (or check for drift) with: flask --app app rebuild-kpis [--check]
+
+-- Global totals: total_items, requests, active_requests, transactions, kg_donated,
+-- recipients_helped (distinct recipients in transactions), suppliers_count (distinct suppliers)
+CREATE TABLE kpi_counters (
+    name TEXT PRIMARY KEY,
+    value NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE TABLE kpi_supplier_counters (
+    user_id INTEGER PRIMARY KEY,
+    total_items INTEGER NOT NULL DEFAULT 0,
+    donated INTEGER NOT NULL DEFAULT 0,
+    kg_donated NUMERIC NOT NULL DEFAULT 0
+);
+
+CREATE TABLE kpi_recipient_counters (
+    user_id INTEGER PRIMARY KEY,
+    requests INTEGER NOT NULL DEFAULT 0,
+    received INTEGER NOT NULL DEFAULT 0,
+    kg_received NUMERIC NOT NULL DEFAULT 0,
+    suppliers INTEGER NOT NULL DEFAULT 0
+);
+
+-- Transactions per supplier/recipient pair, used to keep the distinct counts exact
+CREATE TABLE kpi_transaction_pairs (
+    supplier_id INTEGER NOT NULL,
+    recipient_id INTEGER NOT NULL,
+    transactions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (supplier_id, recipient_id)
+) WITHOUT ROWID;
+
+-- Per-day counters (e.g. 'donated' transactions) for the "today" KPIs
+CREATE TABLE kpi_daily_counters (
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, name)
+) WITHOUT ROWID;
+
+-- Food items per supplier and expiry day (user_id 0 holds the global totals)
+-- open_items excludes 'Completed' items
+CREATE TABLE kpi_expiry_buckets (
+    user_id INTEGER NOT NULL,
+    expiry_day TEXT NOT NULL,
+    items INTEGER NOT NULL DEFAULT 0,
+    open_items INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, expiry_day)
+) WITHOUT ROWID;
+
+INSERT INTO kpi_counters (name, value) VALUES
+('total_items', 0),
+('requests', 0),
+('active_requests', 0),
+('transactions', 0),
+('kg_donated', 0),
+('recipients_helped', 0),
+('suppliers_count', 0);
+
+-- FOOD ITEMS TRIGGERS
+CREATE TRIGGER kpi_food_items_insert
+AFTER INSERT ON food_items
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_items';
+    INSERT INTO kpi_supplier_counters (user_id, total_items) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET total_items = total_items + 1;
+    INSERT INTO kpi_expiry_buckets (user_id, expiry_day, items, open_items) VALUES
+        (NEW.user_id, COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed'),
+        (0,           COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed')
+    ON CONFLICT(user_id, expiry_day) DO UPDATE SET
+        items = items + 1,
+        open_items = open_items + excluded.open_items;
+END;
+
+CREATE TRIGGER kpi_food_items_delete
+AFTER DELETE ON food_items
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_items';
+    UPDATE kpi_supplier_counters SET total_items = total_items - 1 WHERE user_id = OLD.user_id;
+    UPDATE kpi_expiry_buckets
+    SET items = items - 1, open_items = open_items - (OLD.status != 'Completed')
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date);
+    DELETE FROM kpi_expiry_buckets
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date) AND items = 0;
+END;
+
+CREATE TRIGGER kpi_food_items_update
+AFTER UPDATE OF user_id, expiry_date, status ON food_items
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_supplier_counters SET total_items = total_items - 1 WHERE user_id = OLD.user_id;
+    INSERT INTO kpi_supplier_counters (user_id, total_items) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET total_items = total_items + 1;
+    UPDATE kpi_expiry_buckets
+    SET items = items - 1, open_items = open_items - (OLD.status != 'Completed')
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date);
+    INSERT INTO kpi_expiry_buckets (user_id, expiry_day, items, open_items) VALUES
+        (NEW.user_id, COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed'),
+        (0,           COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed')
+    ON CONFLICT(user_id, expiry_day) DO UPDATE SET
+        items = items + 1,
+        open_items = open_items + excluded.open_items;
+    DELETE FROM kpi_expiry_buckets
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date) AND items = 0;
+END;
+
+-- REQUESTS TRIGGERS
+CREATE TRIGGER kpi_requests_insert
+AFTER INSERT ON requests
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value + 1 WHERE name = 'requests';
+    UPDATE kpi_counters SET value = value + 1 WHERE name = 'active_requests' AND NEW.status = 'Pending';
+    INSERT INTO kpi_recipient_counters (user_id, requests) VALUES (NEW.recipient_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET requests = requests + 1;
+END;
+
+CREATE TRIGGER kpi_requests_delete
+AFTER DELETE ON requests
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'requests';
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'active_requests' AND OLD.status = 'Pending';
+    UPDATE kpi_recipient_counters SET requests = requests - 1 WHERE user_id = OLD.recipient_id;
+END;
+
+CREATE TRIGGER kpi_requests_update
+AFTER UPDATE OF recipient_id, status ON requests
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters
+    SET value = value + (NEW.status = 'Pending') - (OLD.status = 'Pending')
+    WHERE name = 'active_requests';
+    UPDATE kpi_recipient_counters SET requests = requests - 1 WHERE user_id = OLD.recipient_id;
+    INSERT INTO kpi_recipient_counters (user_id, requests) VALUES (NEW.recipient_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET requests = requests + 1;
+END;
+
+-- TRANSACTIONS TRIGGERS
+CREATE TRIGGER kpi_transactions_insert
+AFTER INSERT ON transactions
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value + 1 WHERE name = 'transactions';
+    UPDATE kpi_counters SET value = value + NEW.quantity WHERE name = 'kg_donated';
+    INSERT INTO kpi_daily_counters (day, name, value) VALUES (date(NEW.created_at), 'donated', 1)
+    ON CONFLICT(day, name) DO UPDATE SET value = value + 1;
+
+    INSERT INTO kpi_supplier_counters (user_id, donated, kg_donated) VALUES (NEW.supplier_id, 1, NEW.quantity)
+    ON CONFLICT(user_id) DO UPDATE SET donated = donated + 1, kg_donated = kg_donated + excluded.kg_donated;
+    UPDATE kpi_counters SET value = value + 1
+    WHERE name = 'suppliers_count'
+      AND (SELECT donated FROM kpi_supplier_counters WHERE user_id = NEW.supplier_id) = 1;
+
+    INSERT INTO kpi_recipient_counters (user_id, received, kg_received) VALUES (NEW.recipient_id, 1, NEW.quantity)
+    ON CONFLICT(user_id) DO UPDATE SET received = received + 1, kg_received = kg_received + excluded.kg_received;
+    UPDATE kpi_counters SET value = value + 1
+    WHERE name = 'recipients_helped'
+      AND (SELECT received FROM kpi_recipient_counters WHERE user_id = NEW.recipient_id) = 1;
+
+    INSERT INTO kpi_transaction_pairs (supplier_id, recipient_id, transactions) VALUES (NEW.supplier_id, NEW.recipient_id, 1)
+    ON CONFLICT(supplier_id, recipient_id) DO UPDATE SET transactions = transactions + 1;
+    UPDATE kpi_recipient_counters SET suppliers = suppliers + 1
+    WHERE user_id = NEW.recipient_id
+      AND (SELECT transactions FROM kpi_transaction_pairs
+           WHERE supplier_id = NEW.supplier_id AND recipient_id = NEW.recipient_id) = 1;
+END;
+
+CREATE TRIGGER kpi_transactions_delete
+AFTER DELETE ON transactions
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'transactions';
+    UPDATE kpi_counters SET value = value - OLD.quantity WHERE name = 'kg_donated';
+    UPDATE kpi_daily_counters SET value = value - 1 WHERE day = date(OLD.created_at) AND name = 'donated';
+
+    UPDATE kpi_supplier_counters SET donated = donated - 1, kg_donated = kg_donated - OLD.quantity
+    WHERE user_id = OLD.supplier_id;
+    UPDATE kpi_counters SET value = value - 1
+    WHERE name = 'suppliers_count'
+      AND (SELECT donated FROM kpi_supplier_counters WHERE user_id = OLD.supplier_id) = 0;
+
+    UPDATE kpi_recipient_counters SET received = received - 1, kg_received = kg_received - OLD.quantity
+    WHERE user_id = OLD.recipient_id;
+    UPDATE kpi_counters SET value = value - 1
+    WHERE name = 'recipients_helped'
+      AND (SELECT received FROM kpi_recipient_counters WHERE user_id = OLD.recipient_id) = 0;
+
+    UPDATE kpi_transaction_pairs SET transactions = transactions - 1
+    WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id;
+    UPDATE kpi_recipient_counters SET suppliers = suppliers - 1
+    WHERE user_id = OLD.recipient_id
+      AND (SELECT transactions FROM kpi_transaction_pairs
+           WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id) = 0;
+    DELETE FROM kpi_transaction_pairs
+    WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id AND transactions = 0;
+END;
+
+-- Quantity corrections are the only expected transaction update; anything else is fixed by rebuild-kpis
+CREATE TRIGGER kpi_transactions_update
+AFTER UPDATE OF quantity ON transactions
+FOR EACH ROW
+BEGIN
+    UPDATE kpi_counters SET value = value + NEW.quantity - OLD.quantity WHERE name = 'kg_donated';
+    UPDATE kpi_supplier_counters SET kg_donated = kg_donated + NEW.quantity - OLD.quantity
+    WHERE user_id = NEW.supplier_id;
+    UPDATE kpi_recipient_counters SET kg_received = kg_received + NEW.quantity - OLD.quantity
+    WHERE user_id = NEW.recipient_id;
+END;
@@ -0,0 +1,11 @@
+-- PAGINATION INDEXES
+-- Composite indexes for keyset pagination of /api/food-items (expiry_date, item_id)
+-- and /api/requests (created_at, request_id). The rowid (item_id / request_id) is the
+-- implicit last column of every index, so it completes the keyset order.
+CREATE INDEX idx_food_items_status_expiry ON food_items(status, expiry_date);
+CREATE INDEX idx_food_items_status_type_expiry ON food_items(status, food_type, expiry_date);
+CREATE INDEX idx_food_items_status_delivery_expiry ON food_items(status, delivery_option, expiry_date);
+CREATE INDEX idx_food_items_location_status_expiry ON food_items(location_id, status, expiry_date);
+
+CREATE INDEX idx_requests_created ON requests(created_at);
+CREATE INDEX idx_requests_status_created ON requests(status, created_at);
@@ -0,0 +1,4 @@
+-- EXPORT INDEXES
+-- Lets the NDJSON exports walk food_items in created_at order and serve ?since= as a range scan
+-- (requests already has idx_requests_created)
+CREATE INDEX idx_food_items_created ON food_items(created_at);
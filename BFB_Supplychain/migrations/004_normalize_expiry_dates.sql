@@ -0,0 +1,31 @@
+-- NORMALISED EXPIRY DATES
+-- food_items.expiry_date is stored as an ISO 'YYYY-MM-DD' date so expiry filters can be
+-- written as plain range predicates (expiry_date >= date('now')) that use the indexes,
+-- instead of date(expiry_date) wrappers that force a full scan.
+
+-- Rewrite existing values that SQLite can parse (e.g. '2025-12-15 00:00:00') to the ISO date.
+-- date() passes impossible days such as '2025-02-30' through, while date(x, '+0 days')
+-- normalizes them, so the two agree only for real dates.
+UPDATE food_items SET expiry_date = date(expiry_date)
+WHERE date(expiry_date) = date(expiry_date, '+0 days') AND expiry_date IS NOT date(expiry_date);
+
+-- CHECK constraints cannot be added to an existing table, so new values are validated by triggers
+CREATE TRIGGER validate_expiry_date_insert
+BEFORE INSERT ON food_items
+FOR EACH ROW
+WHEN NEW.expiry_date IS NOT date(NEW.expiry_date, '+0 days')
+BEGIN
+    SELECT RAISE(ABORT, 'expiry_date must be an ISO date (YYYY-MM-DD)');
+END;
+
+CREATE TRIGGER validate_expiry_date_update
+BEFORE UPDATE OF expiry_date ON food_items
+FOR EACH ROW
+WHEN NEW.expiry_date IS NOT date(NEW.expiry_date, '+0 days')
+BEGIN
+    SELECT RAISE(ABORT, 'expiry_date must be an ISO date (YYYY-MM-DD)');
+END;
+
+-- Serves the dashboard inventory's ORDER BY expiry_date without a sort
+-- ((status, expiry_date) from 002 serves the status-filtered expiry ranges)
+CREATE INDEX idx_food_items_expiry ON food_items(expiry_date);
@@ -0,0 +1,6 @@
+-- LOCATION REGISTRY
+-- One row per normalised (city, street_address). Duplicate rows, such as the 'Not specified'
+-- location that signup used to create for every new user, are merged first by
+-- compact_locations() in app.py, which also rewrites the users/food_items foreign keys.
+-- The expression index also serves city lookups: WHERE lower(trim(city)) = lower(trim(?))
+CREATE UNIQUE INDEX idx_locations_normalized ON locations(lower(trim(city)), lower(trim(street_address)));
@@ -0,0 +1,82 @@
+-- LOCATION COORDINATES + GRID INDEX
+-- Latitude/longitude for each location, plus a 0.1 degree grid cell (about 11 km) derived
+-- from them. Proximity search (find_nearby_locations() in app.py) first selects the cells
+-- that cover the search circle through idx_locations_grid, then computes exact distances
+-- for just those locations. GRID_CELLS_PER_DEGREE in app.py must match the factor of 10.
+ALTER TABLE locations ADD COLUMN latitude REAL CHECK (latitude IS NULL OR latitude BETWEEN -90 AND 90);
+ALTER TABLE locations ADD COLUMN longitude REAL CHECK (longitude IS NULL OR longitude BETWEEN -180 AND 180);
+ALTER TABLE locations ADD COLUMN grid_row INTEGER GENERATED ALWAYS AS (CAST((latitude + 90) * 10 AS INTEGER)) VIRTUAL;
+ALTER TABLE locations ADD COLUMN grid_col INTEGER GENERATED ALWAYS AS (CAST((longitude + 180) * 10 AS INTEGER)) VIRTUAL;
+
+CREATE INDEX idx_locations_grid ON locations(grid_row, grid_col);
+
+-- City centre coordinates used when a location is added without any (signup and the
+-- upload forms only collect a city name)
+CREATE TABLE city_coordinates (
+    city_key TEXT PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL
+);
+
+INSERT INTO city_coordinates (city_key, latitude, longitude) VALUES
+('cape town',        -33.9249, 18.4241),
+('johannesburg',     -26.2041, 28.0473),
+('durban',           -29.8587, 31.0218),
+('pretoria',         -25.7479, 28.2293),
+('stellenbosch',     -33.9321, 18.8602),
+('bloemfontein',     -29.0852, 26.1596),
+('gqeberha',         -33.9608, 25.6022),
+('port elizabeth',   -33.9608, 25.6022),
+('mbombela',         -25.4753, 30.9694),
+('nelspruit',        -25.4753, 30.9694),
+('polokwane',        -23.9045, 29.4689),
+('rustenburg',       -25.6676, 27.2421),
+('east london',      -33.0153, 27.9116),
+('pietermaritzburg', -29.6006, 30.3794),
+('kimberley',        -28.7282, 24.7499),
+('soweto',           -26.2485, 27.8540),
+('sandton',          -26.1076, 28.0567),
+('centurion',        -25.8603, 28.1894),
+('midrand',          -25.9992, 28.1263),
+('benoni',           -26.1885, 28.3208),
+('germiston',        -26.2179, 28.1672),
+('vereeniging',      -26.6731, 27.9261),
+('krugersdorp',      -26.0859, 27.7752),
+('welkom',           -27.9869, 26.7066),
+('george',           -33.9630, 22.4617),
+('paarl',            -33.7342, 18.9621),
+('worcester',        -33.6465, 19.4485),
+('mossel bay',       -34.1831, 22.1460),
+('knysna',           -34.0363, 23.0471),
+('upington',         -28.4478, 21.2561),
+('mahikeng',         -25.8652, 25.6442),
+('potchefstroom',    -26.7145, 27.0970),
+('klerksdorp',       -26.8521, 26.6667),
+('mthatha',          -31.5889, 28.7844),
+('makhanda',         -33.3042, 26.5328),
+('richards bay',     -28.7807, 32.0383),
+('newcastle',        -27.7580, 29.9318),
+('ladysmith',        -28.5597, 29.7810),
+('emalahleni',       -25.8713, 29.2332),
+('witbank',          -25.8713, 29.2332),
+('secunda',          -26.5161, 29.1890),
+('tzaneen',          -23.8332, 30.1635),
+('thohoyandou',      -22.9456, 30.4850);
+
+UPDATE locations
+SET latitude = (SELECT c.latitude FROM city_coordinates c WHERE c.city_key = lower(trim(locations.city))),
+    longitude = (SELECT c.longitude FROM city_coordinates c WHERE c.city_key = lower(trim(locations.city)))
+WHERE latitude IS NULL
+  AND EXISTS (SELECT 1 FROM city_coordinates c WHERE c.city_key = lower(trim(locations.city)));
+
+CREATE TRIGGER locations_default_coordinates
+AFTER INSERT ON locations
+FOR EACH ROW
+WHEN NEW.latitude IS NULL
+BEGIN
+    UPDATE locations
+    SET latitude = (SELECT c.latitude FROM city_coordinates c WHERE c.city_key = lower(trim(NEW.city))),
+        longitude = (SELECT c.longitude FROM city_coordinates c WHERE c.city_key = lower(trim(NEW.city)))
+    WHERE location_id = NEW.location_id
+      AND EXISTS (SELECT 1 FROM city_coordinates c WHERE c.city_key = lower(trim(NEW.city)));
+END;
@@ -0,0 +1,35 @@
+-- FULL-TEXT SEARCH
+-- External-content FTS5 index over food_items.food_name and description (the text is not
+-- stored twice), kept in sync by the triggers below. Queried by /api/food-items/search.
+CREATE VIRTUAL TABLE food_items_fts USING fts5(
+    food_name,
+    description,
+    content='food_items',
+    content_rowid='item_id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+
+INSERT INTO food_items_fts (food_items_fts) VALUES ('rebuild');
+
+CREATE TRIGGER food_items_fts_insert
+AFTER INSERT ON food_items
+BEGIN
+    INSERT INTO food_items_fts (rowid, food_name, description)
+    VALUES (NEW.item_id, NEW.food_name, NEW.description);
+END;
+
+CREATE TRIGGER food_items_fts_delete
+AFTER DELETE ON food_items
+BEGIN
+    INSERT INTO food_items_fts (food_items_fts, rowid, food_name, description)
+    VALUES ('delete', OLD.item_id, OLD.food_name, OLD.description);
+END;
+
+CREATE TRIGGER food_items_fts_update
+AFTER UPDATE OF food_name, description ON food_items
+BEGIN
+    INSERT INTO food_items_fts (food_items_fts, rowid, food_name, description)
+    VALUES ('delete', OLD.item_id, OLD.food_name, OLD.description);
+    INSERT INTO food_items_fts (rowid, food_name, description)
+    VALUES (NEW.item_id, NEW.food_name, NEW.description);
+END;
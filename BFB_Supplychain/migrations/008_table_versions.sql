@@ -0,0 +1,162 @@
+-- TABLE VERSIONS
+-- One change counter per table, bumped by the triggers below on every insert, update and
+-- delete, with the time of the last change. Read APIs and dashboards derive their ETag and
+-- Last-Modified headers from these rows (see conditional() in app.py), so a conditional GET
+-- costs one primary-key lookup instead of the page's queries.
+CREATE TABLE table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    modified_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+) WITHOUT ROWID;
+
+INSERT INTO table_versions (table_name) VALUES
+('users'),
+('user_roles'),
+('locations'),
+('food_items'),
+('requests'),
+('transactions');
+
+CREATE TRIGGER table_versions_users_insert
+AFTER INSERT ON users
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER table_versions_users_update
+AFTER UPDATE ON users
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER table_versions_users_delete
+AFTER DELETE ON users
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER table_versions_user_roles_insert
+AFTER INSERT ON user_roles
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'user_roles';
+END;
+
+CREATE TRIGGER table_versions_user_roles_update
+AFTER UPDATE ON user_roles
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'user_roles';
+END;
+
+CREATE TRIGGER table_versions_user_roles_delete
+AFTER DELETE ON user_roles
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'user_roles';
+END;
+
+CREATE TRIGGER table_versions_locations_insert
+AFTER INSERT ON locations
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'locations';
+END;
+
+CREATE TRIGGER table_versions_locations_update
+AFTER UPDATE ON locations
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'locations';
+END;
+
+CREATE TRIGGER table_versions_locations_delete
+AFTER DELETE ON locations
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'locations';
+END;
+
+CREATE TRIGGER table_versions_food_items_insert
+AFTER INSERT ON food_items
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'food_items';
+END;
+
+CREATE TRIGGER table_versions_food_items_update
+AFTER UPDATE ON food_items
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'food_items';
+END;
+
+CREATE TRIGGER table_versions_food_items_delete
+AFTER DELETE ON food_items
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'food_items';
+END;
+
+CREATE TRIGGER table_versions_requests_insert
+AFTER INSERT ON requests
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'requests';
+END;
+
+CREATE TRIGGER table_versions_requests_update
+AFTER UPDATE ON requests
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'requests';
+END;
+
+CREATE TRIGGER table_versions_requests_delete
+AFTER DELETE ON requests
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'requests';
+END;
+
+CREATE TRIGGER table_versions_transactions_insert
+AFTER INSERT ON transactions
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'transactions';
+END;
+
+CREATE TRIGGER table_versions_transactions_update
+AFTER UPDATE ON transactions
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'transactions';
+END;
+
+CREATE TRIGGER table_versions_transactions_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1, modified_at = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE table_name = 'transactions';
+END;
@@ -0,0 +1,105 @@
+-- CHANGE LOG
+-- Append-only log of every insert, update and delete on food_items, requests and
+-- transactions, written by the triggers below in the same transaction as the change.
+-- seq only ever increases, so a client that has applied everything up to seq N asks
+-- /api/changes?since=N for the rest. Existing rows are logged once as inserts, so
+-- since=0 is a full sync. compact_change_log() in app.py prunes superseded entries
+-- and old deletes.
+--
+-- The change log also feeds /api/stream/events (see events.py).
+CREATE TABLE change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL CHECK (table_name IN ('food_items', 'requests', 'transactions')),
+    row_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    operation TEXT NOT NULL CHECK (operation IN ('insert', 'update', 'delete')),
+    status TEXT,
+    previous_status TEXT,
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_change_log_row ON change_log(table_name, row_id, seq);
+
+-- Compaction bookkeeping: deletes at or below pruned_deletes_through are gone, so a client
+-- whose since is lower has to sync from scratch
+CREATE TABLE change_log_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO change_log_state (name, value) VALUES ('pruned_deletes_through', 0);
+
+INSERT INTO change_log (table_name, row_id, item_id, operation, status, changed_at)
+SELECT 'food_items', item_id, item_id, 'insert', status, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM food_items ORDER BY item_id;
+
+INSERT INTO change_log (table_name, row_id, item_id, operation, status, changed_at)
+SELECT 'requests', request_id, item_id, 'insert', status, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM requests ORDER BY request_id;
+
+INSERT INTO change_log (table_name, row_id, item_id, operation, status, changed_at)
+SELECT 'transactions', transaction_id, item_id, 'insert', status, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM transactions ORDER BY transaction_id;
+
+CREATE TRIGGER change_log_food_items_insert
+AFTER INSERT ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('food_items', NEW.item_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_food_items_update
+AFTER UPDATE ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('food_items', NEW.item_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_food_items_delete
+AFTER DELETE ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('food_items', OLD.item_id, OLD.item_id, 'delete', OLD.status);
+END;
+
+CREATE TRIGGER change_log_requests_insert
+AFTER INSERT ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('requests', NEW.request_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_requests_update
+AFTER UPDATE ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('requests', NEW.request_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_requests_delete
+AFTER DELETE ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('requests', OLD.request_id, OLD.item_id, 'delete', OLD.status);
+END;
+
+CREATE TRIGGER change_log_transactions_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('transactions', NEW.transaction_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_transactions_update
+AFTER UPDATE ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('transactions', NEW.transaction_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_transactions_delete
+AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('transactions', OLD.transaction_id, OLD.item_id, 'delete', OLD.status);
+END;
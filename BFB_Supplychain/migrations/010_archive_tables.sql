@@ -0,0 +1,147 @@
+-- ARCHIVE TABLES
+-- Settled food items (Completed, or expired for a while) are moved out of the hot tables
+-- together with their requests and transaction by the sweeper in archive.py, in bounded
+-- batches. The hot tables then only hold what is still in play, so the dashboards, lists
+-- and matching scan less. Archived rows keep their ids and gain archived_at; AUTOINCREMENT
+-- keeps ids from being reused, so ids stay unique across hot and archive tables.
+--
+-- The *_history views are the union of both for historical reporting.
+CREATE TABLE food_items_archive (
+    item_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    food_type TEXT NOT NULL,
+    food_name TEXT NOT NULL,
+    quantity_available NUMERIC(10,2) NOT NULL,
+    expiry_date DATE NOT NULL,
+    delivery_option TEXT NOT NULL,
+    location_id INTEGER NOT NULL,
+    description TEXT,
+    created_at DATETIME,
+    status TEXT NOT NULL,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE requests_archive (
+    request_id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    recipient_id INTEGER NOT NULL,
+    quantity_needed NUMERIC(10,2) NOT NULL,
+    urgency_level TEXT,
+    status TEXT NOT NULL,
+    created_at DATETIME,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE transactions_archive (
+    transaction_id INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    supplier_id INTEGER NOT NULL,
+    recipient_id INTEGER NOT NULL,
+    quantity NUMERIC(10,2) NOT NULL,
+    status TEXT NOT NULL,
+    created_at DATETIME,
+    archived_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_food_items_archive_user_id ON food_items_archive(user_id);
+CREATE INDEX idx_food_items_archive_created ON food_items_archive(created_at, item_id);
+CREATE INDEX idx_requests_archive_item_id ON requests_archive(item_id);
+CREATE INDEX idx_requests_archive_recipient_id ON requests_archive(recipient_id);
+CREATE INDEX idx_requests_archive_created ON requests_archive(created_at, request_id);
+CREATE INDEX idx_transactions_archive_item_id ON transactions_archive(item_id);
+
+CREATE VIEW food_items_history AS
+SELECT item_id, user_id, food_type, food_name, quantity_available, expiry_date, delivery_option,
+       location_id, description, created_at, status, NULL AS archived_at
+FROM food_items
+UNION ALL
+SELECT item_id, user_id, food_type, food_name, quantity_available, expiry_date, delivery_option,
+       location_id, description, created_at, status, archived_at
+FROM food_items_archive;
+
+CREATE VIEW requests_history AS
+SELECT request_id, item_id, recipient_id, quantity_needed, urgency_level, status, created_at,
+       NULL AS archived_at
+FROM requests
+UNION ALL
+SELECT request_id, item_id, recipient_id, quantity_needed, urgency_level, status, created_at,
+       archived_at
+FROM requests_archive;
+
+CREATE VIEW transactions_history AS
+SELECT transaction_id, item_id, supplier_id, recipient_id, quantity, status, created_at,
+       NULL AS archived_at
+FROM transactions
+UNION ALL
+SELECT transaction_id, item_id, supplier_id, recipient_id, quantity, status, created_at,
+       archived_at
+FROM transactions_archive;
+
+-- 'sweeping' is 1 only inside a sweep's write transaction (no other connection ever sees it).
+-- The KPI delete triggers skip archived rows, so the counters keep counting history and
+-- rebuild_kpi_counters() counts the *_history views.
+CREATE TABLE archive_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+
+INSERT INTO archive_state (name, value) VALUES ('sweeping', 0);
+
+DROP TRIGGER kpi_food_items_delete;
+DROP TRIGGER kpi_requests_delete;
+DROP TRIGGER kpi_transactions_delete;
+
+CREATE TRIGGER kpi_food_items_delete
+AFTER DELETE ON food_items
+FOR EACH ROW
+WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 0
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_items';
+    UPDATE kpi_supplier_counters SET total_items = total_items - 1 WHERE user_id = OLD.user_id;
+    UPDATE kpi_expiry_buckets
+    SET items = items - 1, open_items = open_items - (OLD.status != 'Completed')
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date);
+    DELETE FROM kpi_expiry_buckets
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date) AND items = 0;
+END;
+
+CREATE TRIGGER kpi_requests_delete
+AFTER DELETE ON requests
+FOR EACH ROW
+WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 0
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'requests';
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'active_requests' AND OLD.status = 'Pending';
+    UPDATE kpi_recipient_counters SET requests = requests - 1 WHERE user_id = OLD.recipient_id;
+END;
+
+CREATE TRIGGER kpi_transactions_delete
+AFTER DELETE ON transactions
+FOR EACH ROW
+WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 0
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'transactions';
+    UPDATE kpi_counters SET value = value - OLD.quantity WHERE name = 'kg_donated';
+    UPDATE kpi_daily_counters SET value = value - 1 WHERE day = date(OLD.created_at) AND name = 'donated';
+
+    UPDATE kpi_supplier_counters SET donated = donated - 1, kg_donated = kg_donated - OLD.quantity
+    WHERE user_id = OLD.supplier_id;
+    UPDATE kpi_counters SET value = value - 1
+    WHERE name = 'suppliers_count'
+      AND (SELECT donated FROM kpi_supplier_counters WHERE user_id = OLD.supplier_id) = 0;
+
+    UPDATE kpi_recipient_counters SET received = received - 1, kg_received = kg_received - OLD.quantity
+    WHERE user_id = OLD.recipient_id;
+    UPDATE kpi_counters SET value = value - 1
+    WHERE name = 'recipients_helped'
+      AND (SELECT received FROM kpi_recipient_counters WHERE user_id = OLD.recipient_id) = 0;
+
+    UPDATE kpi_transaction_pairs SET transactions = transactions - 1
+    WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id;
+    UPDATE kpi_recipient_counters SET suppliers = suppliers - 1
+    WHERE user_id = OLD.recipient_id
+      AND (SELECT transactions FROM kpi_transaction_pairs
+           WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id) = 0;
+    DELETE FROM kpi_transaction_pairs
+    WHERE supplier_id = OLD.supplier_id AND recipient_id = OLD.recipient_id AND transactions = 0;
+END;
@@ -0,0 +1,5 @@
+-- INVENTORY SORT INDEXES
+-- Lets the paginated supplier dashboard inventory read a page in name order straight from
+-- an index (the rowid, item_id, is the tie-breaker). Expiry date, created_at and status
+-- order already use idx_food_items_expiry, idx_food_items_created and idx_food_items_status.
+CREATE INDEX idx_food_items_name ON food_items(food_name);
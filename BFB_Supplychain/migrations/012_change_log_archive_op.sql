@@ -0,0 +1,111 @@
+-- ARCHIVE OPERATION IN THE CHANGE LOG
+-- Rows the archive sweeper (archive.py) moves to the archive tables used to reach
+-- change_log, and /api/changes, as plain deletes, so a mirror could not tell an archived
+-- item from a withdrawn one. They are now logged with operation 'archive' (archive_state
+-- 'sweeping' is set inside every sweep batch). SQLite cannot change a CHECK constraint in
+-- place, so change_log is rebuilt with its rows, seq counter, index and triggers.
+DROP TRIGGER change_log_food_items_insert;
+DROP TRIGGER change_log_food_items_update;
+DROP TRIGGER change_log_food_items_delete;
+DROP TRIGGER change_log_requests_insert;
+DROP TRIGGER change_log_requests_update;
+DROP TRIGGER change_log_requests_delete;
+DROP TRIGGER change_log_transactions_insert;
+DROP TRIGGER change_log_transactions_update;
+DROP TRIGGER change_log_transactions_delete;
+
+CREATE TABLE change_log_new (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL CHECK (table_name IN ('food_items', 'requests', 'transactions')),
+    row_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    operation TEXT NOT NULL CHECK (operation IN ('insert', 'update', 'delete', 'archive')),
+    status TEXT,
+    previous_status TEXT,
+    changed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO change_log_new (seq, table_name, row_id, item_id, operation, status, previous_status, changed_at)
+SELECT seq, table_name, row_id, item_id, operation, status, previous_status, changed_at
+FROM change_log ORDER BY seq;
+
+-- Compacted entries may have held the highest seqs; seq must never be reused
+UPDATE sqlite_sequence
+SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('change_log', 'change_log_new'))
+WHERE name = 'change_log_new';
+INSERT INTO sqlite_sequence (name, seq)
+SELECT 'change_log_new', seq FROM sqlite_sequence
+WHERE name = 'change_log' AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'change_log_new');
+
+DROP TABLE change_log;
+ALTER TABLE change_log_new RENAME TO change_log;
+CREATE INDEX idx_change_log_row ON change_log(table_name, row_id, seq);
+
+CREATE TRIGGER change_log_food_items_insert
+AFTER INSERT ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('food_items', NEW.item_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_food_items_update
+AFTER UPDATE ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('food_items', NEW.item_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_food_items_delete
+AFTER DELETE ON food_items
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('food_items', OLD.item_id, OLD.item_id,
+            CASE WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 1 THEN 'archive' ELSE 'delete' END,
+            OLD.status);
+END;
+
+CREATE TRIGGER change_log_requests_insert
+AFTER INSERT ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('requests', NEW.request_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_requests_update
+AFTER UPDATE ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('requests', NEW.request_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_requests_delete
+AFTER DELETE ON requests
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('requests', OLD.request_id, OLD.item_id,
+            CASE WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 1 THEN 'archive' ELSE 'delete' END,
+            OLD.status);
+END;
+
+CREATE TRIGGER change_log_transactions_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status)
+    VALUES ('transactions', NEW.transaction_id, NEW.item_id, 'insert', NEW.status);
+END;
+
+CREATE TRIGGER change_log_transactions_update
+AFTER UPDATE ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, status, previous_status)
+    VALUES ('transactions', NEW.transaction_id, NEW.item_id, 'update', NEW.status, OLD.status);
+END;
+
+CREATE TRIGGER change_log_transactions_delete
+AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO change_log (table_name, row_id, item_id, operation, previous_status)
+    VALUES ('transactions', OLD.transaction_id, OLD.item_id,
+            CASE WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 1 THEN 'archive' ELSE 'delete' END,
+            OLD.status);
+END;
@@ -0,0 +1,108 @@
+-- FOOD ITEM LOTS
+-- A partial claim (claim_food_item() in app.py) splits the claimed kilograms off into their
+-- own food_items row, a lot, because transactions allow one row per item. parent_item_id
+-- marks a lot with the item it was claimed from. A lot is part of its parent's donation, so
+-- the KPI item counts and expiry buckets and the search index skip it, and the supplier
+-- inventory and the live event stream show only the parent. /api/changes still carries
+-- lots, with parent_item_id, since their transactions refer to them.
+ALTER TABLE food_items ADD COLUMN parent_item_id INTEGER;
+ALTER TABLE food_items_archive ADD COLUMN parent_item_id INTEGER;
+CREATE INDEX idx_food_items_parent ON food_items(parent_item_id) WHERE parent_item_id IS NOT NULL;
+
+DROP VIEW food_items_history;
+CREATE VIEW food_items_history AS
+SELECT item_id, user_id, food_type, food_name, quantity_available, expiry_date, delivery_option,
+       location_id, description, created_at, status, parent_item_id, NULL AS archived_at
+FROM food_items
+UNION ALL
+SELECT item_id, user_id, food_type, food_name, quantity_available, expiry_date, delivery_option,
+       location_id, description, created_at, status, parent_item_id, archived_at
+FROM food_items_archive;
+
+-- KPI TRIGGERS
+DROP TRIGGER kpi_food_items_insert;
+DROP TRIGGER kpi_food_items_update;
+DROP TRIGGER kpi_food_items_delete;
+
+CREATE TRIGGER kpi_food_items_insert
+AFTER INSERT ON food_items
+FOR EACH ROW
+WHEN NEW.parent_item_id IS NULL
+BEGIN
+    UPDATE kpi_counters SET value = value + 1 WHERE name = 'total_items';
+    INSERT INTO kpi_supplier_counters (user_id, total_items) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET total_items = total_items + 1;
+    INSERT INTO kpi_expiry_buckets (user_id, expiry_day, items, open_items) VALUES
+        (NEW.user_id, COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed'),
+        (0,           COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed')
+    ON CONFLICT(user_id, expiry_day) DO UPDATE SET
+        items = items + 1,
+        open_items = open_items + excluded.open_items;
+END;
+
+CREATE TRIGGER kpi_food_items_delete
+AFTER DELETE ON food_items
+FOR EACH ROW
+WHEN (SELECT value FROM archive_state WHERE name = 'sweeping') = 0 AND OLD.parent_item_id IS NULL
+BEGIN
+    UPDATE kpi_counters SET value = value - 1 WHERE name = 'total_items';
+    UPDATE kpi_supplier_counters SET total_items = total_items - 1 WHERE user_id = OLD.user_id;
+    UPDATE kpi_expiry_buckets
+    SET items = items - 1, open_items = open_items - (OLD.status != 'Completed')
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date);
+    DELETE FROM kpi_expiry_buckets
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date) AND items = 0;
+END;
+
+CREATE TRIGGER kpi_food_items_update
+AFTER UPDATE OF user_id, expiry_date, status ON food_items
+FOR EACH ROW
+WHEN NEW.parent_item_id IS NULL
+BEGIN
+    UPDATE kpi_supplier_counters SET total_items = total_items - 1 WHERE user_id = OLD.user_id;
+    INSERT INTO kpi_supplier_counters (user_id, total_items) VALUES (NEW.user_id, 1)
+    ON CONFLICT(user_id) DO UPDATE SET total_items = total_items + 1;
+    UPDATE kpi_expiry_buckets
+    SET items = items - 1, open_items = open_items - (OLD.status != 'Completed')
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date);
+    INSERT INTO kpi_expiry_buckets (user_id, expiry_day, items, open_items) VALUES
+        (NEW.user_id, COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed'),
+        (0,           COALESCE(date(NEW.expiry_date), NEW.expiry_date), 1, NEW.status != 'Completed')
+    ON CONFLICT(user_id, expiry_day) DO UPDATE SET
+        items = items + 1,
+        open_items = open_items + excluded.open_items;
+    DELETE FROM kpi_expiry_buckets
+    WHERE user_id IN (OLD.user_id, 0) AND expiry_day = COALESCE(date(OLD.expiry_date), OLD.expiry_date) AND items = 0;
+END;
+
+-- SEARCH INDEX TRIGGERS (a lot is never indexed, so it must never be deleted from the index either)
+DROP TRIGGER food_items_fts_insert;
+DROP TRIGGER food_items_fts_delete;
+DROP TRIGGER food_items_fts_update;
+
+CREATE TRIGGER food_items_fts_insert
+AFTER INSERT ON food_items
+WHEN NEW.parent_item_id IS NULL
+BEGIN
+    INSERT INTO food_items_fts (rowid, food_name, description)
+    VALUES (NEW.item_id, NEW.food_name, NEW.description);
+END;
+
+CREATE TRIGGER food_items_fts_delete
+AFTER DELETE ON food_items
+WHEN OLD.parent_item_id IS NULL
+BEGIN
+    INSERT INTO food_items_fts (food_items_fts, rowid, food_name, description)
+    VALUES ('delete', OLD.item_id, OLD.food_name, OLD.description);
+END;
+
+CREATE TRIGGER food_items_fts_update
+AFTER UPDATE OF food_name, description ON food_items
+WHEN NEW.parent_item_id IS NULL
+BEGIN
+    INSERT INTO food_items_fts (food_items_fts, rowid, food_name, description)
+    VALUES ('delete', OLD.item_id, OLD.food_name, OLD.description);
+    INSERT INTO food_items_fts (rowid, food_name, description)
+    VALUES (NEW.item_id, NEW.food_name, NEW.description);
+END;
+
@@ -0,0 +1,135 @@
+"""
+Data-access layer for FoodConnect: repositories for users, locations, food_items, requests
+and transactions.
+
+SQLiteBackend runs them on the app's pooled SQLite connections and write path (including
+the group-commit queue). Repository methods take the connection handed to backend.read() /
+backend.write() work, so several calls share one transaction. The account, food item create
+and request update routes use them; the other routes still query SQLite directly.
+"""
+UNSPECIFIED = 'Not specified'
+
+class Repository:
+    """Base for the repositories"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def execute(self, conn, statement, params=()):
+        return conn.execute(statement, params)
+
+class UserRepository(Repository):
+
+    def email_exists(self, conn, email):
+        return self.execute(conn, 'SELECT 1 FROM users WHERE email = ?', (email,)).fetchone() is not None
+
+    def find_with_roles(self, conn, email, password):
+        """Get the user with these credentials and their comma-separated roles in one query (None if no match)"""
+        return self.execute(conn, '''
+            SELECT u.user_id, u.user_fullname, group_concat(r.role) AS roles
+            FROM users u
+            LEFT JOIN user_roles r ON r.user_id = u.user_id
+            WHERE u.email = ? AND u.password = ?
+            GROUP BY u.user_id
+        ''', (email, password)).fetchone()
+
+    def create(self, conn, user_fullname, contact_number, email, password, location_id, occupation=''):
+        """Insert a user and get their user_id"""
+        return self.execute(conn, '''
+            INSERT INTO users (user_fullname, occupation, location_id, contact_number, email, password)
+            VALUES (?, ?, ?, ?, ?, ?)
+            RETURNING user_id
+        ''', (user_fullname, occupation, location_id, contact_number, email, password)).fetchone()[0]
+
+    def add_role(self, conn, user_id, role):
+        self.execute(conn, 'INSERT INTO user_roles (user_id, role) VALUES (?, ?)', (user_id, role))
+
+class LocationRepository(Repository):
+
+    def resolve(self, conn, city):
+        """Get the location_id for a city, registering the city if it is new"""
+        if self.backend.location_registry is not None:
+            return self.backend.location_registry.resolve(conn, city)
+        self.execute(conn, '''
+            INSERT INTO locations (province, city, zip_code, street_address)
+            VALUES (?, ?, '0000', ?)
+            ON CONFLICT (lower(trim(city)), lower(trim(street_address))) DO NOTHING
+        ''', (UNSPECIFIED, city.strip(' '), UNSPECIFIED))
+        return self.execute(conn, 'SELECT MIN(location_id) FROM locations WHERE lower(trim(city)) = lower(trim(?))',
+                            (city,)).fetchone()[0]
+
+class FoodItemRepository(Repository):
+
+    def get(self, conn, item_id):
+        return self.execute(conn, 'SELECT * FROM food_items WHERE item_id = ?', (item_id,)).fetchone()
+
+    def create(self, conn, user_id, food_type, food_name, quantity_available, expiry_date, delivery_option,
+               location_id, description=''):
+        """Insert an available food item and get its item_id"""
+        return self.execute(conn, '''
+            INSERT INTO food_items (user_id, food_type, food_name, quantity_available,
+                                   expiry_date, delivery_option, location_id, description, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Unselected')
+            RETURNING item_id
+        ''', (user_id, food_type, food_name, quantity_available, expiry_date, delivery_option, location_id,
+              description)).fetchone()[0]
+
+class RequestRepository(Repository):
+
+    def create(self, conn, item_id, recipient_id, quantity_needed, urgency_level='Medium'):
+        """Insert a Pending request and get it back"""
+        return self.execute(conn, '''
+            INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, status)
+            VALUES (?, ?, ?, ?, 'Pending')
+            RETURNING *
+        ''', (item_id, recipient_id, quantity_needed, urgency_level)).fetchone()
+
+    def get_with_parties(self, conn, request_id):
+        """Get a request's recipient, its item's supplier and the names shown with it"""
+        return self.execute(conn, '''
+            SELECT r.recipient_id, f.user_id AS supplier_id, f.food_name, u.user_fullname
+            FROM requests r
+            JOIN food_items f ON r.item_id = f.item_id
+            JOIN users u ON r.recipient_id = u.user_id
+            WHERE r.request_id = ?
+        ''', (request_id,)).fetchone()
+
+    def update_status(self, conn, request_id, status):
+        """Set a request's status (sync_food_item_status updates its item) and get the updated row"""
+        return self.execute(conn, 'UPDATE requests SET status = ? WHERE request_id = ? RETURNING *',
+                            (status, request_id)).fetchone()
+
+class TransactionRepository(Repository):
+
+    def create(self, conn, item_id, supplier_id, recipient_id, quantity):
+        """Insert an In-Progress transaction (checked by the validate_transaction triggers) and get it back"""
+        return self.execute(conn, '''
+            INSERT INTO transactions (item_id, supplier_id, recipient_id, quantity, status)
+            VALUES (?, ?, ?, ?, 'In-Progress')
+            RETURNING *
+        ''', (item_id, supplier_id, recipient_id, quantity)).fetchone()
+
+    def for_item(self, conn, item_id):
+        return self.execute(conn, 'SELECT * FROM transactions WHERE item_id = ?', (item_id,)).fetchone()
+
+class SQLiteBackend:
+    """The app's SQLite database: connection() is app.get_db_connection and write is
+    app.perform_write, so writes keep the busy retry and the write queue"""
+
+    def __init__(self, connection, write, location_registry=None):
+        self._connection = connection
+        self._write = write
+        self.location_registry = location_registry
+        self.users = UserRepository(self)
+        self.locations = LocationRepository(self)
+        self.food_items = FoodItemRepository(self)
+        self.requests = RequestRepository(self)
+        self.transactions = TransactionRepository(self)
+
+    def read(self, work):
+        """Run work(conn) on a connection and return its result"""
+        return work(self._connection())
+
+    def write(self, work):
+        """Run work(conn) in one write transaction, committed when this returns"""
+        return self._write(work)
@@ -0,0 +1,240 @@
+"""
+Synthetic FoodConnect data at configurable scales, for benchmarks and load tests.
+
+seed_database() adds users, locations, food items, requests and transactions to an existing
+database (foodconnect.sql plus migrations) through plain INSERTs, so every CHECK constraint
+and trigger runs as it would for real data: KPI counters, table_versions, change_log and the
+search index stay consistent. The same seed always produces the same rows.
+
+Used by `flask --app app seed-db` and benchmark.py.
+"""
+import random
+import time
+from datetime import date, datetime, timedelta
+
+#Row counts per named scale; transactions are the items that found a recipient
+SCALES = {
+    'small': {'users': 500, 'locations': 250, 'food_items': 5000, 'requests': 20000, 'transactions': 1000},
+    'medium': {'users': 5000, 'locations': 2000, 'food_items': 50000, 'requests': 200000, 'transactions': 10000},
+    'large': {'users': 20000, 'locations': 10000, 'food_items': 100000, 'requests': 1000000, 'transactions': 25000},
+}
+
+#(city, province, weight); coordinates come from city_coordinates (migrations/006_location_coordinates.sql)
+CITIES = (
+    ('Johannesburg', 'Gauteng', 12), ('Cape Town', 'Western Cape', 10), ('Durban', 'KwaZulu-Natal', 8),
+    ('Pretoria', 'Gauteng', 7), ('Soweto', 'Gauteng', 4), ('Gqeberha', 'Eastern Cape', 4),
+    ('Bloemfontein', 'Free State', 3), ('Sandton', 'Gauteng', 3), ('Centurion', 'Gauteng', 2),
+    ('East London', 'Eastern Cape', 2), ('Pietermaritzburg', 'KwaZulu-Natal', 2), ('Polokwane', 'Limpopo', 2),
+    ('Mbombela', 'Mpumalanga', 2), ('Kimberley', 'Northern Cape', 1), ('Rustenburg', 'North West', 1),
+    ('Stellenbosch', 'Western Cape', 1), ('George', 'Western Cape', 1), ('Paarl', 'Western Cape', 1),
+    ('Richards Bay', 'KwaZulu-Natal', 1), ('Potchefstroom', 'North West', 1),
+)
+STREET_NAMES = ('Main', 'Church', 'Station', 'Market', 'Voortrekker', 'Nelson Mandela', 'Long', 'Oak',
+                'Jacaranda', 'Protea', 'Harbour', 'Mill', 'Park', 'Hill', 'Beach')
+STREET_SUFFIXES = ('Street', 'Road', 'Avenue', 'Drive', 'Lane')
+FIRST_NAMES = ('Thabo', 'Lerato', 'Sipho', 'Naledi', 'Pieter', 'Anika', 'Ayesha', 'Johan', 'Zanele', 'David',
+               'Fatima', 'Kagiso', 'Megan', 'Lindiwe', 'Ruan', 'Priya', 'Bongani', 'Chloe', 'Musa', 'Emma')
+LAST_NAMES = ('Nkosi', 'Dlamini', 'van der Merwe', 'Botha', 'Naidoo', 'Mokoena', 'Pillay', 'Smith',
+              'Khumalo', 'Pretorius', 'Ndlovu', 'Adams', 'Jacobs', 'Mahlangu', 'Fourie')
+SUPPLIER_OCCUPATIONS = ('Restaurant', 'Grocery Store', 'Farm', 'Bakery', 'Manufacturer', 'Other')
+FOOD_NAMES = {
+    'Vegetables': ('Carrots', 'Potatoes', 'Cabbage', 'Spinach', 'Butternut', 'Onions', 'Tomatoes'),
+    'Fruits': ('Apples', 'Bananas', 'Oranges', 'Pears', 'Grapes', 'Mangoes', 'Naartjies'),
+    'Dairy': ('Milk', 'Yoghurt', 'Cheddar Cheese', 'Maas', 'Butter'),
+    'Bakery': ('Bread Loaves', 'Bread Rolls', 'Muffins', 'Vetkoek', 'Rusks'),
+    'Meat': ('Chicken Pieces', 'Beef Mince', 'Boerewors', 'Pork Chops'),
+    'Grains': ('Maize Meal', 'Rice', 'Samp', 'Oats', 'Pasta'),
+    'Beverages': ('Fruit Juice', 'Bottled Water', 'Rooibos Tea', 'Mageu'),
+    'Other': ('Canned Beans', 'Peanut Butter', 'Soup Packets', 'Cooking Oil'),
+}
+FOOD_TYPE_WEIGHTS = {'Vegetables': 6, 'Fruits': 5, 'Dairy': 3, 'Bakery': 5, 'Meat': 2, 'Grains': 3,
+                     'Beverages': 2, 'Other': 2}
+DESCRIPTIONS = ('Fresh {name}, surplus from this week', '{name} close to the best-before date',
+                'Good condition {name}, packed in crates', 'Unsold {name}, collect in the morning', '')
+URGENCY_WEIGHTS = {'Low': 3, 'Medium': 5, 'High': 2}
+
+#Every seeded user can log in with this password
+SEED_PASSWORD = 'password123'
+SEED_EMAIL_DOMAIN = 'seed.foodconnect.test'
+BATCH_SIZE = 5000
+
+def next_id(conn, table, key):
+    return conn.execute(f'SELECT COALESCE(MAX({key}), 0) + 1 FROM {table}').fetchone()[0]
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+def insert_batches(conn, query, rows):
+    """executemany in BATCH_SIZE chunks, so generated rows are never all held in memory"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            conn.executemany(query, batch)
+            batch = []
+    if batch:
+        conn.executemany(query, batch)
+
+def skewed_weights(rng, count):
+    """Weights for count rows where a few rows are picked far more often than most (1/rank)"""
+    weights = [1 / rank for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return weights
+
+def seed_database(conn, users, locations, food_items, requests, transactions, seed=0, today=None):
+    """Insert synthetic rows in one transaction and return the count added per table"""
+    if min(users, locations, food_items, requests, transactions) < 0:
+        raise ValueError('Row counts cannot be negative')
+    if transactions > food_items or transactions > requests:
+        raise ValueError('Each transaction needs its own food item and request')
+    if (food_items or requests) and users < 2:
+        raise ValueError('At least two users are needed for a supplier and a recipient')
+    if users and not locations:
+        raise ValueError('Users need at least one location')
+
+    rng = random.Random(seed)
+    today = today or date.today()
+    now = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+    started = time.perf_counter()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        #LOCATIONS: spread up to ~15 km around the city centre; numbered streets keep them unique
+        coordinates = {row[0]: (row[1], row[2]) for row in
+                       conn.execute('SELECT city_key, latitude, longitude FROM city_coordinates')}
+        cities = [city for city in CITIES if city[0].lower() in coordinates]
+        first_location = next_id(conn, 'locations', 'location_id')
+        location_rows = []
+        for offset in range(locations):
+            city, province, _ = rng.choices(cities, weights=[c[2] for c in cities])[0]
+            lat, lon = coordinates[city.lower()]
+            location_rows.append((
+                first_location + offset, province, city, f'{rng.randint(1000, 9999)}',
+                f'{first_location + offset} {rng.choice(STREET_NAMES)} {rng.choice(STREET_SUFFIXES)}',
+                round(lat + rng.uniform(-0.12, 0.12), 6), round(lon + rng.uniform(-0.12, 0.12), 6),
+            ))
+        conn.executemany('''
+            INSERT INTO locations (location_id, province, city, zip_code, street_address, latitude, longitude)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', location_rows)
+        location_ids = [row[0] for row in location_rows]
+
+        #USERS: 40% suppliers, 55% recipients, 5% both
+        first_user = next_id(conn, 'users', 'user_id')
+        user_rows, role_rows, supplier_ids, recipient_ids, user_locations = [], [], [], [], {}
+        for offset in range(users):
+            user_id = first_user + offset
+            kind = rng.random()
+            is_supplier, is_recipient = kind < 0.45, kind >= 0.40
+            #Make sure small scales still get at least one of each
+            if offset == 0:
+                is_supplier, is_recipient = True, False
+            elif offset == 1:
+                is_supplier, is_recipient = False, True
+            location_id = rng.choice(location_ids)
+            user_locations[user_id] = location_id
+            user_rows.append((
+                user_id, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                rng.choice(SUPPLIER_OCCUPATIONS) if is_supplier else '', location_id,
+                f'0{rng.randint(600000000, 849999999)}', f'user{user_id}@{SEED_EMAIL_DOMAIN}', SEED_PASSWORD,
+                timestamp(now - timedelta(days=rng.randint(180, 720), seconds=rng.randint(0, 86399))),
+            ))
+            if is_supplier:
+                role_rows.append((user_id, 'Supplier'))
+                supplier_ids.append(user_id)
+            if is_recipient:
+                role_rows.append((user_id, 'Recipient'))
+                recipient_ids.append(user_id)
+        conn.executemany('''
+            INSERT INTO users (user_id, user_fullname, occupation, location_id, contact_number, email, password, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', user_rows)
+        conn.executemany('INSERT INTO user_roles (user_id, role) VALUES (?, ?)', role_rows)
+
+        #FOOD ITEMS: a few large suppliers post most of the surplus; expiry is 1-45 days after
+        #posting, so items posted more than a few weeks ago have expired
+        supplier_weights = skewed_weights(rng, len(supplier_ids))
+        recipient_weights = skewed_weights(rng, len(recipient_ids))
+        food_types = list(FOOD_TYPE_WEIGHTS)
+        first_item = next_id(conn, 'food_items', 'item_id')
+        item_supplier, item_quantity, item_created = [], [], []
+        for _ in range(food_items):
+            item_supplier.append(rng.choices(supplier_ids, weights=supplier_weights)[0])
+            item_quantity.append(rng.randint(1, 200))
+            item_created.append(now - timedelta(days=rng.randint(0, 180), seconds=rng.randint(0, 86399)))
+
+        #TRANSACTIONS: some items went to one recipient (60% of those are completed)
+        transaction_items = rng.sample(range(food_items), transactions)
+        completed = set(rng.sample(transaction_items, int(transactions * 0.6)))
+        item_status = ['Unselected'] * food_items
+        for index in transaction_items:
+            item_status[index] = 'Completed' if index in completed else 'Pending'
+
+        def item_rows():
+            for index in range(food_items):
+                food_type = rng.choices(food_types, weights=list(FOOD_TYPE_WEIGHTS.values()))[0]
+                name = rng.choice(FOOD_NAMES[food_type])
+                user_id = item_supplier[index]
+                created = item_created[index]
+                yield (
+                    first_item + index, user_id, food_type, name, item_quantity[index],
+                    (created + timedelta(days=rng.randint(1, 45))).date().isoformat(),
+                    rng.choice(('Pickup', 'Delivery')),
+                    user_locations[user_id] if rng.random() < 0.8 else rng.choice(location_ids),
+                    rng.choice(DESCRIPTIONS).format(name=name.lower()) or None,
+                    timestamp(created), item_status[index],
+                )
+        insert_batches(conn, '''
+            INSERT INTO food_items (item_id, user_id, food_type, food_name, quantity_available, expiry_date,
+                                    delivery_option, location_id, description, created_at, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', item_rows())
+
+        #REQUESTS: the request each transaction fulfils is 'Selected' (validate_transaction checks
+        #for it), the rest are spread over all items, mostly still pending
+        first_request = next_id(conn, 'requests', 'request_id')
+        urgencies = list(URGENCY_WEIGHTS)
+        urgency_weights = list(URGENCY_WEIGHTS.values())
+        winners = []
+
+        def pick_recipient(index):
+            while True:
+                recipient_id = rng.choices(recipient_ids, weights=recipient_weights)[0]
+                if recipient_id != item_supplier[index] or len(recipient_ids) == 1:
+                    return recipient_id
+
+        def request_row(request_id, index, status):
+            created = min(item_created[index] + timedelta(minutes=rng.randint(5, 60 * 24 * 7)), now)
+            return (request_id, first_item + index, pick_recipient(index), rng.randint(1, item_quantity[index]),
+                    rng.choices(urgencies, weights=urgency_weights)[0], status, timestamp(created))
+
+        def request_rows():
+            for offset, index in enumerate(transaction_items):
+                row = request_row(first_request + offset, index, 'Selected')
+                winners.append(row)
+                yield row
+            for offset in range(transactions, requests):
+                index = rng.randrange(food_items)
+                status = 'Cancelled' if rng.random() < (0.5 if item_status[index] != 'Unselected' else 0.1) else 'Pending'
+                yield request_row(first_request + offset, index, status)
+        insert_batches(conn, '''
+            INSERT INTO requests (request_id, item_id, recipient_id, quantity_needed, urgency_level, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', request_rows())
+
+        conn.executemany('''
+            INSERT INTO transactions (item_id, supplier_id, recipient_id, quantity, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(item_id, item_supplier[item_id - first_item], recipient_id, quantity,
+               'Completed' if item_id - first_item in completed else 'In-Progress',
+               timestamp(min(datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S') + timedelta(hours=rng.randint(1, 72)), now)))
+              for request_id, item_id, recipient_id, quantity, _, _, created_at in winners])
+        conn.executemany("UPDATE requests SET status = 'Completed' WHERE request_id = ?",
+                         [(row[0],) for row in winners if row[1] - first_item in completed])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {'users': users, 'locations': locations, 'food_items': food_items, 'requests': requests,
+            'transactions': transactions, 'elapsed_s': round(time.perf_counter() - started, 2)}
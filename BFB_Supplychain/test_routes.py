@@ -9,8 +9,35 @@ import os
 # Add the current directory to the path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from app import app, get_db_connection
+from app import (app, get_db_connection, encode_cursor, kpi_snapshot, rebuild_kpi_counters, create_database, cache,
+                 get_pool, get_writer, begin_shutdown, shutting_down, run_write_transaction, Connection,
+                 parse_since_arg, parse_expiry_date, migrate_db, SCHEMA_FILE)
+from seed_data import seed_database
+from archive import find_settled_items, sweep
+from metrics import StatementRecorder
+from repositories import SQLiteBackend
 import json
+import gzip
+import sqlite3
+import shutil
+import atexit
+import tempfile
+import logging
+import threading
+import time
+import functools
+from datetime import timedelta
+
+#Every test runs on a scratch copy of foodconnect.db, so the tracked database is never written
+TEST_DATABASE = os.path.join(tempfile.gettempdir(), f'foodconnect_routes_test_{os.getpid()}.db')
+shutil.copyfile(app.config['DATABASE'], TEST_DATABASE)
+app.config['DATABASE'] = TEST_DATABASE
+
+@atexit.register
+def remove_test_database():
+    for path in (TEST_DATABASE, TEST_DATABASE + '-wal', TEST_DATABASE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
 
 # Test results storage
 test_results = {
@@ -34,6 +61,23 @@ def log_test(test_name, status, message=""):
         test_results['failed'] += 1
         print(f"[FAIL] {test_name}: {status} - {message}")
 
+def assert_logged_passes(first):
+    """Under pytest, fail the calling test if a check it logged (test_results['tests'][first:]) failed;
+    a script run reports them in print_summary instead"""
+    if 'PYTEST_CURRENT_TEST' in os.environ:
+        failures = [f"{t['test']}: {t['message']}" for t in test_results['tests'][first:] if t['status'] != 'PASS']
+        assert not failures, '; '.join(failures)
+
+def checked(test):
+    """Run every check a test logs, then fail it under pytest if any of them failed"""
+    @functools.wraps(test)
+    def wrapper():
+        first = len(test_results['tests'])
+        test()
+        assert_logged_passes(first)
+    return wrapper
+
+@checked
 def test_public_routes():
     """Test public routes (index, about, contact)"""
     print("\n=== Testing Public Routes ===")
@@ -60,6 +104,7 @@ def test_public_routes():
         else:
             log_test("GET /contact", "FAIL", f"Status code: {response.status_code}")
 
+@checked
 def test_authentication_routes():
     """Test authentication routes (signup, login, logout)"""
     print("\n=== Testing Authentication Routes ===")
@@ -79,11 +124,15 @@ def test_authentication_routes():
             'phone': '0123456789',
             'password': 'testpass123',
             'confirm': 'testpass123'
-        }, follow_redirects=True)
-        if response.status_code == 200 and b'Account created' in response.data or b'Email already registered' in response.data:
+        })
+        conn = get_db_connection()
+        created = conn.execute('SELECT COUNT(*) FROM users WHERE email = ?',
+                               (f'test_e2e_{os.getpid()}@example.com',)).fetchone()[0]
+        conn.close()
+        if response.status_code == 302 and response.location.endswith('/') and created == 1:
             log_test("POST /signup", "PASS", "User registration working")
         else:
-            log_test("POST /signup", "FAIL", f"Status code: {response.status_code}")
+            log_test("POST /signup", "FAIL", f"Status code: {response.status_code}, {created} users created")
 
         # Test supplier login GET
         response = client.get('/supplierlogin')
@@ -126,6 +175,7 @@ def test_authentication_routes():
         else:
             log_test("GET /logout", "FAIL", f"Status code: {response.status_code}")
 
+@checked
 def test_supplier_routes():
     """Test supplier routes"""
     print("\n=== Testing Supplier Routes ===")
@@ -144,6 +194,14 @@ def test_supplier_routes():
         else:
             log_test("GET /supplier-dashboard", "FAIL", f"Status code: {response.status_code}")
 
+        # Test a sorted page of the inventory table
+        response = client.get('/supplier-dashboard?per_page=2&page=2&sort=food_name&order=desc')
+        body = response.get_data(as_text=True)
+        if response.status_code == 200 and 'page 2 of' in body and body.count('title="Edit"') <= 2:
+            log_test("GET /supplier-dashboard (page 2, sorted)", "PASS")
+        else:
+            log_test("GET /supplier-dashboard (page 2, sorted)", "FAIL", f"Status code: {response.status_code}")
+
         # Test upload food surplus GET
         response = client.get('/uploadfoodsurplus')
         if response.status_code == 200:
@@ -176,6 +234,7 @@ def test_supplier_routes():
         else:
             log_test("GET /view-recipient-needs", "FAIL", f"Status code: {response.status_code}")
 
+@checked
 def test_recipient_routes():
     """Test recipient routes"""
     print("\n=== Testing Recipient Routes ===")
@@ -219,6 +278,7 @@ def test_recipient_routes():
         else:
             log_test("POST /uploadrequest", "FAIL", f"Status code: {response.status_code}")
 
+@checked
 def test_api_endpoints():
     """Test API endpoints"""
     print("\n=== Testing API Endpoints ===")
@@ -278,6 +338,7 @@ def test_api_endpoints():
         else:
             log_test("GET /api/kpi/recipient", "FAIL", f"Status code: {response.status_code}")
 
+@checked
 def test_database_operations():
     """Test database CRUD operations"""
     print("\n=== Testing Database Operations ===")
@@ -318,6 +379,1174 @@ def test_database_operations():
     except Exception as e:
         log_test("Database operations", "FAIL", str(e))
 
+@checked
+def test_connection_pool():
+    """Test pooled connections are reused across requests"""
+    print("\n=== Testing Connection Pool ===")
+
+    with app.test_client() as client:
+        client.get('/api/food-items')
+        client.get('/api/requests')
+        response = client.get('/api/db/pool-stats')
+        if response.status_code == 200:
+            stats = json.loads(response.data)
+            if stats['reused'] > 0 and stats['in_use'] == 0 and 'database' not in stats:
+                log_test("GET /api/db/pool-stats", "PASS", f"{stats['created']} created, {stats['reused']} reused")
+            else:
+                log_test("GET /api/db/pool-stats", "FAIL", f"Unexpected stats: {stats}")
+        else:
+            log_test("GET /api/db/pool-stats", "FAIL", f"Status code: {response.status_code}")
+
+        remote = {'REMOTE_ADDR': '10.0.0.5'}
+        forwarded = {'X-Forwarded-For': '10.0.0.5'}
+        refused = [url for url in ('/metrics', '/api/cache-stats', '/api/db/pool-stats', '/api/stream/stats')
+                   if client.get(url, environ_base=remote).status_code != 403
+                   or client.get(url, headers=forwarded).status_code != 403]
+        ops_token = app.config['OPS_TOKEN']
+        app.config['OPS_TOKEN'] = 'test-ops-token'
+        try:
+            token_status = client.get('/api/db/pool-stats', environ_base=remote,
+                                      headers={'Authorization': 'Bearer test-ops-token'}).status_code
+        finally:
+            app.config['OPS_TOKEN'] = ops_token
+        if not refused and token_status == 200:
+            log_test("Ops endpoints: Remote requests need the token", "PASS")
+        else:
+            log_test("Ops endpoints: Remote requests need the token", "FAIL",
+                     f"Open to remote: {refused}, with token: {token_status}")
+
+        conn = get_db_connection()
+        journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+        conn.close()
+        if journal_mode == 'wal' and foreign_keys == 1:
+            log_test("Database: Connection pragmas", "PASS")
+        else:
+            log_test("Database: Connection pragmas", "FAIL", f"journal_mode={journal_mode}, foreign_keys={foreign_keys}")
+
+@checked
+def test_kpi_counters():
+    """Test trigger-maintained KPI counters match a full recount"""
+    print("\n=== Testing KPI Counters ===")
+
+    try:
+        conn = get_db_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        counted = kpi_snapshot(conn)
+        rebuild_kpi_counters(conn)
+        actual = kpi_snapshot(conn)
+        conn.rollback()
+        conn.close()
+
+        drift = [key for key in counted.keys() | actual.keys() if counted.get(key) != actual.get(key)]
+        if not drift:
+            log_test("KPI counters: No drift", "PASS", f"{len(actual)} counter rows")
+        else:
+            log_test("KPI counters: No drift", "FAIL", f"Drifted rows: {drift}")
+
+    except Exception as e:
+        log_test("KPI counters", "FAIL", str(e))
+
+@checked
+def test_read_cache():
+    """Test KPI reads are served from cache until a write invalidates them"""
+    print("\n=== Testing Read Cache ===")
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+
+        before = json.loads(client.get('/api/kpi/supplier').data)
+        hits_before = json.loads(client.get('/api/cache-stats').data)['hits']
+        client.get('/api/kpi/supplier')
+        hits_after = json.loads(client.get('/api/cache-stats').data)['hits']
+        if hits_after == hits_before + 1:
+            log_test("Cache: Repeated KPI read is a hit", "PASS")
+        else:
+            log_test("Cache: Repeated KPI read is a hit", "FAIL", f"Hits {hits_before} -> {hits_after}")
+
+        #The next UTC day must not be served today's expiring-soon buckets
+        app_module = sys.modules['app']
+        utc_today = app_module.utc_today
+        app_module.utc_today = lambda: utc_today() + timedelta(days=1)
+        try:
+            misses_before = json.loads(client.get('/api/cache-stats').data)['misses']
+            client.get('/api/kpi/supplier')
+            misses_after = json.loads(client.get('/api/cache-stats').data)['misses']
+        finally:
+            app_module.utc_today = utc_today
+        if misses_after == misses_before + 1:
+            log_test("Cache: KPI read recomputed on a new day", "PASS")
+        else:
+            log_test("Cache: KPI read recomputed on a new day", "FAIL", f"Misses {misses_before} -> {misses_after}")
+
+        client.post('/api/food-items/create', json={
+            'food_type': 'Fruits',
+            'food_name': 'Cache Test Pears',
+            'quantity_available': 4,
+            'expiry_date': '2030-01-01',
+            'delivery_option': 'Pickup',
+            'city': 'Cape Town'
+        })
+        after = json.loads(client.get('/api/kpi/supplier').data)
+        if after['total_items'] == before['total_items'] + 1:
+            log_test("Cache: Write invalidates KPI read", "PASS")
+        else:
+            log_test("Cache: Write invalidates KPI read", "FAIL",
+                     f"total_items {before['total_items']} -> {after['total_items']}")
+
+@checked
+def test_pagination():
+    """Test keyset pagination of the list APIs"""
+    print("\n=== Testing Pagination ===")
+
+    with app.test_client() as client:
+        for path, key in (('/api/food-items', 'item_id'), ('/api/requests', 'request_id')):
+            full = [row[key] for row in json.loads(client.get(f'{path}?limit=1000').data)]
+            paged = []
+            cursor = ''
+            while True:
+                response = client.get(f'{path}?limit=2&cursor={cursor}')
+                paged += [row[key] for row in json.loads(response.data)]
+                cursor = response.headers.get('X-Next-Cursor')
+                if not cursor:
+                    break
+            if paged == full:
+                log_test(f"GET {path} (paged)", "PASS", f"{len(paged)} rows in pages of 2")
+            else:
+                log_test(f"GET {path} (paged)", "FAIL", f"Paged {paged} != full {full}")
+
+        response = client.get('/api/food-items?cursor=not-a-cursor')
+        if response.status_code == 400:
+            log_test("GET /api/food-items (bad cursor)", "PASS")
+        else:
+            log_test("GET /api/food-items (bad cursor)", "FAIL", f"Status code: {response.status_code}")
+
+        #Well-formed base64 JSON, but not a sort key the query can use
+        bad_cursors = [encode_cursor(values) for values in ([['2030-01-01'], {}], ['2030-01-01', 'x'],
+                                                            ['2030-01-01', True], ['2030-01-01', 1.5], ['2030-01-01', 1, 2])]
+        statuses = [client.get(f'{path}cursor={cursor}').status_code
+                    for path in ('/api/food-items?', '/api/requests?', '/api/food-items/search?q=bread&')
+                    for cursor in bad_cursors]
+        if set(statuses) == {400}:
+            log_test("GET list APIs (mistyped cursor)", "PASS")
+        else:
+            log_test("GET list APIs (mistyped cursor)", "FAIL", f"Status codes: {statuses}")
+
+@checked
+def test_ndjson_export():
+    """Test streaming NDJSON export endpoints"""
+    print("\n=== Testing NDJSON Export ===")
+
+    with app.test_client() as client:
+        for path in ('/api/export/food-items.ndjson', '/api/export/requests.ndjson'):
+            response = client.get(path)
+            streamed = response.is_streamed
+            try:
+                rows = [json.loads(line) for line in response.data.splitlines()]
+                if response.status_code == 200 and streamed and response.mimetype == 'application/x-ndjson':
+                    log_test(f"GET {path}", "PASS", f"Streamed {len(rows)} rows")
+                else:
+                    log_test(f"GET {path}", "FAIL", f"Status code: {response.status_code}")
+            except ValueError:
+                log_test(f"GET {path}", "FAIL", "Invalid NDJSON line")
+
+        response = client.get('/api/export/requests.ndjson?since=2999-01-01')
+        if response.status_code == 200 and response.data == b'':
+            log_test("GET /api/export/requests.ndjson?since=", "PASS")
+        else:
+            log_test("GET /api/export/requests.ndjson?since=", "FAIL", f"Status code: {response.status_code}")
+
+    #An offset is converted to UTC, the zone created_at is stored in
+    since = {}
+    for value in ('2025-01-01T10:00:00+02:00', '2025-01-01T10:00:00-05:30', '2025-01-01 10:00:00', '2025-01-01'):
+        with app.test_request_context('/api/export/food-items.ndjson', query_string={'since': value}):
+            since[value] = parse_since_arg()
+    if list(since.values()) == ['2025-01-01 08:00:00', '2025-01-01 15:30:00', '2025-01-01 10:00:00',
+                                '2025-01-01 00:00:00']:
+        log_test("Export: ?since= offsets converted to UTC", "PASS")
+    else:
+        log_test("Export: ?since= offsets converted to UTC", "FAIL", f"Parsed: {since}")
+
+@checked
+def test_expiry_dates():
+    """Test expiry date validation, the legacy-format normalization and the validation triggers"""
+    print("\n=== Testing Expiry Dates ===")
+
+    parsed = []
+    for value in (' 2025-12-15 ', '2025-12-15xyz', '2025-12-15 00:00:00', '15/12/2025', '2025-02-30', ''):
+        try:
+            parsed.append(parse_expiry_date(value))
+        except ValueError:
+            parsed.append(None)
+    if parsed == ['2025-12-15', None, None, None, None, None]:
+        log_test("Expiry dates: Only whole ISO dates parsed", "PASS")
+    else:
+        log_test("Expiry dates: Only whole ISO dates parsed", "FAIL", f"Parsed: {parsed}")
+
+    response = login_client(2, 'Bob Johnson', ['Supplier']).post('/api/food-items/create', json={
+        'food_type': 'Bakery', 'food_name': 'Bad Date Bread', 'quantity_available': 5,
+        'expiry_date': '2030-01-01xyz', 'delivery_option': 'Pickup', 'city': 'Cape Town'})
+    if response.status_code == 400:
+        log_test("POST /api/food-items/create (trailing junk in expiry_date)", "PASS")
+    else:
+        log_test("POST /api/food-items/create (trailing junk in expiry_date)", "FAIL",
+                 f"Status code: {response.status_code}")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_expiry_test_{os.getpid()}.db')
+    try:
+        #A database from before the migrations, holding dates in the formats 004 rewrites
+        conn = sqlite3.connect(database)
+        with open(SCHEMA_FILE) as f:
+            conn.executescript(f.read())
+        legacy = {'2025-12-15 00:00:00': '2025-12-15', '2025-12-16T08:30:00': '2025-12-16',
+                  '2025-12-17': '2025-12-17', '2025-02-30 00:00:00': '2025-02-30 00:00:00'}
+        item_ids = {conn.execute('''
+            INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                    delivery_option, location_id)
+            VALUES (2, 'Bakery', 'Legacy Date Bread', 5, ?, 'Pickup', 1)
+        ''', (value,)).lastrowid: expected for value, expected in legacy.items()}
+        conn.commit()
+        migrate_db(conn)
+        stored = dict(conn.execute("SELECT item_id, expiry_date FROM food_items WHERE food_name = 'Legacy Date Bread'"))
+        if stored == item_ids:
+            log_test("Expiry dates: Migration normalizes legacy formats", "PASS")
+        else:
+            log_test("Expiry dates: Migration normalizes legacy formats", "FAIL", f"Stored: {stored}")
+
+        rejected = []
+        for value in ('2025-12-15 00:00:00', '2025-02-30', 'soon'):
+            for statement, params in (('''
+                INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                        delivery_option, location_id)
+                VALUES (2, 'Bakery', 'Legacy Date Bread', 5, ?, 'Pickup', 1)
+            ''', (value,)), ('UPDATE food_items SET expiry_date = ? WHERE item_id = ?', (value, min(item_ids)))):
+                try:
+                    conn.execute(statement, params)
+                except sqlite3.IntegrityError:
+                    rejected.append(value)
+        conn.rollback()
+        conn.close()
+        if len(rejected) == 6:
+            log_test("Expiry dates: Triggers reject non-ISO dates", "PASS")
+        else:
+            log_test("Expiry dates: Triggers reject non-ISO dates", "FAIL", f"Rejected only: {rejected}")
+
+    except Exception as e:
+        log_test("Expiry dates", "FAIL", str(e))
+    finally:
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_bulk_upload():
+    """Test bulk food item upload with per-row results"""
+    print("\n=== Testing Bulk Upload ===")
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+
+        items = [{
+            'food_type': 'Grains',
+            'food_name': f'Bulk Test Oats {i}',
+            'quantity_available': 5,
+            'expiry_date': '2030-01-01',
+            'delivery_option': 'Pickup',
+            'city': 'Cape Town' if i % 2 else 'Durban'
+        } for i in range(20)]
+        items.append({'food_type': 'Sweets', 'food_name': 'Invalid Row'})
+
+        response = client.post('/api/food-items/bulk', json=items)
+        data = json.loads(response.data)
+        item_ids = [result.get('item_id') for result in data.get('results', [])[:20]]
+        if response.status_code == 207 and data['created'] == 20 and None not in item_ids and 'error' in data['results'][20]:
+            log_test("POST /api/food-items/bulk (JSON)", "PASS", f"Created {data['created']}, rejected {data['failed']}")
+        else:
+            log_test("POST /api/food-items/bulk (JSON)", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        response = client.post('/api/food-items/bulk', content_type='text/csv', data=(
+            'food_type,food_name,quantity_available,expiry_date,delivery_option,city\n'
+            'Dairy,Bulk Test Yoghurt,3,2030-02-01,Delivery,Durban\n'))
+        if response.status_code == 201:
+            log_test("POST /api/food-items/bulk (CSV)", "PASS")
+        else:
+            log_test("POST /api/food-items/bulk (CSV)", "FAIL", f"Status code: {response.status_code}")
+
+        blank = {'food_type': 'Grains', 'food_name': '   ', 'quantity_available': 5, 'expiry_date': '2030-01-01',
+                 'delivery_option': 'Pickup', 'city': 'Durban'}
+        bulk_response = client.post('/api/food-items/bulk', json=[blank])
+        create_response = client.post('/api/food-items/create', json=blank)
+        if bulk_response.status_code == 400 and create_response.status_code == 400:
+            log_test("Whitespace-only food_name rejected", "PASS")
+        else:
+            log_test("Whitespace-only food_name rejected", "FAIL",
+                     f"Status codes: {bulk_response.status_code}, {create_response.status_code}")
+
+@checked
+def test_bulk_request_update():
+    """Test bulk request status updates with per-item results"""
+    print("\n=== Testing Bulk Request Update ===")
+
+    recipient = login_client(4, 'David Brown', ['Recipient'])
+    response = recipient.put('/api/requests/bulk-update', json=[
+        {'request_id': 1, 'status': 'Pending'},
+        {'request_id': 2, 'status': 'Cancelled'},
+        {'request_id': 999999, 'status': 'Pending'},
+        {'request_id': 1, 'status': 'Cancelled'},
+        {'request_id': 1, 'status': 'Bogus'}
+    ])
+    data = json.loads(response.data)
+    results = data.get('results', [])
+    if (response.status_code == 207 and data['updated'] == 1 and results[0]['request']['status'] == 'Pending'
+            and results[0]['request']['food_name'] and all('error' in result for result in results[1:])):
+        log_test("PUT /api/requests/bulk-update (mixed)", "PASS", f"Updated {data['updated']}, rejected {data['failed']}")
+    else:
+        log_test("PUT /api/requests/bulk-update (mixed)", "FAIL", f"Status code: {response.status_code}, {data}")
+
+    supplier = login_client(2, 'Bob Johnson', ['Supplier'])
+    response = supplier.put('/api/requests/bulk-update', json=[{'request_id': 2, 'status': 'Selected'}])
+    if response.status_code == 200 and json.loads(response.data)['updated'] == 1:
+        log_test("PUT /api/requests/bulk-update (supplier)", "PASS")
+    else:
+        log_test("PUT /api/requests/bulk-update (supplier)", "FAIL", f"Status code: {response.status_code}")
+
+    response = supplier.put('/api/requests/bulk-update', json={'request_id': 2, 'status': 'Selected'})
+    if response.status_code == 400:
+        log_test("PUT /api/requests/bulk-update (not a list)", "PASS")
+    else:
+        log_test("PUT /api/requests/bulk-update (not a list)", "FAIL", f"Status code: {response.status_code}")
+
+@checked
+def test_location_registry():
+    """Test signups and uploads reuse registered locations instead of adding duplicates"""
+    print("\n=== Testing Location Registry ===")
+
+    with app.test_client() as client:
+        conn = get_db_connection()
+        before = conn.execute('SELECT COUNT(*) FROM locations').fetchone()[0]
+        conn.close()
+
+        for i in range(3):
+            client.post('/signup', data={
+                'name': 'Location Test User',
+                'email': f'location_test_{os.getpid()}_{i}@example.com',
+                'phone': '0123456789',
+                'password': 'testpass123',
+                'confirm': 'testpass123'
+            })
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+        for city in ('Cape Town', 'cape town', ' CAPE TOWN'):
+            client.post('/api/food-items/create', json={
+                'food_type': 'Fruits',
+                'food_name': 'Location Test Plums',
+                'quantity_available': 2,
+                'expiry_date': '2030-01-01',
+                'delivery_option': 'Pickup',
+                'city': city
+            })
+
+        conn = get_db_connection()
+        after = conn.execute('SELECT COUNT(*) FROM locations').fetchone()[0]
+        conn.close()
+        #At most one new 'Not specified' row, if the database did not have one yet
+        if after - before <= 1:
+            log_test("Locations: No duplicate rows", "PASS", f"{before} -> {after} locations")
+        else:
+            log_test("Locations: No duplicate rows", "FAIL", f"{before} -> {after} locations")
+
+@checked
+def test_matching_engine():
+    """Test the matching engine gives an item to the most urgent request"""
+    print("\n=== Testing Matching Engine ===")
+
+    conn = get_db_connection()
+    item_id = conn.execute('''
+        INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date, delivery_option, location_id)
+        VALUES (2, 'Fruits', 'Matching Test Pears', 10, '2031-01-01', 'Pickup', 1)
+    ''').lastrowid
+    low_id = conn.execute('''
+        INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, created_at)
+        VALUES (?, 3, 2, 'Low', '2025-01-01 08:00:00')
+    ''', (item_id,)).lastrowid
+    high_id = conn.execute('''
+        INSERT INTO requests (item_id, recipient_id, quantity_needed, urgency_level, created_at)
+        VALUES (?, 4, 4, 'High', '2025-06-01 08:00:00')
+    ''', (item_id,)).lastrowid
+    conn.commit()
+    conn.close()
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 2
+            sess['user_fullname'] = 'Bob Johnson'
+            sess['roles'] = ['Supplier']
+
+        response = client.post('/api/matching/run', json={'deterministic': True, 'dry_run': True})
+        data = json.loads(response.data)
+        chosen = [a['request_id'] for a in data.get('allocations', []) if a['item_id'] == item_id]
+        if response.status_code == 200 and chosen == [high_id]:
+            log_test("POST /api/matching/run (dry run)", "PASS", f"{data['matched']} of {data['candidates']} matched")
+        else:
+            log_test("POST /api/matching/run (dry run)", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        response = client.post('/api/matching/run', json={'deterministic': True})
+        conn = get_db_connection()
+        statuses = dict(conn.execute('SELECT request_id, status FROM requests WHERE item_id = ?', (item_id,)).fetchall())
+        transaction = conn.execute('SELECT recipient_id, quantity FROM transactions WHERE item_id = ?', (item_id,)).fetchone()
+        conn.close()
+        if (response.status_code == 200 and statuses == {low_id: 'Pending', high_id: 'Selected'}
+                and transaction is not None and tuple(transaction) == (4, 4.0)):
+            log_test("POST /api/matching/run", "PASS")
+        else:
+            log_test("POST /api/matching/run", "FAIL", f"Status code: {response.status_code}, {statuses}")
+
+@checked
+def test_proximity_search():
+    """Test nearby surplus search returns close items first with their distance"""
+    print("\n=== Testing Proximity Search ===")
+
+    with app.test_client() as client:
+        #Pretoria city centre: Pretoria and Johannesburg items are within 60 km, Cape Town is not
+        response = client.get('/api/food-items/nearby?lat=-25.7479&lon=28.2293&radius_km=60')
+        data = json.loads(response.data)
+        distances = [item.get('distance_km') for item in data] if isinstance(data, list) else []
+        cities = {item.get('city') for item in data} if isinstance(data, list) else set()
+        if (response.status_code == 200 and distances == sorted(distances)
+                and all(d <= 60 for d in distances) and 'Cape Town' not in cities):
+            log_test("GET /api/food-items/nearby", "PASS", f"{len(data)} items, cities {sorted(cities)}")
+        else:
+            log_test("GET /api/food-items/nearby", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        response = client.get('/api/food-items/nearby?lat=-25.7&lon=28.2&radius_km=5000')
+        if response.status_code == 400:
+            log_test("GET /api/food-items/nearby (invalid radius)", "PASS")
+        else:
+            log_test("GET /api/food-items/nearby (invalid radius)", "FAIL", f"Status code: {response.status_code}")
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = 3
+            sess['user_fullname'] = 'Carol White'
+            sess['roles'] = ['Recipient']
+        response = client.get('/view-available-surplus?radius_km=50')
+        if response.status_code == 200 and b'Within 50 km of my location' in response.data:
+            log_test("GET /view-available-surplus?radius_km=50", "PASS")
+        else:
+            log_test("GET /view-available-surplus?radius_km=50", "FAIL", f"Status code: {response.status_code}")
+
+@checked
+def test_full_text_search():
+    """Test ranked full-text search over food names and descriptions"""
+    print("\n=== Testing Full-Text Search ===")
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+        response = client.post('/api/food-items/create', json={
+            'food_type': 'Vegetables',
+            'food_name': 'Search Test Butternut',
+            'quantity_available': 4,
+            'expiry_date': '2031-01-01',
+            'delivery_option': 'Pickup',
+            'city': 'Durban',
+            'description': 'Roasting squash, boxed'
+        })
+        item_id = json.loads(response.data).get('item_id')
+
+        response = client.get('/api/food-items/search?q=butternut squash')
+        data = json.loads(response.data)
+        if response.status_code == 200 and item_id in [item['item_id'] for item in data] and 'snippet' in data[0]:
+            log_test("GET /api/food-items/search", "PASS", data[0]['snippet'])
+        else:
+            log_test("GET /api/food-items/search", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        response = client.get('/api/food-items/search?q=butter&expires_before=2030-12-31')
+        if response.status_code == 200 and item_id not in [item['item_id'] for item in json.loads(response.data)]:
+            log_test("GET /api/food-items/search (expiry filter)", "PASS")
+        else:
+            log_test("GET /api/food-items/search (expiry filter)", "FAIL", f"Status code: {response.status_code}")
+
+        response = client.get('/api/food-items/search?q=')
+        if response.status_code == 400:
+            log_test("GET /api/food-items/search (empty query)", "PASS")
+        else:
+            log_test("GET /api/food-items/search (empty query)", "FAIL", f"Status code: {response.status_code}")
+
+@checked
+def test_conditional_get():
+    """Test read APIs answer 304 until one of their tables changes"""
+    print("\n=== Testing Conditional GET ===")
+
+    with app.test_client() as client:
+        response = client.get('/api/food-items')
+        etag = response.headers.get('ETag')
+        response = client.get('/api/food-items', headers={'If-None-Match': etag})
+        if etag and response.status_code == 304 and not response.data:
+            log_test("GET /api/food-items (If-None-Match)", "PASS", f"ETag {etag}")
+        else:
+            log_test("GET /api/food-items (If-None-Match)", "FAIL", f"Status code: {response.status_code}")
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+        client.post('/api/food-items/create', json={
+            'food_type': 'Fruits',
+            'food_name': 'Conditional Test Plums',
+            'quantity_available': 2,
+            'expiry_date': '2031-01-01',
+            'delivery_option': 'Pickup',
+            'city': 'Cape Town'
+        })
+        response = client.get('/api/food-items', headers={'If-None-Match': etag})
+        if response.status_code == 200 and response.headers.get('ETag') != etag:
+            log_test("GET /api/food-items (changed)", "PASS")
+        else:
+            log_test("GET /api/food-items (changed)", "FAIL", f"Status code: {response.status_code}")
+
+        response = client.get('/supplier-dashboard')
+        response = client.get('/supplier-dashboard', headers={'If-None-Match': response.headers.get('ETag', '')})
+        if response.status_code == 304:
+            log_test("GET /supplier-dashboard (If-None-Match)", "PASS")
+        else:
+            log_test("GET /supplier-dashboard (If-None-Match)", "FAIL", f"Status code: {response.status_code}")
+
+@checked
+def test_response_compression():
+    """Test gzip responses and sparse fieldsets on the JSON APIs"""
+    print("\n=== Testing Response Compression ===")
+
+    with app.test_client() as client:
+        response = client.get('/api/food-items', headers={'Accept-Encoding': 'gzip'})
+        body = response.data
+        if (response.status_code == 200 and response.headers.get('Content-Encoding') == 'gzip'
+                and isinstance(json.loads(gzip.decompress(body)), list)):
+            log_test("GET /api/food-items (gzip)", "PASS", f"{len(body)} bytes compressed")
+        else:
+            log_test("GET /api/food-items (gzip)", "FAIL", f"Status code: {response.status_code}, {response.headers.get('Content-Encoding')}")
+
+        response = client.get('/api/food-items?fields=item_id,food_name&limit=5')
+        data = json.loads(response.data)
+        if response.status_code == 200 and data and all(set(item) == {'item_id', 'food_name'} for item in data):
+            log_test("GET /api/food-items?fields=", "PASS")
+        else:
+            log_test("GET /api/food-items?fields=", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        response = client.get('/api/requests?fields=request_id,password')
+        if response.status_code == 400:
+            log_test("GET /api/requests?fields= (unknown field)", "PASS")
+        else:
+            log_test("GET /api/requests?fields= (unknown field)", "FAIL", f"Status code: {response.status_code}")
+
+@checked
+def test_event_stream():
+    """Test the SSE feed replays missed events and pushes new ones live"""
+    print("\n=== Testing Event Stream ===")
+
+    def create_item(client, name):
+        response = client.post('/api/food-items/create', json={
+            'food_type': 'Bakery',
+            'food_name': name,
+            'quantity_available': 3,
+            'expiry_date': '2031-01-01',
+            'delivery_option': 'Pickup',
+            'city': 'Durban'
+        })
+        return json.loads(response.data).get('item_id')
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+
+        conn = get_db_connection()
+        last_event_id = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+        conn.close()
+        item_id = create_item(client, 'Stream Test Rusks')
+
+        response = client.get('/api/stream/events?city=Durban', headers={'Last-Event-ID': str(last_event_id)},
+                              buffered=False)
+        chunks = iter(response.response)
+        received = [next(chunks) for _ in range(2)]
+        response.close()
+        if (response.mimetype == 'text/event-stream' and b'event: food_item.created' in received[1]
+                and f'"item_id":{item_id}'.encode() in received[1]):
+            log_test("GET /api/stream/events (replay)", "PASS")
+        else:
+            log_test("GET /api/stream/events (replay)", "FAIL", f"{received}")
+
+        response = client.get('/api/stream/events?food_type=Bakery', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        item_id = create_item(client, 'Stream Test Scones')
+        event = next(chunks)
+        response.close()
+        if f'"item_id":{item_id}'.encode() in event:
+            log_test("GET /api/stream/events (live)", "PASS")
+        else:
+            log_test("GET /api/stream/events (live)", "FAIL", f"{event}")
+
+@checked
+def test_change_feed():
+    """Test /api/changes returns only what changed since a sequence number"""
+    print("\n=== Testing Change Feed ===")
+
+    with app.test_client() as client:
+        response = client.get('/api/changes?limit=1')
+        data = json.loads(response.data)
+        if response.status_code == 200 and len(data['changes']) == 1 and data['has_more']:
+            log_test("GET /api/changes", "PASS")
+        else:
+            log_test("GET /api/changes", "FAIL", f"Status code: {response.status_code}, {data}")
+
+        conn = get_db_connection()
+        since = conn.execute('SELECT MAX(seq) FROM change_log').fetchone()[0]
+        request_id = conn.execute("SELECT request_id FROM requests WHERE status = 'Pending' ORDER BY request_id LIMIT 1").fetchone()[0]
+        conn.close()
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_fullname'] = 'Alice Smith'
+            sess['roles'] = ['Supplier']
+        client.post(f'/api/requests/update/{request_id}', json={'status': 'Cancelled'})
+
+        response = client.get(f'/api/changes?since={since}')
+        data = json.loads(response.data)
+        changed = {(change['table'], change['id']): change['row'] for change in data.get('changes', [])}
+        row = changed.get(('requests', request_id))
+        if response.status_code == 200 and row is not None and row['status'] == 'Cancelled' and data['last_seq'] > since:
+            log_test("GET /api/changes?since=", "PASS", f"{len(changed)} changed rows")
+        else:
+            log_test("GET /api/changes?since=", "FAIL", f"Status code: {response.status_code}, {data}")
+
+@checked
+def test_seed_data():
+    """Test generated data passes the schema's checks and keeps the KPI counters exact"""
+    print("\n=== Testing Seed Data ===")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_seed_test_{os.getpid()}.db')
+    try:
+        create_database(database)
+        conn = sqlite3.connect(database)
+        before = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                  for table in ('users', 'locations', 'food_items', 'requests', 'transactions')}
+        result = seed_database(conn, users=40, locations=20, food_items=200, requests=600, transactions=30, seed=7)
+        added = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] - count
+                 for table, count in before.items()}
+
+        conn.execute('BEGIN IMMEDIATE')
+        counted = kpi_snapshot(conn)
+        rebuild_kpi_counters(conn)
+        actual = kpi_snapshot(conn)
+        conn.rollback()
+        conn.close()
+
+        drift = [key for key in counted.keys() | actual.keys() if counted.get(key) != actual.get(key)]
+        if all(added[table] == result[table] for table in added) and not drift:
+            log_test("Seed data: Generated rows", "PASS", f"{added} in {result['elapsed_s']}s")
+        else:
+            log_test("Seed data: Generated rows", "FAIL", f"Added {added}, drifted rows: {drift}")
+
+    except Exception as e:
+        log_test("Seed data", "FAIL", str(e))
+    finally:
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_archive_sweep():
+    """Test the sweeper moves only settled items, in batches, without changing the KPI totals"""
+    print("\n=== Testing Archive Sweep ===")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_archive_test_{os.getpid()}.db')
+    try:
+        create_database(database)
+        conn = sqlite3.connect(database, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        seed_database(conn, users=40, locations=20, food_items=300, requests=900, transactions=40, seed=3)
+        history = lambda: {table: conn.execute(f'SELECT COUNT(*) FROM {table}_history').fetchone()[0]
+                           for table in ('food_items', 'requests', 'transactions')}
+        totals = lambda: {row['name']: row['value'] for row in conn.execute('SELECT * FROM kpi_counters')
+                          if row['name'] != 'active_requests'}
+        before_history, before_totals = history(), totals()
+        in_flight = {row[0] for row in conn.execute("SELECT item_id FROM transactions WHERE status = 'In-Progress'")}
+
+        result = sweep(conn, batch_size=50, grace_days=7)
+        left = find_settled_items(conn, result['cutoff'], -1)
+        kept = {row[0] for row in conn.execute('SELECT item_id FROM food_items')}
+        if result['food_items'] and result['batches'] > 1 and not left and in_flight <= kept:
+            log_test("Archive: Settled items moved in batches", "PASS",
+                     f"{result['food_items']} items in {result['batches']} batches")
+        else:
+            log_test("Archive: Settled items moved in batches", "FAIL", f"{result}, {len(left)} settled items left")
+
+        open_archived = conn.execute(
+            "SELECT COUNT(*) FROM requests_archive WHERE status IN ('Pending', 'Selected')").fetchone()[0]
+        if history() == before_history and totals() == before_totals and not open_archived:
+            log_test("Archive: History views and KPI totals unchanged", "PASS")
+        else:
+            log_test("Archive: History views and KPI totals unchanged", "FAIL",
+                     f"{before_history} -> {history()}, {before_totals} -> {totals()}, "
+                     f"{open_archived} open requests archived")
+
+        operations = {row[0]: row[1] for row in conn.execute('''
+            SELECT operation, COUNT(*) FROM change_log WHERE table_name = 'food_items' AND operation IN ('delete', 'archive')
+            GROUP BY operation
+        ''')}
+        if operations == {'archive': result['food_items']}:
+            log_test("Archive: Change log records archivals, not deletes", "PASS")
+        else:
+            log_test("Archive: Change log records archivals, not deletes", "FAIL", f"Operations: {operations}")
+
+        conn.execute('BEGIN IMMEDIATE')
+        counted = kpi_snapshot(conn)
+        rebuild_kpi_counters(conn)
+        actual = kpi_snapshot(conn)
+        conn.rollback()
+        conn.close()
+        drift = [key for key in counted.keys() | actual.keys() if counted.get(key) != actual.get(key)]
+        if not drift:
+            log_test("Archive: KPI counters match a rebuild", "PASS")
+        else:
+            log_test("Archive: KPI counters match a rebuild", "FAIL", f"Drifted rows: {drift}")
+
+    except Exception as e:
+        log_test("Archive sweep", "FAIL", str(e))
+    finally:
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_request_metrics():
+    """Test per-request metrics reach /metrics and slow requests are logged with their SQL"""
+    print("\n=== Testing Request Metrics ===")
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logging.getLogger('metrics').addHandler(handler)
+    slow_request_ms = app.config['SLOW_REQUEST_MS']
+    app.config['SLOW_REQUEST_MS'] = 0.001
+    try:
+        with app.test_client() as client:
+            client.get('/api/food-items?limit=5').get_data()
+            app.config['SLOW_REQUEST_MS'] = slow_request_ms
+            response = client.get('/metrics')
+            text = response.get_data(as_text=True)
+    finally:
+        app.config['SLOW_REQUEST_MS'] = slow_request_ms
+        logging.getLogger('metrics').removeHandler(handler)
+
+    expected = ('foodconnect_http_requests_total{endpoint="api_food_items",method="GET",status="200"}',
+                'foodconnect_sql_statements_per_request_count{endpoint="api_food_items"}',
+                'foodconnect_sql_rows_fetched_sum{endpoint="api_food_items"}')
+    missing = [line for line in expected if line not in text]
+    if response.status_code == 200 and response.mimetype == 'text/plain' and not missing:
+        log_test("GET /metrics", "PASS")
+    else:
+        log_test("GET /metrics", "FAIL", f"Status code: {response.status_code}, missing {missing}")
+
+    messages = [record.getMessage() for record in records]
+    if any('/api/food-items' in message and 'FROM food_items' in message for message in messages):
+        log_test("Slow request log includes SQL", "PASS")
+    else:
+        log_test("Slow request log includes SQL", "FAIL", f"Logged: {messages}")
+
+# Query budgets: the most SQL statements a request may run. A route going over its budget, or
+# running the same statement twice (usually a query inside a loop, an N+1), fails the check.
+def record_queries(client, method, path, **kwargs):
+    """Run one request and return (response, StatementRecorder holding the SQL it ran)"""
+    get_pool()
+    cache.clear()
+    with StatementRecorder() as recorder:
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+    return response, recorder
+
+def check_query_budget(client, method, path, budget, **kwargs):
+    """Log whether a request stays within budget statements and repeats none of them"""
+    test_name = f"Query budget: {method} {path}"
+    response, recorder = record_queries(client, method, path, **kwargs)
+    count = len(recorder.statements)
+    repeated = recorder.repeated()
+    if response.status_code >= 400:
+        log_test(test_name, "FAIL", f"Status code: {response.status_code}")
+    elif count > budget:
+        log_test(test_name, "FAIL", f"{count} statements (budget {budget}): {recorder.statements}")
+    elif repeated:
+        log_test(test_name, "FAIL", f"Repeated statements (probable N+1): {repeated}")
+    else:
+        log_test(test_name, "PASS", f"{count}/{budget} statements")
+
+def login_client(user_id, user_fullname, roles):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_fullname'] = user_fullname
+        sess['roles'] = roles
+    return client
+
+@checked
+def test_claim_stress():
+    """Test concurrent claims on one item never hand out more than its quantity"""
+    print("\n=== Testing Concurrent Claims ===")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_claim_test_{os.getpid()}.db')
+    original_database = app.config['DATABASE']
+    try:
+        create_database(database)
+        conn = sqlite3.connect(database)
+        item_id = conn.execute('''
+            INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                    delivery_option, location_id)
+            VALUES (2, 'Bakery', 'Stress Test Bread', 100, date('now', '+30 days'), 'Pickup', 1)
+        ''').lastrowid
+        lot_parent_id = conn.execute('''
+            INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                    delivery_option, location_id)
+            VALUES (2, 'Grains', 'Lot Test Rice', 50, date('now', '+30 days'), 'Pickup', 1)
+        ''').lastrowid
+        too_big, fits = [conn.execute('''
+            INSERT INTO requests (item_id, recipient_id, quantity_needed, status) VALUES (?, ?, ?, 'Pending')
+        ''', (lot_parent_id, recipient_id, quantity)).lastrowid for recipient_id, quantity in ((3, 40), (4, 10))]
+        conn.commit()
+        app.config['DATABASE'] = database
+
+        counters = lambda: conn.execute('''
+            SELECT (SELECT value FROM kpi_counters WHERE name = 'total_items'),
+                   (SELECT total_items FROM kpi_supplier_counters WHERE user_id = 2)
+        ''').fetchone()
+        before = counters()
+        response = login_client(1, 'Alice Smith', ['Supplier', 'Recipient']).post(
+            f'/api/food-items/{lot_parent_id}/claim', json={'quantity': 20})
+        result = response.get_json()
+        lot = conn.execute('SELECT parent_item_id FROM food_items WHERE item_id = ?',
+                           (result.get('item_id'),)).fetchone()
+        statuses = dict(conn.execute('SELECT request_id, status FROM requests WHERE request_id IN (?, ?)',
+                                     (too_big, fits)).fetchall())
+        searched = conn.execute('SELECT COUNT(*) FROM food_items_fts WHERE food_items_fts MATCH ?',
+                                ('"lot test rice"',)).fetchone()[0]
+        if (response.status_code == 201 and lot and lot[0] == lot_parent_id and counters() == before
+                and searched == 1):
+            log_test("Claims: Partial claim leaves total_items unchanged", "PASS")
+        else:
+            log_test("Claims: Partial claim leaves total_items unchanged", "FAIL",
+                     f"Status {response.status_code}, lot {lot and tuple(lot)}, counters {before} -> {counters()}, "
+                     f"{searched} search matches")
+        if result.get('cancelled_requests') == [too_big] and statuses == {too_big: 'Cancelled', fits: 'Pending'}:
+            log_test("Claims: Requests for more than is left cancelled", "PASS")
+        else:
+            log_test("Claims: Requests for more than is left cancelled", "FAIL",
+                     f"Cancelled {result.get('cancelled_requests')}, statuses {statuses}")
+        conn.execute('BEGIN IMMEDIATE')
+        counted = kpi_snapshot(conn)
+        rebuild_kpi_counters(conn)
+        actual = kpi_snapshot(conn)
+        drift = [key for key in counted.keys() | actual.keys() if counted.get(key) != actual.get(key)]
+        conn.rollback()
+        if not drift:
+            log_test("Claims: Lots left out of rebuilt KPI counters", "PASS")
+        else:
+            log_test("Claims: Lots left out of rebuilt KPI counters", "FAIL", f"Drifted rows: {drift}")
+
+        response = login_client(2, 'Bob Johnson', ['Supplier']).post(f'/api/food-items/{item_id}/claim', json={})
+        if response.status_code == 403:
+            log_test("POST /api/food-items/<id>/claim (recipient only)", "PASS")
+        else:
+            log_test("POST /api/food-items/<id>/claim (recipient only)", "FAIL", f"Status code: {response.status_code}")
+
+        response = login_client(3, 'Carol White', ['Recipient']).post(f'/api/food-items/{item_id}/claim',
+                                                                       json={'quantity': 1.5})
+        if response.status_code == 400:
+            log_test("POST /api/food-items/<id>/claim (fractional quantity)", "PASS")
+        else:
+            log_test("POST /api/food-items/<id>/claim (fractional quantity)", "FAIL",
+                     f"Status code: {response.status_code}")
+
+        recipients = [(1, 'Alice Smith', ['Supplier', 'Recipient']), (3, 'Carol White', ['Recipient']),
+                      (4, 'David Brown', ['Supplier', 'Recipient'])]
+        statuses = []
+        lock = threading.Lock()
+
+        def claim_repeatedly(user):
+            client = login_client(*user)
+            for _ in range(15):
+                status = client.post(f'/api/food-items/{item_id}/claim', json={'quantity': 1}).status_code
+                with lock:
+                    statuses.append(status)
+
+        threads = [threading.Thread(target=claim_repeatedly, args=(recipients[n % 3],)) for n in range(20)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        claimed, transactions, stock = conn.execute('''
+            SELECT COALESCE(SUM(t.quantity), 0), COUNT(t.transaction_id),
+                   (SELECT SUM(quantity_available) FROM food_items WHERE food_name = 'Stress Test Bread')
+            FROM transactions t JOIN food_items f ON t.item_id = f.item_id
+            WHERE f.food_name = 'Stress Test Bread'
+        ''').fetchone()
+        conn.close()
+        counts = {status: statuses.count(status) for status in set(statuses)}
+        if counts == {201: 100, 409: 200} and claimed == 100 and transactions == 100 and stock == 100:
+            log_test("Claims: No overselling under concurrency", "PASS",
+                     f"{len(statuses)} claims from {len(threads)} threads at {len(statuses) / elapsed:.0f}/s")
+        else:
+            log_test("Claims: No overselling under concurrency", "FAIL",
+                     f"Statuses {counts}, {claimed} kg in {transactions} transactions, {stock} kg in stock")
+
+    except Exception as e:
+        log_test("Concurrent claims", "FAIL", str(e))
+    finally:
+        app.config['DATABASE'] = original_database
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_group_commit():
+    """Test the group-commit writer batches writes and isolates a failing one"""
+    print("\n=== Testing Group Commit Writer ===")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_writer_test_{os.getpid()}.db')
+    original_database, write_queue = app.config['DATABASE'], app.config['WRITE_QUEUE']
+    insert = '''
+        INSERT INTO food_items (user_id, food_type, food_name, quantity_available, expiry_date,
+                                delivery_option, location_id)
+        VALUES (2, 'Bakery', 'Group Commit Bread', 5, date('now', '+7 days'), 'Pickup', 1)
+    '''
+    try:
+        create_database(database)
+        app.config['DATABASE'] = database
+        app.config['WRITE_QUEUE'] = True
+        writer = get_writer()
+
+        def failing(conn):
+            conn.execute(insert)
+            raise ValueError('rejected')
+
+        futures = [writer.submit(lambda conn: conn.execute(insert).lastrowid) for _ in range(3)]
+        futures.insert(1, writer.submit(failing))
+        errors = [future.exception() for future in futures]
+        rows = get_pool().connect().execute(
+            "SELECT COUNT(*) FROM food_items WHERE food_name = 'Group Commit Bread'").fetchone()[0]
+        if [type(error) for error in errors] == [type(None), ValueError, type(None), type(None)] and rows == 3:
+            log_test("Group commit: Failing operation rolled back alone", "PASS")
+        else:
+            log_test("Group commit: Failing operation rolled back alone", "FAIL", f"Errors {errors}, {rows} rows")
+
+        client = login_client(2, 'Bob Johnson', ['Supplier'])
+        threads = [threading.Thread(target=lambda: [client.post('/api/food-items/create', json={
+            'food_type': 'Bakery', 'food_name': 'Group Commit Bread', 'quantity_available': 5,
+            'expiry_date': '2030-01-01', 'delivery_option': 'Pickup', 'city': 'Cape Town'}) for _ in range(20)])
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rows = get_pool().connect().execute(
+            "SELECT COUNT(*) FROM food_items WHERE food_name = 'Group Commit Bread'").fetchone()[0]
+        stats = writer.stats()
+        if rows == 163 and stats['batches'] < stats['operations']:
+            log_test("Group commit: Route writes batched", "PASS",
+                     f"{stats['operations']} operations in {stats['batches']} batches")
+        else:
+            log_test("Group commit: Route writes batched", "FAIL", f"{rows} rows, {stats}")
+
+        response = login_client(1, 'Alice Smith', ['Supplier', 'Recipient']).post(
+            '/api/matching/run', json={'deterministic': True, 'today': '2025-12-01'})
+        operations = writer.stats()['operations']
+        if response.status_code == 200 and response.get_json()['matched'] >= 1 and operations == stats['operations'] + 1:
+            log_test("Group commit: Matching run queued to the writer", "PASS")
+        else:
+            log_test("Group commit: Matching run queued to the writer", "FAIL",
+                     f"Status code: {response.status_code}, {operations} operations")
+
+        writer.close(wait=True)
+        try:
+            writer.submit(lambda conn: None)
+            refused = False
+        except RuntimeError:
+            refused = True
+        replacement = get_writer()
+        if refused and replacement is not writer and replacement.run(lambda conn: conn.execute(insert).lastrowid):
+            log_test("Group commit: Closed writer refuses work and is replaced", "PASS")
+        else:
+            log_test("Group commit: Closed writer refuses work and is replaced", "FAIL",
+                     f"Refused: {refused}, replaced: {replacement is not writer}")
+
+    except Exception as e:
+        log_test("Group commit", "FAIL", str(e))
+    finally:
+        app.config['DATABASE'], app.config['WRITE_QUEUE'] = original_database, write_queue
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_health_probes():
+    """Test /healthz, /readyz and that shutting down fails readiness and ends event streams"""
+    print("\n=== Testing Health Probes ===")
+
+    client = app.test_client()
+    for url in ('/healthz', '/readyz'):
+        response = client.get(url)
+        if response.status_code == 200:
+            log_test(f"GET {url}", "PASS", json.loads(response.data)['status'])
+        else:
+            log_test(f"GET {url}", "FAIL", f"Status code: {response.status_code}")
+
+    try:
+        response = client.get('/api/stream/events', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        started = time.perf_counter()
+        begin_shutdown()
+        remaining = list(chunks)
+        response.close()
+        if (client.get('/readyz').status_code == 503 and client.get('/healthz').status_code == 200
+                and not remaining and time.perf_counter() - started < 5
+                and client.get('/api/stream/events').status_code == 503):
+            log_test("Shutdown: Readiness fails and event streams end", "PASS")
+        else:
+            log_test("Shutdown: Readiness fails and event streams end", "FAIL", f"Remaining chunks: {remaining}")
+    except Exception as e:
+        log_test("Shutdown: Readiness fails and event streams end", "FAIL", str(e))
+    finally:
+        shutting_down.clear()
+
+def check_repositories(storage):
+    """Run the repositories (users, locations, food items, requests, transactions and the
+    schema triggers) against a storage backend"""
+    email = f'repo-{os.getpid()}-{time.time_ns()}@example.com'
+
+    def create_parties(conn):
+        location_id = storage.locations.resolve(conn, 'Repository Town')
+        supplier_id = storage.users.create(conn, 'Repo Supplier', '0821234567', 'supplier-' + email, 'pw', location_id)
+        recipient_id = storage.users.create(conn, 'Repo Recipient', '0821234567', email, 'pw', location_id)
+        storage.users.add_role(conn, supplier_id, 'Supplier')
+        storage.users.add_role(conn, recipient_id, 'Recipient')
+        item_id = storage.food_items.create(conn, supplier_id, 'Bakery', 'Repository Bread', 10, '2030-01-01',
+                                            'Pickup', location_id)
+        return location_id, supplier_id, recipient_id, item_id
+
+    location_id, supplier_id, recipient_id, item_id = storage.write(create_parties)
+    user = storage.read(lambda conn: storage.users.find_with_roles(conn, email, 'pw'))
+    if (user and user['user_id'] == recipient_id and user['roles'] == 'Recipient'
+            and storage.write(lambda conn: storage.locations.resolve(conn, ' repository town')) == location_id):
+        log_test("Repositories: Users and locations", "PASS")
+    else:
+        log_test("Repositories: Users and locations", "FAIL", f"User: {user}")
+
+    def select_request(conn):
+        request_row = storage.requests.create(conn, item_id, recipient_id, 4, 'High')
+        updated = storage.requests.update_status(conn, request_row['request_id'], 'Selected')
+        return updated, storage.food_items.get(conn, item_id)
+
+    updated, item = storage.write(select_request)
+    transaction = storage.write(lambda conn: storage.transactions.create(conn, item_id, supplier_id, recipient_id, 4))
+    if (updated['status'] == 'Selected' and item['status'] == 'Pending' and item['quantity_available'] == 10
+            and transaction['status'] == 'In-Progress'
+            and storage.read(lambda conn: storage.transactions.for_item(conn, item_id))['quantity'] == 4):
+        log_test("Repositories: Requests, transactions and status trigger", "PASS")
+    else:
+        log_test("Repositories: Requests, transactions and status trigger", "FAIL",
+                 f"Request: {dict(updated)}, item: {dict(item)}")
+
+    try:
+        storage.write(lambda conn: storage.requests.create(conn, item_id, recipient_id, 11))
+        log_test("Repositories: Quantity trigger", "FAIL", "Over-quantity request accepted")
+    except sqlite3.IntegrityError:
+        log_test("Repositories: Quantity trigger", "PASS")
+
+@checked
+def test_repositories():
+    """Test the repository layer on a fresh database"""
+    print("\n=== Testing Repositories ===")
+
+    database = os.path.join(tempfile.gettempdir(), f'foodconnect_repositories_test_{os.getpid()}.db')
+    try:
+        create_database(database)
+        conn = sqlite3.connect(database, factory=Connection)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys = ON')
+        try:
+            check_repositories(SQLiteBackend(lambda: conn, lambda work: run_write_transaction(conn, work)))
+        finally:
+            conn.close()
+    except Exception as e:
+        log_test("Repositories", "FAIL", str(e))
+    finally:
+        for path in (database, database + '-wal', database + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+@checked
+def test_query_budgets():
+    """Test routes stay within their SQL statement budgets without N+1 patterns"""
+    print("\n=== Testing Query Budgets ===")
+
+    check_query_budget(app.test_client(), 'POST', '/supplierlogin', 1,
+                       data={'email': 'alice@example.com', 'password': 'hashed_password_1'})
+    check_query_budget(app.test_client(), 'POST', '/recipientlogin', 1,
+                       data={'email': 'carol@example.com', 'password': 'hashed_password_3'})
+
+    supplier = login_client(1, 'Alice Smith', ['Supplier'])
+    check_query_budget(supplier, 'GET', '/supplier-dashboard', 6)
+    #Unchanged data: both fragments come from the cache, only table_versions is read
+    with StatementRecorder() as recorder:
+        supplier.get('/supplier-dashboard').get_data()
+    if len(recorder.statements) == 1:
+        log_test("Query budget: cached dashboard fragments", "PASS")
+    else:
+        log_test("Query budget: cached dashboard fragments", "FAIL", f"Statements: {recorder.statements}")
+    check_query_budget(supplier, 'GET', '/view-recipient-needs', 2)
+    check_query_budget(supplier, 'GET', '/api/kpi/supplier', 3)
+
+    recipient = login_client(4, 'David Brown', ['Recipient'])
+    check_query_budget(recipient, 'GET', '/recipient-dashboard', 4)
+    check_query_budget(recipient, 'GET', '/view-available-surplus', 2)
+    #BEGIN IMMEDIATE counts as a statement
+    check_query_budget(recipient, 'PUT', '/api/requests/update/1', 3, json={'status': 'Pending'})
+    check_query_budget(recipient, 'PUT', '/api/requests/bulk-update', 3,
+                       json=[{'request_id': 1, 'status': 'Pending'}, {'request_id': 2, 'status': 'Cancelled'}])
+
+    client = app.test_client()
+    check_query_budget(client, 'GET', '/api/food-items', 2)
+    check_query_budget(client, 'GET', '/api/requests', 2)
+    check_query_budget(client, 'GET', '/api/food-items/search?q=bread', 2)
+    check_query_budget(client, 'GET', '/api/food-items/nearby?lat=-26.2&lon=28.0', 3)
+    check_query_budget(client, 'GET', '/api/changes', 6)
+
+    #The detector itself: one lookup per item is the classic N+1
+    conn = get_db_connection()
+    with StatementRecorder() as recorder:
+        for item_id in (1, 2, 3):
+            conn.execute('SELECT food_name FROM food_items WHERE item_id = ?', (item_id,)).fetchone()
+    conn.close()
+    if recorder.repeated() == {'SELECT food_name FROM food_items WHERE item_id = ?': 3}:
+        log_test("Query budget: N+1 detection", "PASS")
+    else:
+        log_test("Query budget: N+1 detection", "FAIL", f"Repeated: {recorder.repeated()}")
+
+
 def print_summary():
     """Print test summary"""
     print("\n" + "="*50)
@@ -346,6 +1575,30 @@ if __name__ == '__main__':
     test_recipient_routes()
     test_api_endpoints()
     test_database_operations()
+    test_connection_pool()
+    test_kpi_counters()
+    test_read_cache()
+    test_pagination()
+    test_ndjson_export()
+    test_expiry_dates()
+    test_bulk_upload()
+    test_bulk_request_update()
+    test_location_registry()
+    test_matching_engine()
+    test_proximity_search()
+    test_full_text_search()
+    test_conditional_get()
+    test_response_compression()
+    test_event_stream()
+    test_change_feed()
+    test_seed_data()
+    test_archive_sweep()
+    test_request_metrics()
+    test_query_budgets()
+    test_claim_stress()
+    test_group_commit()
+    test_health_probes()
+    test_repositories()
 
     print_summary()
 
@@ -0,0 +1,167 @@
+"""
+Group commit for FoodConnect writes.
+
+With the write queue on (WRITE_QUEUE in app.py), routes hand their write transactions to
+one GroupCommitWriter per worker process instead of committing on their own connection.
+Its thread takes operations off a queue and runs up to batch_size of them (or whatever
+arrived within max_delay of the first) in a single BEGIN IMMEDIATE transaction, each
+inside its own savepoint: an operation that raises is rolled back alone and its future
+gets the exception, the others still commit. Futures are resolved only once the batch
+has committed, so a caller never sees a result that is not durable.
+
+One writer means no lock contention between this process's requests and one commit per
+batch instead of one per request.
+
+An operation is a callable taking the writer's connection. It runs on the writer thread,
+so it must not touch the Flask request, session or g, and it may see rows written by the
+operations before it in the same batch.
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY = 0.002
+BEGIN_ATTEMPTS = 5
+BEGIN_BASE_DELAY = 0.02
+
+def is_busy_error(error):
+    """Whether an sqlite3 error means another connection holds the lock (SQLITE_BUSY/LOCKED)"""
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is None:
+        return 'database is locked' in str(error)
+    return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+class GroupCommitWriter:
+    """Single writer thread committing queued write operations in batches"""
+
+    def __init__(self, connect, batch_size=DEFAULT_BATCH_SIZE, max_delay=DEFAULT_MAX_DELAY):
+        self.connect = connect
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.closed = False
+        self._pid = os.getpid()
+        self._stats = {'operations': 0, 'failed': 0, 'batches': 0, 'largest_batch': 0}
+
+    def submit(self, operation):
+        """Queue operation(conn) and return a Future for its result (RuntimeError once closed)"""
+        future = Future()
+        with self._lock:
+            #Threads do not survive a fork, so a forked worker starts its own
+            if self._pid != os.getpid():
+                self._pid, self._thread, self._queue = os.getpid(), None, queue.Queue()
+                self.closed = False
+            if self.closed:
+                raise RuntimeError('The group-commit writer is closed')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+                self._thread.start()
+            #Queued under the lock, so nothing lands behind close()'s stop signal
+            self._queue.put((operation, future))
+        return future
+
+    def run(self, operation):
+        """Queue operation(conn) and wait for its result (or exception)"""
+        return self.submit(operation).result()
+
+    def _next_batch(self):
+        """Wait for an operation, then take more until batch_size or max_delay is reached
+        (None is the stop signal from close())"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def close(self, wait=False):
+        """Stop the thread once the operations queued so far are committed (waiting for that
+        if wait); submit() raises from then on"""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            if thread is not None:
+                self._queue.put(None)
+            self._pid, self._thread, self.closed = os.getpid(), None, True
+        if thread is not None and wait:
+            thread.join()
+
+    def _run(self):
+        conn = None
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = None in batch
+                batch = [(operation, future) for operation, future in filter(None, batch)
+                         if future.set_running_or_notify_cancel()]
+                if batch:
+                    conn = self._commit_batch(conn, batch)
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _begin(self, conn):
+        #busy_timeout already waited; other processes may still hold the lock for longer
+        for attempt in range(BEGIN_ATTEMPTS):
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == BEGIN_ATTEMPTS - 1:
+                    raise
+                time.sleep(BEGIN_BASE_DELAY * 2 ** attempt * (0.5 + random.random()))
+
+    def _commit_batch(self, conn, batch):
+        """Run and commit one batch, settling every future; returns the connection to reuse"""
+        outcomes = []
+        try:
+            if conn is None:
+                conn = self.connect()
+            self._begin(conn)
+            for operation, _ in batch:
+                try:
+                    with conn.savepoint('group_commit_operation'):
+                        outcomes.append((True, operation(conn)))
+                except Exception as e:
+                    outcomes.append((False, e))
+            conn.commit()
+        except Exception as e:
+            logger.exception('Group commit of %d operations failed', len(batch))
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            with self._lock:
+                self._stats['failed'] += len(batch)
+            return conn
+
+        for (_, future), (succeeded, value) in zip(batch, outcomes):
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        with self._lock:
+            self._stats['operations'] += len(batch)
+            self._stats['failed'] += sum(not succeeded for succeeded, _ in outcomes)
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+        return conn
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, queued=self._queue.qsize(), running=self._thread is not None,
+                        batch_size=self.batch_size, max_delay_ms=self.max_delay * 1000)
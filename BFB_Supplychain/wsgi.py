@@ -0,0 +1,23 @@
+"""
+WSGI entry point for serving FoodConnect in production:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+gunicorn.conf.py preloads this module in the master process, which applies any pending
+migrations once before the workers are forked. SQLite connections must not cross a fork,
+so the master closes its own and every worker opens its pool in post_fork (init_worker()).
+`python app.py` remains the single-process development server.
+"""
+from app import app, get_pool, begin_shutdown, shutdown
+
+application = app
+
+def prepare():
+    """Migrate the database once in the master, then close its connections before forking"""
+    get_pool().close_all()
+
+def init_worker():
+    """Open this worker's pool (migration check and location warm-up) before its first request"""
+    get_pool()
+
+prepare()